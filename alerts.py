@@ -0,0 +1,196 @@
+"""Alertas por limite sobre a previsão, para muitos assinantes.
+
+Cada assinante pode registrar condições no campo 'alerts', como texto
+("rain > 10 in 6h", "temp_max > 35", "wind >= 12 em 24h") ou como objeto
+({"metric": "rain", "op": ">", "value": 10, "hours": 6}). A métrica é
+reduzida sobre os slots da previsão nas próximas `hours` horas (padrão 24):
+
+* rain       chuva acumulada (mm)
+* temp_max   maior temperatura máxima (°C)
+* temp_min   menor temperatura mínima (°C)
+* wind       maior velocidade do vento (m/s)
+* humidity   maior umidade (%)
+
+As regras ficam em arrays colunares ordenados por (célula, métrica,
+janela), com o início do trecho de cada célula indexado: quando a previsão
+de uma célula muda, só as regras daquela célula são avaliadas. A avaliação
+reduz as janelas necessárias de todas as células de uma vez (NumPy) e
+compara todas as regras em uma única operação vetorizada.
+"""
+import hashlib
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import weather_cache
+
+DEFAULT_HOURS = 24
+# Métrica -> (coluna da previsão, redução, unidade)
+METRICS = {
+    'rain': ('rain', 'sum', 'mm'),
+    'temp_max': ('temp_max', 'max', '°C'),
+    'temp_min': ('temp_min', 'min', '°C'),
+    'wind': ('wind_speed', 'max', 'm/s'),
+    'humidity': ('humidity', 'max', '%'),
+}
+OPERATORS = ('>', '>=', '<', '<=')
+
+_METRIC_NAMES = tuple(METRICS)
+# Valor neutro de cada redução (slots fora da janela)
+_IDENTITY = {'sum': 0.0, 'max': -np.inf, 'min': np.inf}
+_REDUCERS = {'sum': np.add, 'max': np.maximum, 'min': np.minimum}
+_RULE_TEXT = re.compile(
+    r'^\s*(\w+)\s*(>=|<=|>|<)\s*(-?\d+(?:[.,]\d+)?)\s*(?:mm|°c|c|m/s|%)?'
+    r'(?:\s*(?:in|em|en|nas próximas|next)\s*(\d+)\s*h)?\s*$', re.IGNORECASE)
+
+Rule = namedtuple('Rule', 'id phone name locale city cell metric op threshold hours timezone')
+
+
+def parse_rule(spec):
+    """(métrica, operador, limite, horas) de uma condição em texto ou objeto; ValueError se inválida"""
+    if isinstance(spec, str):
+        match = _RULE_TEXT.match(spec)
+        if not match:
+            raise ValueError(f"condição inválida: {spec!r}")
+        metric, op, threshold, hours = match.groups()
+        threshold = threshold.replace(',', '.')
+    else:
+        metric, op, threshold, hours = spec['metric'], spec.get('op', '>'), spec['value'], spec.get('hours')
+    metric = metric.lower()
+    if metric not in METRICS:
+        raise ValueError(f"métrica desconhecida: {metric!r} (use {', '.join(METRICS)})")
+    if op not in OPERATORS:
+        raise ValueError(f"operador inválido: {op!r}")
+    hours = DEFAULT_HOURS if hours is None else int(hours)
+    if hours <= 0:
+        raise ValueError(f"janela inválida: {hours} h")
+    return metric, op, float(threshold), hours
+
+
+def rules_from_subscribers(subscribers):
+    """Regras do campo 'alerts' de cada assinante (condições inválidas são ignoradas com aviso)"""
+    rules = []
+    for sub in subscribers:
+        for spec in sub.get('alerts') or ():
+            try:
+                metric, op, threshold, hours = parse_rule(spec)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Alerta ignorado ({sub.get('city')}): {e}")
+                continue
+            # Identificador estável: não muda se o arquivo for reordenado, e a
+            # mesma regra de um telefone em outra cidade tem outro identificador
+            cell = weather_cache.cell_key(sub['latitude'], sub['longitude'])
+            digest = hashlib.sha1(f"{sub['phone']}|{cell}|{metric}|{op}|{threshold}|{hours}".encode())
+            rules.append(Rule(digest.hexdigest()[:10], sub['phone'], sub.get('name'),
+                              sub.get('locale'), sub['city'], cell,
+                              metric, op, threshold, hours, sub.get('timezone')))
+    return rules
+
+
+class RuleIndex:
+    """Regras em arrays colunares, ordenadas e indexadas por célula e métrica"""
+
+    def __init__(self, rules):
+        self.rules = sorted(rules, key=lambda r: (r.cell, _METRIC_NAMES.index(r.metric), r.hours))
+        self.cells = sorted({rule.cell for rule in self.rules})
+        self.cell_positions = {cell: i for i, cell in enumerate(self.cells)}
+        self.cell = np.array([self.cell_positions[r.cell] for r in self.rules], dtype=np.int32)
+        self.metric = np.array([_METRIC_NAMES.index(r.metric) for r in self.rules], dtype=np.int8)
+        self.op = np.array([OPERATORS.index(r.op) for r in self.rules], dtype=np.int8)
+        self.threshold = np.array([r.threshold for r in self.rules], dtype=np.float64)
+        self.hours = np.array([r.hours for r in self.rules], dtype=np.int32)
+        # Regras da célula i: self.starts[i]:self.starts[i + 1]
+        self.starts = np.searchsorted(self.cell, np.arange(len(self.cells) + 1))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __contains__(self, cell):
+        return cell in self.cell_positions
+
+    def rules_for(self, cells):
+        """Índices das regras das células informadas"""
+        positions = [self.cell_positions[cell] for cell in cells if cell in self.cell_positions]
+        if not positions:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(self.starts[i], self.starts[i + 1]) for i in positions])
+
+
+def window_values(forecasts, windows, now):
+    """Valor de cada janela (métrica, horas) em cada previsão: array (previsões x janelas).
+
+    forecasts: CompactForecast (forecast_store) não vazios. Os slots
+    considerados têm now < dt <= now + horas; sem slots na janela, o valor
+    é NaN (nenhuma comparação é satisfeita).
+    """
+    columns = [forecast.columns() for forecast in forecasts]
+    sizes = np.array([len(c['dt']) for c in columns])
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    dt = np.concatenate([c['dt'] for c in columns])
+    values = np.empty((len(forecasts), len(windows)))
+    needed = {METRICS[metric][0] for metric, _ in windows}
+    data = {name: np.concatenate([c[name] for c in columns]).astype(np.float64) for name in needed}
+
+    for j, (metric, hours) in enumerate(windows):
+        column, reduction, _ = METRICS[metric]
+        inside = (dt > now) & (dt <= now + hours * 3600)
+        masked = np.where(inside, data[column], _IDENTITY[reduction])
+        reduced = _REDUCERS[reduction].reduceat(masked, starts)
+        values[:, j] = np.where(np.add.reduceat(inside, starts) > 0, reduced, np.nan)
+    return values
+
+
+def evaluate(index, forecasts, now=None, cells=None):
+    """Regras satisfeitas: lista de (Rule, valor).
+
+    forecasts: dict célula -> CompactForecast; cells limita a avaliação às
+    regras dessas células (ex.: as que tiveram a previsão atualizada).
+    """
+    now = time.time() if now is None else now
+    cells = [cell for cell in (forecasts if cells is None else cells)
+             if cell in index and cell in forecasts and len(forecasts[cell])]
+    selected = index.rules_for(cells)
+    if len(selected) == 0:
+        return []
+
+    # Janelas (métrica, horas) distintas entre as regras selecionadas
+    pairs, pair_of_rule = np.unique(
+        np.stack((index.metric[selected].astype(np.int32), index.hours[selected])),
+        axis=1, return_inverse=True)
+    windows = [(_METRIC_NAMES[m], int(h)) for m, h in pairs.T]
+    values = window_values([forecasts[cell] for cell in cells], windows, now)
+
+    row_of_cell = np.full(len(index.cells), -1)
+    row_of_cell[[index.cell_positions[cell] for cell in cells]] = np.arange(len(cells))
+    value = values[row_of_cell[index.cell[selected]], pair_of_rule.ravel()]
+    threshold, op = index.threshold[selected], index.op[selected]
+    matched = np.select([op == 0, op == 1, op == 2, op == 3],
+                        [value > threshold, value >= threshold, value < threshold, value <= threshold],
+                        default=False)
+    return [(index.rules[i], float(v)) for i, v in zip(selected[matched], value[matched])]
+
+
+class AlertEngine:
+    """Avalia as regras a cada atualização, só nas células cuja previsão mudou"""
+
+    def __init__(self, index):
+        self.index = index
+        self._fingerprints = {}
+
+    def refresh(self, forecasts, now=None):
+        """forecasts: dict célula -> CompactForecast; retorna os alertas das células alteradas"""
+        changed = [cell for cell, forecast in forecasts.items()
+                   if cell in self.index and self._fingerprints.get(cell) != forecast.fingerprint]
+        matches = evaluate(self.index, forecasts, now, changed)
+        for cell in changed:
+            self._fingerprints[cell] = forecasts[cell].fingerprint
+        return matches
+
+
+def alert_fields(rule, value):
+    """Campos de message_templates.MessageTemplate.render_alert"""
+    return {'city': rule.city, 'metric': rule.metric, 'value': value,
+            'unit': METRICS[rule.metric][2], 'hours': rule.hours, 'op': rule.op,
+            'threshold': rule.threshold}
@@ -1,52 +1,33 @@
 import streamlit as st
 import requests
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime, timedelta
-import numpy as np
-from geopy.geocoders import Nominatim
+from datetime import datetime
+import charts
+import climatology
+import forecast_store
+import geocoding
+import ip_location
+import observation_store
+import prewarm
+import response_cache
+import telemetry
+import weather_cache
+import weather_client
 import warnings
 warnings.filterwarnings('ignore')
 
+# Seções com widgets próprios rodam como fragmentos (st.fragment, Streamlit
+# 1.37+): uma interação reexecuta só a seção. Fragmentos não escrevem na
+# barra lateral, por isso os seletores dessas seções ficam no corpo da página
+fragment = st.fragment
+
 # Função para obter localização por IP
 @st.cache_data(ttl=3600)
 def get_user_location():
     """Obtém localização do usuário através do IP"""
-    try:
-        # Tenta com API ipapi.co (mais confiável e gratuita)
-        response = requests.get('https://ipapi.co/json/', timeout=5)
-        data = response.json()
-        
-        if 'latitude' in data and 'longitude' in data:
-            return {
-                'latitude': data['latitude'],
-                'longitude': data['longitude'],
-                'city': data.get('city', 'Desconhecido'),
-                'region': data.get('region', ''),
-                'country': data.get('country_name', ''),
-                'success': True
-            }
-    except Exception as e:
-        print(f"Erro ipapi.co: {e}")
-    
-    # Fallback para ipinfo.io
-    try:
-        response = requests.get('https://ipinfo.io/json', timeout=5)
-        data = response.json()
-        
-        if 'loc' in data:
-            lat, lon = data['loc'].split(',')
-            return {
-                'latitude': float(lat),
-                'longitude': float(lon),
-                'city': data.get('city', 'Desconhecido'),
-                'region': data.get('region', ''),
-                'country': data.get('country', ''),
-                'success': True
-            }
-    except Exception as e:
-        print(f"Erro ipinfo.io: {e}")
+    # Consulta ipapi.co e ipinfo.io de forma concorrente (primeira resposta válida vence)
+    location = ip_location.locate()
+    if location:
+        return dict(location, success=True)
     
     # Fallback para localização padrão
     return {
@@ -58,6 +39,16 @@ def get_user_location():
         'success': False
     }
 
+@st.cache_data(ttl=3600, max_entries=1000)
+def resolve_location(query):
+    """Local da busca e, se não encontrado, sugestões; memorizado pelo texto da busca"""
+    location = geocoding.geocode(query)
+    suggestions = [] if location else geocoding.suggest(query.split(',')[0], limit=5)
+    return location, suggestions
+
+# Tempo total da execução do script (cada interação do usuário)
+page_span = telemetry.start_span('page')
+
 # Configuração da página
 st.set_page_config(
     page_title="Weather Analytics",
@@ -73,6 +64,8 @@ st.markdown("Análise completa de temperatura e precipitação com histórico co
 OPENWEATHER_API_KEY = st.secrets.get("OPENWEATHER_API_KEY", "")
 if not OPENWEATHER_API_KEY:
     st.error("⚠️ Configure a chave OPENWEATHER_API_KEY nos secrets do Streamlit")
+    page_span.set(outcome='no_api_key')
+    page_span.end()
     st.stop()
 
 # Sidebar - Configurações
@@ -93,67 +86,42 @@ else:
 
 location_input = st.sidebar.text_input("Buscar outra cidade:", value=default_location)
 
+location_query = None
 try:
-    geolocator = Nominatim(user_agent="weather_app")
-    location = geolocator.geocode(location_input)
+    location, suggestions = resolve_location(location_input)
     
     if location:
-        latitude = location.latitude
-        longitude = location.longitude
-        city_name = location.address.split(',')[0]
+        latitude = location['latitude']
+        longitude = location['longitude']
+        city_name = location['city']
+        location_query = location_input
         st.sidebar.success(f"✅ {city_name} selecionado")
     else:
         st.sidebar.error("Localização não encontrada")
+        if suggestions:
+            st.sidebar.caption("Você quis dizer: " + " · ".join(suggestions))
         latitude, longitude, city_name = user_location['latitude'], user_location['longitude'], user_location['city']
 except:
     st.sidebar.warning("Usando localização anterior")
     latitude, longitude, city_name = user_location['latitude'], user_location['longitude'], user_location['city']
 
-# Período de análise
-st.sidebar.subheader("📅 Período")
-days_back = st.sidebar.slider("Dias para análise histórica:", 1, 30, 7)
-
-# Tipo de gráfico
-st.sidebar.subheader("📊 Visualização")
-chart_type = st.sidebar.selectbox("Tipo de gráfico:", 
-    ["Temperatura", "Precipitação", "Comparativo", "Análise Semanal"])
-
-# Funções de API
-@st.cache_data(ttl=3600)
-def get_current_weather(lat, lon):
-    """Busca clima atual"""
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric&lang=pt_br"
+# Popularidade dos locais (uma vez por cidade em cada sessão) para o pré-aquecimento do cache
+if st.session_state.get('tracked_location') != (latitude, longitude):
+    st.session_state['tracked_location'] = (latitude, longitude)
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Verifica se a resposta contém erro
-        if 'cod' in data and data['cod'] != '200' and data['cod'] != 200:
-            st.error(f"❌ Erro da API: {data.get('message', 'Erro desconhecido')}")
-            return None
-        
-        # Verifica se contém dados necessários
-        if 'main' not in data or 'weather' not in data:
-            st.error("❌ Resposta inválida da API")
-            return None
-            
-        return data
-    except requests.exceptions.HTTPError as e:
-        st.error(f"❌ Erro HTTP: {e.response.status_code}")
-        return None
+        prewarm.record_access(latitude, longitude, city_name, location_query)
     except Exception as e:
-        st.error(f"❌ Erro ao buscar clima: {str(e)}")
-        return None
+        print(f"Erro ao registrar acesso: {e}")
 
-@st.cache_data(ttl=3600)
-def get_forecast_weather(lat, lon):
-    """Busca previsão de 5 dias"""
-    url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric&lang=pt_br"
+# Funções de API
+def _check_response(future, required_keys, label):
+    """Resolve o Future de uma chamada à OpenWeather e valida a resposta.
+    
+    O Future resolve para a entrada do cache; retorna a entrada ou None.
+    """
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        entry = future.result()
+        data = entry['payload']
         
         # Verifica se a resposta contém erro
         if 'cod' in data and data['cod'] != '200' and data['cod'] != 200:
@@ -161,50 +129,131 @@ def get_forecast_weather(lat, lon):
             return None
         
         # Verifica se contém dados necessários
-        if 'list' not in data:
+        if any(key not in data for key in required_keys):
             st.error("❌ Resposta inválida da API")
             return None
             
-        return data
+        return entry
     except requests.exceptions.HTTPError as e:
         st.error(f"❌ Erro HTTP: {e.response.status_code}")
         return None
     except Exception as e:
-        st.error(f"❌ Erro ao buscar previsão: {str(e)}")
+        st.error(f"❌ Erro ao buscar {label}: {str(e)}")
         return None
 
-def create_forecast_dataframe(forecast_data):
-    """Converte dados de previsão em DataFrame"""
-    if not forecast_data or 'list' not in forecast_data:
-        return None
+# O cache do Streamlit guarda só o clima atual; a previsão fica compacta em
+# forecast_store, com orçamento de memória próprio
+@st.cache_data(ttl=600, max_entries=1000)
+def get_weather_data(lat, lon):
+    """Busca clima atual e previsão de 5 dias em paralelo (uma ida e volta).
     
-    data = []
-    for item in forecast_data['list']:
-        data.append({
-            'datetime': pd.to_datetime(item['dt'], unit='s'),
-            'temp': item['main']['temp'],
-            'temp_max': item['main']['temp_max'],
-            'temp_min': item['main']['temp_min'],
-            'feels_like': item['main']['feels_like'],
-            'humidity': item['main']['humidity'],
-            'pressure': item['main']['pressure'],
-            'clouds': item['clouds']['all'],
-            'wind_speed': item['wind']['speed'],
-            'description': item['weather'][0]['description'],
-            'rain': item.get('rain', {}).get('3h', 0)
-        })
+    As respostas vêm do cache em disco compartilhado entre sessões; quando
+    expiradas, o conteúdo anterior é usado e atualizado em segundo plano.
+    Retorna o clima atual; a previsão é guardada em forecast_store.
+    """
+    current_future, forecast_future = weather_cache.get_current_and_forecast(
+        lat, lon, OPENWEATHER_API_KEY, entries=True)
+    current_entry = _check_response(current_future, ('main', 'weather'), 'clima')
+    forecast_entry = _check_response(forecast_future, ('list',), 'previsão')
+    current = current_entry['payload'] if current_entry else None
+    forecast = forecast_entry['payload'] if forecast_entry else None
+    if forecast:
+        forecast_store.put(weather_cache.cell_key(lat, lon), forecast,
+                           response_cache.entry_fingerprint(forecast_entry))
     
-    df = pd.DataFrame(data)
-    df['date'] = df['datetime'].dt.date
-    return df
+    # Alimenta o histórico local (somente quando há busca nova na API)
+    try:
+        cell = weather_cache.cell_key(lat, lon)
+        observation_store.ingest_current(cell, current)
+        observation_store.ingest_forecast(cell, forecast)
+    except Exception as e:
+        print(f"Erro ao gravar histórico: {e}")
+    return current
+
+def get_forecast(lat, lon):
+    """Previsão compacta do local; relida do cache em disco se saiu da memória"""
+    key = weather_cache.cell_key(lat, lon)
+    forecast = forecast_store.get(key)
+    if forecast is None:
+        future = weather_client.submit(weather_cache.get_forecast, lat, lon,
+                                       OPENWEATHER_API_KEY, entry=True)
+        entry = _check_response(future, ('list',), 'previsão')
+        if entry:
+            forecast = forecast_store.put(key, entry['payload'],
+                                          response_cache.entry_fingerprint(entry))
+    return forecast
+
+# DataFrames da previsão memorizados pela fingerprint do payload: uma nova
+# busca que volta idêntica não reconstrói DataFrames nem redesenha gráficos
+@st.cache_resource(max_entries=32)
+def get_forecast_frame(fingerprint, _forecast):
+    """DataFrame da previsão compacta (pandas importado só aqui, depois das métricas)"""
+    return _forecast.to_frame() if _forecast else None
+
+@st.cache_resource(max_entries=32)
+def get_daily_frame(fingerprint, _df_forecast, tz):
+    """Resumo diário da previsão, no fuso da cidade"""
+    from forecast_frame import daily_summary
+    return daily_summary(_df_forecast, tz)
+
+# Estatísticas e tabelas derivadas, memorizadas pela fingerprint da previsão:
+# nenhuma interação refaz agregações, cópias arredondadas ou o CSV
+@st.cache_resource(max_entries=32)
+def get_forecast_stats(fingerprint, _df_forecast):
+    """Estatísticas exibidas sob os gráficos de temperatura e chuva"""
+    return {
+        'temp_max': float(_df_forecast['temp_max'].max()),
+        'temp_min': float(_df_forecast['temp_min'].min()),
+        'temp_mean': float(_df_forecast['temp'].mean()),
+        'rain_max': float(_df_forecast['rain'].max()),
+        'rain_total': float(_df_forecast['rain'].sum()),
+        'rain_slots': int((_df_forecast['rain'] > 0).sum()),
+    }
+
+@st.cache_resource(max_entries=32)
+def get_weekly_table(fingerprint, _df_daily):
+    """Tabela do resumo semanal, arredondada para exibição"""
+    df_display = _df_daily.copy()
+    df_display['date'] = df_display['date'].astype(str)
+    df_display.columns = ['Data', 'Temp Média (°C)', 'Temp Máx (°C)', 
+                          'Temp Mín (°C)', 'Chuva (mm)', 'Umidade (%)', 'Vento (m/s)']
+    return df_display.round(1)
+
+@st.cache_resource(max_entries=32)
+def get_raw_table(fingerprint, _df_forecast):
+    """Tabela de dados brutos (arredondada) e o CSV para download"""
+    df_display = _df_forecast[['datetime', 'temp', 'temp_max', 'temp_min', 
+                               'humidity', 'wind_speed', 'rain', 'description']].copy()
+    df_display.columns = ['Data/Hora', 'Temp (°C)', 'Máx (°C)', 'Mín (°C)', 
+                          'Umidade (%)', 'Vento (m/s)', 'Chuva (mm)', 'Descrição']
+    return df_display.round(1), df_display.to_csv(index=False, encoding='utf-8-sig')
+
+# observed_at (instante da última observação) invalida a consulta quando
+# chega uma observação nova
+@st.cache_data(ttl=600, max_entries=64)
+def get_history(cell, days_back, observed_at):
+    """Histórico local da célula nos últimos days_back dias"""
+    return observation_store.query_days_back(cell, days_back)
+
+# As normais mudam a cada observação nova (no máximo uma a cada 10 minutos)
+@st.cache_data(ttl=600, max_entries=32)
+def get_anomaly_frame(cell, fingerprint, _df_forecast, tz_offset):
+    """Previsão comparada às normais do local (climatology.py)"""
+    return climatology.anomaly_frame(cell, _df_forecast, tz_offset)
+
+# Malha curta: pontos que ficaram sem dados (cota da API) entram na próxima
+@st.cache_data(ttl=120, max_entries=16)
+def get_region(lat, lon, radius):
+    """Malha interpolada de temperatura e chuva ao redor do local"""
+    import regional_grid
+    return regional_grid.region_raster(lat, lon, radius, OPENWEATHER_API_KEY)
 
 # Página principal
 col1, col2, col3 = st.columns(3)
 
-# Busca dados atuais
-current = get_current_weather(latitude, longitude)
-forecast = get_forecast_weather(latitude, longitude)
-df_forecast = create_forecast_dataframe(forecast)
+# Busca dados atuais (coordenadas ajustadas à grade para compartilhar o cache)
+grid_lat, grid_lon = weather_cache.snap_to_grid(latitude, longitude)
+current = get_weather_data(grid_lat, grid_lon)
 
 # Validação dos dados
 if current is None:
@@ -214,6 +263,8 @@ if current is None:
     - A localização está correta?
     - Você tem plano ativo na OpenWeatherMap?
     """)
+    page_span.set(outcome='no_data')
+    page_span.end()
     st.stop()
 
 if current:
@@ -252,142 +303,173 @@ if current:
         - Cobertura: {current['clouds']['all']}%
         """)
 
-# Gráficos
-st.markdown("---")
-st.markdown("## 📊 Análises Gráficas")
+# Importação tardia: pandas/NumPy só são carregados depois das métricas
+forecast = get_forecast(grid_lat, grid_lon)
+forecast_fingerprint = forecast.fingerprint if forecast else None
+df_forecast = get_forecast_frame(forecast_fingerprint, forecast)
 
-if df_forecast is not None:
+# Gráficos: o tipo de gráfico e o raio do mapa só reexecutam esta seção
+@fragment
+def chart_section(forecast, df_forecast, grid_lat, grid_lon):
+    chart_type = st.selectbox("Tipo de gráfico:", 
+        ["Temperatura", "Precipitação", "Comparativo", "Anomalia", "Análise Semanal", "Mapa Regional"],
+        key='chart_type')
+    if chart_type == "Mapa Regional":
+        region_km = st.slider("Raio do mapa (km):", 10, 150, 50, step=10, key='region_km')
+    forecast_fingerprint = forecast.fingerprint if forecast else None
+    if df_forecast is None:
+        return
+    
     if chart_type == "Temperatura":
         st.subheader("📈 Evolução de Temperatura (5 dias)")
         
-        fig, ax = plt.subplots(figsize=(14, 6))
-        ax.plot(df_forecast['datetime'], df_forecast['temp'], 'o-', 
-                label='Temperatura', color='#FF6B6B', linewidth=2, markersize=6)
-        ax.fill_between(df_forecast['datetime'], df_forecast['temp_min'], 
-                         df_forecast['temp_max'], alpha=0.2, color='#FF6B6B')
-        ax.set_xlabel('Data/Hora', fontsize=12)
-        ax.set_ylabel('Temperatura (°C)', fontsize=12)
-        ax.grid(True, alpha=0.3)
-        ax.legend(fontsize=11)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        st.pyplot(fig)
+        st.image(charts.render_chart('temperatura', df_forecast, data_key=forecast_fingerprint))
         
         # Estatísticas
+        stats = get_forecast_stats(forecast_fingerprint, df_forecast)
         col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Temp Máxima", f"{df_forecast['temp_max'].max():.1f}°C")
-        col2.metric("Temp Mínima", f"{df_forecast['temp_min'].min():.1f}°C")
-        col3.metric("Temp Média", f"{df_forecast['temp'].mean():.1f}°C")
-        col4.metric("Variação", f"{df_forecast['temp_max'].max() - df_forecast['temp_min'].min():.1f}°C")
+        col1.metric("Temp Máxima", f"{stats['temp_max']:.1f}°C")
+        col2.metric("Temp Mínima", f"{stats['temp_min']:.1f}°C")
+        col3.metric("Temp Média", f"{stats['temp_mean']:.1f}°C")
+        col4.metric("Variação", f"{stats['temp_max'] - stats['temp_min']:.1f}°C")
     
     elif chart_type == "Precipitação":
         st.subheader("🌧️ Previsão de Chuva (5 dias)")
         
-        fig, ax = plt.subplots(figsize=(14, 6))
-        ax.bar(df_forecast['datetime'], df_forecast['rain'], 
-               color='#4A90E2', alpha=0.7, width=0.08)
-        ax.set_xlabel('Data/Hora', fontsize=12)
-        ax.set_ylabel('Chuva (mm/3h)', fontsize=12)
-        ax.grid(True, alpha=0.3, axis='y')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        st.pyplot(fig)
+        st.image(charts.render_chart('precipitacao', df_forecast, data_key=forecast_fingerprint))
         
         # Estatísticas
+        stats = get_forecast_stats(forecast_fingerprint, df_forecast)
         col1, col2, col3 = st.columns(3)
-        col1.metric("Chuva Máxima", f"{df_forecast['rain'].max():.1f} mm")
-        col2.metric("Chuva Total", f"{df_forecast['rain'].sum():.1f} mm")
-        col3.metric("Dias com Chuva", len(df_forecast[df_forecast['rain'] > 0]))
+        col1.metric("Chuva Máxima", f"{stats['rain_max']:.1f} mm")
+        col2.metric("Chuva Total", f"{stats['rain_total']:.1f} mm")
+        col3.metric("Dias com Chuva", stats['rain_slots'])
     
     elif chart_type == "Comparativo":
         st.subheader("📊 Gráfico Comparativo: Temperatura vs Chuva")
         
-        fig, ax1 = plt.subplots(figsize=(14, 6))
-        
-        ax1.plot(df_forecast['datetime'], df_forecast['temp'], 'o-', 
-                color='#FF6B6B', label='Temperatura', linewidth=2, markersize=6)
-        ax1.set_ylabel('Temperatura (°C)', fontsize=12, color='#FF6B6B')
-        ax1.tick_params(axis='y', labelcolor='#FF6B6B')
-        ax1.grid(True, alpha=0.3)
-        
-        ax2 = ax1.twinx()
-        ax2.bar(df_forecast['datetime'], df_forecast['rain'], 
-               alpha=0.3, color='#4A90E2', label='Precipitação', width=0.08)
-        ax2.set_ylabel('Chuva (mm/3h)', fontsize=12, color='#4A90E2')
-        ax2.tick_params(axis='y', labelcolor='#4A90E2')
+        st.image(charts.render_chart('comparativo', df_forecast, data_key=forecast_fingerprint))
+    
+    elif chart_type == "Anomalia":
+        st.subheader("🌡️ Previsão vs Normais do Local")
         
-        ax1.set_xlabel('Data/Hora', fontsize=12)
-        lines1, labels1 = ax1.get_legend_handles_labels()
-        lines2, labels2 = ax2.get_legend_handles_labels()
-        ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left', fontsize=11)
+        df_anomaly = get_anomaly_frame(weather_cache.cell_key(grid_lat, grid_lon), forecast_fingerprint,
+                                       df_forecast, forecast.timezone)
+        compared = df_anomaly.dropna(subset=['normal'])
         
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        st.pyplot(fig)
+        if compared.empty:
+            st.info("ℹ️ Ainda não há observações suficientes deste local para calcular as normais. "
+                    "Elas são acumuladas a cada consulta.")
+        else:
+            st.image(charts.render_chart('anomalia', df_anomaly, size=(14, 7)))
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Anomalia Média", f"{compared['anomaly'].mean():+.1f}°C")
+            col2.metric("Maior Anomalia", f"{compared['anomaly'].abs().max():.1f}°C")
+            col3.metric("Observações", f"{int(compared['samples'].max())}")
+            st.caption(f"Normais por dia do ano e hora local (±{climatology.DOY_WINDOW} dias), "
+                       f"calculadas de forma incremental a partir das observações; "
+                       f"{len(compared)}/{len(df_anomaly)} horários com normal disponível")
     
     elif chart_type == "Análise Semanal":
         st.subheader("📅 Análise Semanal")
         
-        # Agrupa por dia
-        df_daily = df_forecast.groupby('date').agg({
-            'temp': 'mean',
-            'temp_max': 'max',
-            'temp_min': 'min',
-            'rain': 'sum',
-            'humidity': 'mean',
-            'wind_speed': 'mean'
-        }).reset_index()
+        # Agrupa por dia local da cidade (offset do fuso informado pela API)
+        df_daily = get_daily_frame(forecast_fingerprint, df_forecast, forecast.timezone)
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.markdown("### 🌡️ Temperatura Diária")
-            fig, ax = plt.subplots(figsize=(10, 5))
-            ax.bar(range(len(df_daily)), df_daily['temp'], alpha=0.7, color='#FF6B6B', label='Média')
-            ax.plot(range(len(df_daily)), df_daily['temp_max'], 'ro-', label='Máxima', linewidth=2)
-            ax.plot(range(len(df_daily)), df_daily['temp_min'], 'bs-', label='Mínima', linewidth=2)
-            ax.set_xticks(range(len(df_daily)))
-            ax.set_xticklabels([d.strftime('%d/%m') for d in df_daily['date']], rotation=45)
-            ax.set_ylabel('Temperatura (°C)', fontsize=11)
-            ax.legend()
-            ax.grid(True, alpha=0.3, axis='y')
-            plt.tight_layout()
-            st.pyplot(fig)
+            st.image(charts.render_chart('semanal_temperatura', df_daily, size=(10, 5),
+                                         data_key=forecast_fingerprint))
         
         with col2:
             st.markdown("### 🌧️ Chuva Acumulada")
-            fig, ax = plt.subplots(figsize=(10, 5))
-            ax.bar(range(len(df_daily)), df_daily['rain'], alpha=0.7, color='#4A90E2')
-            ax.set_xticks(range(len(df_daily)))
-            ax.set_xticklabels([d.strftime('%d/%m') for d in df_daily['date']], rotation=45)
-            ax.set_ylabel('Chuva (mm)', fontsize=11)
-            ax.grid(True, alpha=0.3, axis='y')
-            plt.tight_layout()
-            st.pyplot(fig)
+            st.image(charts.render_chart('semanal_chuva', df_daily, size=(10, 5),
+                                         data_key=forecast_fingerprint))
         
         # Tabela semanal
         st.markdown("### 📋 Resumo Semanal")
-        df_display = df_daily.copy()
-        df_display['date'] = df_display['date'].astype(str)
-        df_display.columns = ['Data', 'Temp Média (°C)', 'Temp Máx (°C)', 
-                              'Temp Mín (°C)', 'Chuva (mm)', 'Umidade (%)', 'Vento (m/s)']
-        st.dataframe(df_display.round(1), use_container_width=True)
+        st.dataframe(get_weekly_table(forecast_fingerprint, df_daily), use_container_width=True)
+    
+    elif chart_type == "Mapa Regional":
+        st.subheader("🗺️ Mapa Regional")
+        
+        # Raio em graus (1° de latitude ≈ 111 km)
+        df_region, found, missing = get_region(grid_lat, grid_lon, region_km / 111.0)
+        
+        if df_region is None:
+            st.warning("⚠️ Nenhum ponto da região pôde ser carregado. Tente novamente em instantes.")
+        else:
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.markdown("### 🌡️ Temperatura Atual")
+                st.image(charts.render_chart('mapa_temperatura', df_region, size=(8, 7)))
+            
+            with col2:
+                st.markdown("### 🌧️ Chuva (última hora)")
+                st.image(charts.render_chart('mapa_chuva', df_region, size=(8, 7)))
+            
+            st.caption(f"Interpolado a partir de {found} pontos em um raio de {region_km} km"
+                       + (f"; {missing} pontos sem dados (limite da API), carregados nas próximas atualizações"
+                          if missing else ""))
 
-# Dados brutos
-st.markdown("---")
-st.subheader("📊 Dados Brutos da Previsão")
+# Histórico local: o período só reexecuta esta seção
+@fragment
+def history_section(cell, observed_at):
+    days_back = st.slider("Dias para análise histórica:", 1, 30, 7, key='days_back')
+    st.subheader(f"🕒 Histórico ({days_back} {'dia' if days_back == 1 else 'dias'})")
+    
+    try:
+        df_history = get_history(cell, days_back, observed_at)
+    except Exception as e:
+        print(f"Erro ao consultar histórico: {e}")
+        df_history = None
+    
+    if df_history is None or df_history.empty:
+        st.info("ℹ️ Ainda não há histórico para este local. Os dados são acumulados a cada consulta.")
+        return
+    
+    st.image(charts.render_chart('historico', df_history, size=(14, 5)))
+    observed = df_history[df_history['source'] == 'current']
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Temp Máxima", f"{df_history['temp_max'].max():.1f}°C")
+    col2.metric("Temp Mínima", f"{df_history['temp_min'].min():.1f}°C")
+    col3.metric("Chuva Total", f"{df_history['rain'].sum():.1f} mm")
+    col4.metric("Registros", f"{len(df_history)} ({len(observed)} observados)")
 
-if df_forecast is not None:
-    df_display = df_forecast[['datetime', 'temp', 'temp_max', 'temp_min', 
-                               'humidity', 'wind_speed', 'rain', 'description']].copy()
-    df_display.columns = ['Data/Hora', 'Temp (°C)', 'Máx (°C)', 'Mín (°C)', 
-                          'Umidade (%)', 'Vento (m/s)', 'Chuva (mm)', 'Descrição']
+# Dados brutos: o download só reexecuta esta seção
+@fragment
+def raw_data_section(forecast_fingerprint, df_forecast):
+    st.subheader("📊 Dados Brutos da Previsão")
+    if df_forecast is None:
+        return
     
-    st.dataframe(df_display.round(1), use_container_width=True)
+    df_table, csv = get_raw_table(forecast_fingerprint, df_forecast)
+    st.dataframe(df_table, use_container_width=True)
     
     # Download
-    csv = df_display.to_csv(index=False, encoding='utf-8-sig')
     st.download_button("📥 Baixar dados em CSV", csv, "weather_data.csv", "text/csv")
 
+st.markdown("---")
+st.markdown("## 📊 Análises Gráficas")
+chart_section(forecast, df_forecast, grid_lat, grid_lon)
+
+st.markdown("---")
+history_section(weather_cache.cell_key(grid_lat, grid_lon), current.get('dt'))
+
+st.markdown("---")
+raw_data_section(forecast_fingerprint, df_forecast)
+
 st.markdown("---")
 st.markdown("🌍 Weather Analytics Dashboard | Atualizado em: " + datetime.now().strftime('%d/%m/%Y %H:%M'))
+
+page_span.set(chart_type=st.session_state.get('chart_type'))
+page_span.end()
+store_stats = forecast_store.stats()
+telemetry.gauge('forecast_store_bytes', store_stats['bytes'])
+telemetry.gauge('forecast_store_entries', store_stats['entries'])
+telemetry.flush()
@@ -0,0 +1,122 @@
+"""Benchmark de partida a frio do dashboard.
+
+Mede, cada vez em um processo Python novo:
+
+* o tempo de importação dos módulos do app e das bibliotecas pesadas que
+  devem ser carregadas sob demanda (matplotlib, geopy, pandas);
+* o tempo até a primeira métrica ser exibida (st.metric) numa execução
+  completa do app.py via streamlit.testing, com as APIs externas
+  substituídas por respostas sintéticas — e quais bibliotecas pesadas já
+  estavam carregadas nesse momento.
+
+Uso:
+    python benchmarks/bench_cold_start.py [--repeat 5] [--budget-ms 1500]
+
+Com --budget-ms, termina com código 1 se o tempo até a primeira métrica
+exceder o orçamento (para uso em CI).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'geopy')
+
+IMPORT_TARGETS = {
+    'interpretador': 'pass',
+    'streamlit': 'import streamlit',
+    'módulos do app': 'import charts, geocoding, observation_store, weather_cache, weather_client',
+    'pandas': 'import pandas',
+    'matplotlib (sob demanda)': 'import matplotlib.figure',
+    'geopy (sob demanda)': 'import geopy.geocoders',
+}
+
+# Executado no processo filho: importa tudo a partir do zero e roda o app
+FIRST_METRIC_CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path[:0] = [ROOT, ROOT + '/benchmarks']
+import synthetic, weather_client
+import requests
+
+class _Offline:
+    def get(self, *args, **kwargs):
+        raise requests.ConnectionError('offline')
+
+weather_client._session = _Offline()
+weather_client.fetch_current_weather = lambda *a: synthetic.current_payload()
+weather_client.fetch_forecast = lambda *a: synthetic.forecast_payload()
+
+from streamlit.delta_generator import DeltaGenerator
+result = {}
+_metric = DeltaGenerator.metric
+
+def metric(self, *args, **kwargs):
+    if 'first_metric' not in result:
+        result['first_metric'] = time.perf_counter() - start
+        result['loaded'] = [m for m in HEAVY_MODULES if m in sys.modules]
+    return _metric(self, *args, **kwargs)
+
+# st.metric é um método já vinculado ao DeltaGenerator principal; substitui os dois
+DeltaGenerator.metric = metric
+import streamlit
+streamlit.metric = metric.__get__(streamlit._main)
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(ROOT + '/app.py', default_timeout=120)
+at.secrets['OPENWEATHER_API_KEY'] = 'benchmark'
+at.run()
+result['full_run'] = time.perf_counter() - start
+print(json.dumps(result))
+'''
+
+
+def run_child(code, env):
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, cwd=ROOT, env=env, check=True).stdout
+    return output.strip().splitlines()[-1] if output.strip() else ''
+
+
+def time_import(statement, repeat):
+    code = ('import time; t = time.perf_counter(); ' + statement +
+            '; print(time.perf_counter() - t)')
+    return min(float(run_child(code, os.environ.copy())) for _ in range(repeat))
+
+
+def time_first_metric(repeat, tmpdir):
+    env = dict(os.environ,
+               OBSERVATIONS_DB=os.path.join(tmpdir, 'observations.sqlite3'),
+               GEOCODE_CACHE_PATH=os.path.join(tmpdir, 'geocode_cache.json'))
+    code = (f'ROOT = {ROOT!r}\nHEAVY_MODULES = {HEAVY_MODULES!r}\n' + FIRST_METRIC_CHILD)
+    runs = [json.loads(run_child(code, env)) for _ in range(repeat)]
+    return min(runs, key=lambda r: r['first_metric'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="orçamento para o tempo até a primeira métrica")
+    args = parser.parse_args()
+
+    print(f"{'importação':<28} {'tempo (ms)':>12}")
+    for label, statement in IMPORT_TARGETS.items():
+        print(f"{label:<28} {time_import(statement, args.repeat) * 1000:>12.1f}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        result = time_first_metric(args.repeat, tmpdir)
+    first_ms = result['first_metric'] * 1000
+    print(f"\nprimeira métrica:  {first_ms:.1f} ms "
+          f"(carregados: {', '.join(result['loaded']) or 'nenhum módulo pesado'})")
+    print(f"execução completa: {result['full_run'] * 1000:.1f} ms")
+
+    if args.budget_ms is not None and first_ms > args.budget_ms:
+        print(f"❌ Orçamento de partida a frio excedido: {first_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark de create_forecast_dataframe: versão colunar vs. versão original.
+
+Uso:
+    python benchmarks/bench_forecast_dataframe.py [--sizes 40 1000 100000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from forecast_frame import create_forecast_dataframe  # noqa: E402
+from synthetic import forecast_payload  # noqa: E402
+
+
+def create_forecast_dataframe_legacy(forecast_data):
+    """Implementação original (lista de dicts + pd.to_datetime por item)"""
+    if not forecast_data or 'list' not in forecast_data:
+        return None
+
+    data = []
+    for item in forecast_data['list']:
+        data.append({
+            'datetime': pd.to_datetime(item['dt'], unit='s'),
+            'temp': item['main']['temp'],
+            'temp_max': item['main']['temp_max'],
+            'temp_min': item['main']['temp_min'],
+            'feels_like': item['main']['feels_like'],
+            'humidity': item['main']['humidity'],
+            'pressure': item['main']['pressure'],
+            'clouds': item['clouds']['all'],
+            'wind_speed': item['wind']['speed'],
+            'description': item['weather'][0]['description'],
+            'rain': item.get('rain', {}).get('3h', 0)
+        })
+
+    df = pd.DataFrame(data)
+    df['date'] = df['datetime'].dt.date
+    return df
+
+
+def best_time(fn, payload, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[40, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'itens':>10} {'original (ms)':>15} {'colunar (ms)':>15} {'ganho':>8} {'memória':>12}")
+    for size in args.sizes:
+        payload = forecast_payload(size)
+        legacy, columnar = create_forecast_dataframe_legacy(payload), create_forecast_dataframe(payload)
+        # Mesmo conteúdo (a menos da precisão float32)
+        pd.testing.assert_frame_equal(legacy, columnar, check_dtype=False,
+                                      check_categorical=False, rtol=1e-5)
+        t_legacy = best_time(create_forecast_dataframe_legacy, payload, args.repeat)
+        t_columnar = best_time(create_forecast_dataframe, payload, args.repeat)
+        mem = (legacy.memory_usage(deep=True).sum() / columnar.memory_usage(deep=True).sum())
+        print(f"{size:>10} {t_legacy * 1000:>15.2f} {t_columnar * 1000:>15.2f} "
+              f"{t_legacy / t_columnar:>7.1f}x {mem:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Suíte de benchmarks dos caminhos críticos de processamento.
+
+Casos medidos, sobre payloads sintéticos de 40 a 1.000.000 de itens de
+previsão:
+
+* create_forecast_dataframe  conversão da resposta /forecast em DataFrame
+* compact_forecast           compactação da previsão para forecast_store
+* daily_summary              agregação diária da "Análise Semanal"
+* get_today_forecast         resumo do dia usado pelo notificador
+* format_weather_message     formatação da mensagem (N mensagens)
+* render:<gráfico>           desenho de cada gráfico do dashboard, sem cache
+
+Os resultados (melhor tempo de --repeat execuções) são gravados em
+benchmarks/results/latest.json e comparados com benchmarks/baseline.json;
+um caso mais lento que a baseline além de --threshold é sinalizado como
+regressão e o script termina com código 1.
+
+Uso:
+    python benchmarks/run_benchmarks.py                 # roda e compara
+    python benchmarks/run_benchmarks.py --save-baseline # grava a baseline
+    python benchmarks/run_benchmarks.py --max-size 10000 --only render
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import charts  # noqa: E402
+import forecast_store  # noqa: E402
+import send_weather  # noqa: E402
+import synthetic  # noqa: E402
+from forecast_frame import create_forecast_dataframe, daily_summary  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results', 'latest.json')
+
+SIZES = (40, 1000, 10000, 100000, 1000000)
+# Casos que não escalam para milhões de itens (desenho e mensagens)
+RENDER_MAX_SIZE = 1000
+MESSAGE_MAX_SIZE = 10000
+# Itens distintos sorteados por payload (o restante reaproveita os dicts)
+POOL_SIZE = 1000
+
+_payloads = {}
+
+
+def payload(size):
+    if size not in _payloads:
+        # Começa hoje para que get_today_forecast encontre slots do dia
+        start = int(time.time()) // 86400 * 86400
+        _payloads.clear()
+        _payloads[size] = synthetic.forecast_payload(size, start=start, pool_size=POOL_SIZE)
+    return _payloads[size]
+
+
+def _render(kind, daily=False):
+    draw, _ = charts.RENDERERS[kind]
+
+    def setup(size):
+        df = create_forecast_dataframe(payload(size))
+        if daily:
+            df = daily_summary(df)
+        if kind == 'historico':
+            df = df.assign(source='forecast')
+        return (df,)
+
+    def run(df):
+        charts._finish(draw(df, (14, 6)), 'png')
+
+    return setup, run, RENDER_MAX_SIZE
+
+
+def _messages(size):
+    current = synthetic.current_payload()
+    today = send_weather.get_today_forecast(synthetic.forecast_payload(40))
+    return current, today, size
+
+
+def _format_messages(current, today, count):
+    for _ in range(count):
+        send_weather.format_weather_message(current, today)
+
+
+# nome -> (prepara(tamanho) -> args, função medida, tamanho máximo)
+CASES = {
+    'create_forecast_dataframe': (lambda n: (payload(n),), create_forecast_dataframe, None),
+    'compact_forecast': (lambda n: (payload(n),), forecast_store.CompactForecast, None),
+    'daily_summary': (lambda n: (create_forecast_dataframe(payload(n)),), daily_summary, None),
+    'get_today_forecast': (lambda n: (payload(n),), send_weather.get_today_forecast, None),
+    'format_weather_message': (_messages, _format_messages, MESSAGE_MAX_SIZE),
+    'render:temperatura': _render('temperatura'),
+    'render:precipitacao': _render('precipitacao'),
+    'render:comparativo': _render('comparativo'),
+    'render:historico': _render('historico'),
+    'render:semanal_temperatura': _render('semanal_temperatura', daily=True),
+    'render:semanal_chuva': _render('semanal_chuva', daily=True),
+}
+
+
+def best_time(fn, args, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_cases(sizes, only, repeat):
+    results = {}
+    for size in sizes:
+        for name, (setup, fn, max_size) in CASES.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            if max_size is not None and size > max_size:
+                continue
+            args = setup(size)
+            # Casos muito grandes: uma única execução basta
+            elapsed = best_time(fn, args, 1 if size >= 1000000 else repeat)
+            results.setdefault(name, {})[str(size)] = elapsed
+            print(f"{name:<28} {size:>9} {elapsed * 1000:>12.2f} ms", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Lista de (caso, tamanho, atual, baseline) mais lentos que a baseline"""
+    regressions = []
+    for name, by_size in results.items():
+        for size, elapsed in by_size.items():
+            reference = baseline.get(name, {}).get(size)
+            if reference and elapsed > reference * (1 + threshold):
+                regressions.append((name, size, elapsed, reference))
+    return regressions
+
+
+def _write(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                   'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results},
+                  f, indent=1, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--max-size', type=int, default=None)
+    parser.add_argument('--only', nargs='+', default=None, help="prefixos dos casos a rodar")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="tolerância de lentidão em relação à baseline (0.25 = 25%%)")
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    sizes = [s for s in args.sizes if args.max_size is None or s <= args.max_size]
+    print(f"{'caso':<28} {'itens':>9} {'tempo':>15}")
+    results = run_cases(sizes, args.only, args.repeat)
+    _write(RESULTS_PATH, results)
+
+    if args.save_baseline:
+        _write(BASELINE_PATH, results)
+        print(f"\nBaseline gravada em {BASELINE_PATH}")
+        return
+
+    try:
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    except (OSError, ValueError, KeyError):
+        print("\nSem baseline para comparar (use --save-baseline)")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if not regressions:
+        print(f"\n✅ Nenhuma regressão acima de {args.threshold:.0%}")
+        return
+    print(f"\n❌ {len(regressions)} regressão(ões) acima de {args.threshold:.0%}:")
+    for name, size, elapsed, reference in regressions:
+        print(f"   {name} [{size}]: {elapsed * 1000:.2f} ms (baseline {reference * 1000:.2f} ms, "
+              f"+{elapsed / reference - 1:.0%})")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
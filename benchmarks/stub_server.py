@@ -0,0 +1,152 @@
+"""Servidor HTTP local que simula os serviços externos do projeto.
+
+Atende OpenWeather (/data/2.5/weather e /data/2.5/forecast), Nominatim
+(/nominatim/search), ipapi.co (/ipapi/json/), ipinfo.io (/ipinfo/json) e
+TextMeBot (/send.php). Para cada requisição, usa o fixture gravado pelo modo
+record de http_replay quando existir; senão, gera uma resposta sintética.
+Latência e falhas podem ser injetadas para testes de carga.
+
+Uso:
+    python benchmarks/stub_server.py --port 8765 --latency-ms 80 --error-rate 0.02
+
+e, em outro terminal:
+    WEATHER_STUB_URL=http://127.0.0.1:8765 streamlit run app.py
+    WEATHER_STUB_URL=http://127.0.0.1:8765 python send_weather.py
+
+GET /__stats retorna o número de requisições atendidas por rota.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import geocoding  # noqa: E402
+import http_replay  # noqa: E402
+import synthetic  # noqa: E402
+
+SLOT_SECONDS = 3 * 3600
+DEFAULT_LOCATION = {'city': 'Goiânia', 'region': 'Goiás', 'country': 'Brasil',
+                    'latitude': -16.6869, 'longitude': -49.2648}
+
+# Prefixo da rota -> serviço (mesmos nomes usados pelos fixtures de http_replay)
+ROUTES = {
+    '/data/2.5/': 'openweather',
+    '/nominatim/': 'nominatim',
+    '/ipapi/': 'ipapi',
+    '/ipinfo/': 'ipinfo',
+    '/send.php': 'textmebot',
+}
+
+
+def _seed(params):
+    lat, lon = float(params.get('lat', 0)), float(params.get('lon', 0))
+    return int(abs(lat) * 1000) * 7919 + int(abs(lon) * 1000)
+
+
+def synthetic_response(service, endpoint, params):
+    """(status, content_type, corpo) sintéticos para a rota"""
+    now = int(time.time())
+    if service == 'openweather' and endpoint == 'weather':
+        payload = synthetic.current_payload(seed=_seed(params), dt=now)
+        payload['coord'] = {'lat': float(params.get('lat', 0)), 'lon': float(params.get('lon', 0))}
+    elif service == 'openweather' and endpoint == 'forecast':
+        payload = synthetic.forecast_payload(40, seed=_seed(params), start=now - now % SLOT_SECONDS + SLOT_SECONDS)
+    elif service == 'nominatim':
+        city = geocoding.get_gazetteer().lookup(params.get('q', ''))
+        payload = [{'lat': str(city['latitude']), 'lon': str(city['longitude']),
+                    'display_name': f"{city['city']}, {city['region']}, {city['country']}"}] if city else []
+    elif service == 'ipapi':
+        payload = {'latitude': DEFAULT_LOCATION['latitude'], 'longitude': DEFAULT_LOCATION['longitude'],
+                   'city': DEFAULT_LOCATION['city'], 'region': DEFAULT_LOCATION['region'],
+                   'country_name': DEFAULT_LOCATION['country']}
+    elif service == 'ipinfo':
+        payload = {'loc': f"{DEFAULT_LOCATION['latitude']},{DEFAULT_LOCATION['longitude']}",
+                   'city': DEFAULT_LOCATION['city'], 'region': DEFAULT_LOCATION['region'], 'country': 'BR'}
+    elif service == 'textmebot':
+        return 200, 'text/plain; charset=utf-8', 'Success! Message queued for sending.'
+    else:
+        return 404, 'application/json', json.dumps({'cod': '404', 'message': 'not found'})
+    return 200, 'application/json; charset=utf-8', json.dumps(payload, ensure_ascii=False)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None
+    stats = Counter()
+    stats_lock = threading.Lock()
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == '/__stats':
+            with self.stats_lock:
+                return self._reply(200, 'application/json', json.dumps(self.stats))
+
+        service = next((name for prefix, name in ROUTES.items() if parts.path.startswith(prefix)), None)
+        endpoint = [segment for segment in parts.path.split('/') if segment][-1:] or ['']
+        endpoint = endpoint[0]
+        params = dict(parse_qsl(parts.query))
+        with self.stats_lock:
+            self.stats[f"{service}/{endpoint}"] += 1
+
+        config = self.config
+        delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000.0)
+        if random.random() < config.error_rate:
+            return self._reply(config.error_status, 'application/json',
+                               json.dumps({'cod': str(config.error_status), 'message': 'erro injetado'}))
+
+        fixture_params = sorted((k, v) for k, v in params.items() if k not in http_replay.IGNORED_PARAMS)
+        fixture = http_replay.load_fixture(service, endpoint, fixture_params, config.fixtures)
+        if fixture:
+            return self._reply(fixture['status'], fixture['content_type'], fixture['body'])
+        return self._reply(*synthetic_response(service, endpoint, params))
+
+    def _reply(self, status, content_type, body):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0, help="latência fixa por requisição")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="latência aleatória adicional (máximo)")
+    parser.add_argument('--error-rate', type=float, default=0, help="fração de respostas com erro")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--fixtures', default=http_replay.FIXTURES_DIR)
+    parser.add_argument('--verbose', action='store_true')
+    StubHandler.config = parser.parse_args()
+
+    server = ThreadingHTTPServer((StubHandler.config.host, StubHandler.config.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Servidor stub em http://{StubHandler.config.host}:{StubHandler.config.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(StubHandler.stats, indent=1))
+
+
+if __name__ == '__main__':
+    main()
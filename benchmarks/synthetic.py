@@ -0,0 +1,71 @@
+"""Geradores de respostas sintéticas da OpenWeather para os benchmarks.
+
+As respostas seguem o formato de /data/2.5/forecast (slots de 3 h) e
+/data/2.5/weather, com valores plausíveis e determinísticos (seed fixa).
+"""
+import random
+
+SLOT_SECONDS = 3 * 3600
+START_EPOCH = 1767236400  # 2026-01-01 03:00 UTC
+
+DESCRIPTIONS = ['céu limpo', 'algumas nuvens', 'nuvens dispersas', 'nublado',
+                'chuva leve', 'chuva moderada', 'chuva forte', 'trovoada']
+
+
+def forecast_item(rng, dt):
+    temp = rng.uniform(14, 36)
+    item = {
+        'dt': dt,
+        'main': {
+            'temp': temp,
+            'feels_like': temp + rng.uniform(-2, 3),
+            'temp_min': temp - rng.uniform(0, 3),
+            'temp_max': temp + rng.uniform(0, 3),
+            'pressure': rng.randint(1000, 1025),
+            'humidity': rng.randint(20, 100),
+        },
+        'weather': [{'description': rng.choice(DESCRIPTIONS)}],
+        'clouds': {'all': rng.randint(0, 100)},
+        'wind': {'speed': rng.uniform(0, 12), 'deg': rng.randint(0, 359)},
+    }
+    if rng.random() < 0.35:
+        item['rain'] = {'3h': rng.uniform(0.1, 20)}
+    return item
+
+
+def forecast_payload(n_items=40, seed=42, start=START_EPOCH, pool_size=None):
+    """Resposta /forecast com n_items slots consecutivos de 3 h.
+
+    Com pool_size, apenas pool_size itens são sorteados e os demais
+    reaproveitam seus dicts internos (só 'dt' muda), o que torna viável
+    gerar payloads com milhões de itens.
+    """
+    rng = random.Random(seed)
+    if pool_size is None or pool_size >= n_items:
+        items = [forecast_item(rng, start + i * SLOT_SECONDS) for i in range(n_items)]
+    else:
+        pool = [forecast_item(rng, start) for _ in range(pool_size)]
+        items = [dict(pool[i % pool_size], dt=start + i * SLOT_SECONDS) for i in range(n_items)]
+    return {
+        'cod': '200',
+        'cnt': n_items,
+        'list': items,
+        'city': {'name': 'Goiânia', 'country': 'BR', 'timezone': -10800},
+    }
+
+
+def current_payload(seed=42, dt=START_EPOCH):
+    """Resposta /weather com valores sintéticos"""
+    rng = random.Random(seed)
+    item = forecast_item(rng, dt)
+    return {
+        'cod': 200,
+        'name': 'Goiânia',
+        'dt': dt,
+        'main': item['main'],
+        'weather': item['weather'],
+        'clouds': item['clouds'],
+        'wind': item['wind'],
+        'visibility': 10000,
+        'sys': {'country': 'BR', 'sunrise': dt + 6 * 3600, 'sunset': dt + 19 * 3600},
+    }
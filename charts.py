@@ -0,0 +1,274 @@
+"""Renderização dos gráficos do dashboard com cache de imagens.
+
+Cada gráfico é desenhado com a API orientada a objetos do matplotlib
+(Figure), sem o registro global do pyplot, salvo em PNG/SVG e liberado
+explicitamente. Os bytes resultantes ficam em um cache LRU limitado por
+memória, com chave (impressão digital dos dados, tipo de gráfico, tamanho,
+formato): voltar a um gráfico já exibido não redesenha nada.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import telemetry
+
+TEMP_COLOR = '#FF6B6B'
+RAIN_COLOR = '#4A90E2'
+DPI = 100
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_ENTRIES = 256
+
+
+def fingerprint(df, columns=None):
+    """Impressão digital estável do conteúdo de um DataFrame"""
+    import pandas as pd
+
+    data = df if columns is None else df[list(columns)]
+    hashes = pd.util.hash_pandas_object(data, index=False).values
+    digest = hashlib.blake2b(hashes.tobytes(), digest_size=16)
+    digest.update(','.join(map(str, data.columns)).encode())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """Cache LRU de imagens renderizadas, limitado por bytes e por entradas"""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                telemetry.count('cache_requests_total', cache='chart', result='miss')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            telemetry.count('cache_requests_total', cache='chart', result='hit')
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = image
+            self._bytes += len(image)
+            while self._entries and (self._bytes > self.max_bytes
+                                     or len(self._entries) > self.max_entries):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_cache = RenderCache()
+
+
+def _new_figure(size):
+    # Importação tardia: o matplotlib só é carregado quando um gráfico é desenhado
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=size, dpi=DPI)
+
+
+def _finish(fig, fmt):
+    """Salva a figura e libera seus recursos"""
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    fig.clear()
+    return buffer.getvalue()
+
+
+def _rotate_xticks(ax):
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+
+
+def _temperature(df, size):
+    fig = _new_figure(size)
+    ax = fig.subplots()
+    ax.plot(df['datetime'], df['temp'], 'o-',
+            label='Temperatura', color=TEMP_COLOR, linewidth=2, markersize=6)
+    ax.fill_between(df['datetime'], df['temp_min'],
+                    df['temp_max'], alpha=0.2, color=TEMP_COLOR)
+    ax.set_xlabel('Data/Hora', fontsize=12)
+    ax.set_ylabel('Temperatura (°C)', fontsize=12)
+    ax.grid(True, alpha=0.3)
+    ax.legend(fontsize=11)
+    _rotate_xticks(ax)
+    return fig
+
+
+def _precipitation(df, size):
+    fig = _new_figure(size)
+    ax = fig.subplots()
+    ax.bar(df['datetime'], df['rain'],
+           color=RAIN_COLOR, alpha=0.7, width=0.08)
+    ax.set_xlabel('Data/Hora', fontsize=12)
+    ax.set_ylabel('Chuva (mm/3h)', fontsize=12)
+    ax.grid(True, alpha=0.3, axis='y')
+    _rotate_xticks(ax)
+    return fig
+
+
+def _comparative(df, size):
+    fig = _new_figure(size)
+    ax1 = fig.subplots()
+    ax1.plot(df['datetime'], df['temp'], 'o-',
+             color=TEMP_COLOR, label='Temperatura', linewidth=2, markersize=6)
+    ax1.set_ylabel('Temperatura (°C)', fontsize=12, color=TEMP_COLOR)
+    ax1.tick_params(axis='y', labelcolor=TEMP_COLOR)
+    ax1.grid(True, alpha=0.3)
+
+    ax2 = ax1.twinx()
+    ax2.bar(df['datetime'], df['rain'],
+            alpha=0.3, color=RAIN_COLOR, label='Precipitação', width=0.08)
+    ax2.set_ylabel('Chuva (mm/3h)', fontsize=12, color=RAIN_COLOR)
+    ax2.tick_params(axis='y', labelcolor=RAIN_COLOR)
+
+    ax1.set_xlabel('Data/Hora', fontsize=12)
+    lines1, labels1 = ax1.get_legend_handles_labels()
+    lines2, labels2 = ax2.get_legend_handles_labels()
+    ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left', fontsize=11)
+    _rotate_xticks(ax1)
+    return fig
+
+
+def _daily_ticks(ax, df_daily):
+    ax.set_xticks(range(len(df_daily)))
+    ax.set_xticklabels([d.strftime('%d/%m') for d in df_daily['date']], rotation=45)
+
+
+def _weekly_temperature(df_daily, size):
+    fig = _new_figure(size)
+    ax = fig.subplots()
+    ax.bar(range(len(df_daily)), df_daily['temp'], alpha=0.7, color=TEMP_COLOR, label='Média')
+    ax.plot(range(len(df_daily)), df_daily['temp_max'], 'ro-', label='Máxima', linewidth=2)
+    ax.plot(range(len(df_daily)), df_daily['temp_min'], 'bs-', label='Mínima', linewidth=2)
+    _daily_ticks(ax, df_daily)
+    ax.set_ylabel('Temperatura (°C)', fontsize=11)
+    ax.legend()
+    ax.grid(True, alpha=0.3, axis='y')
+    return fig
+
+
+def _weekly_rain(df_daily, size):
+    fig = _new_figure(size)
+    ax = fig.subplots()
+    ax.bar(range(len(df_daily)), df_daily['rain'], alpha=0.7, color=RAIN_COLOR)
+    _daily_ticks(ax, df_daily)
+    ax.set_ylabel('Chuva (mm)', fontsize=11)
+    ax.grid(True, alpha=0.3, axis='y')
+    return fig
+
+
+def _history(df, size):
+    fig = _new_figure(size)
+    ax = fig.subplots()
+    ax.plot(df['datetime'], df['temp'], '-',
+            color=TEMP_COLOR, label='Temperatura', linewidth=2)
+    observed = df[df['source'] == 'current']
+    ax.plot(observed['datetime'], observed['temp'], 'o',
+            color='#C0392B', label='Observado', markersize=6)
+    ax.set_xlabel('Data/Hora', fontsize=12)
+    ax.set_ylabel('Temperatura (°C)', fontsize=12)
+    ax.grid(True, alpha=0.3)
+    ax.legend(fontsize=11)
+    _rotate_xticks(ax)
+    return fig
+
+
+def _anomaly(df, size):
+    fig = _new_figure(size)
+    ax1, ax2 = fig.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': (2, 1)})
+    ax1.plot(df['datetime'], df['temp'], 'o-',
+             color=TEMP_COLOR, label='Previsão', linewidth=2, markersize=5)
+    ax1.plot(df['datetime'], df['normal'], '--', color='#555555', label='Normal', linewidth=2)
+    ax1.fill_between(df['datetime'], df['normal'] - df['normal_std'],
+                     df['normal'] + df['normal_std'], alpha=0.2, color='#888888', label='Normal ± 1 desvio')
+    ax1.set_ylabel('Temperatura (°C)', fontsize=12)
+    ax1.grid(True, alpha=0.3)
+    ax1.legend(fontsize=11)
+
+    colors = [TEMP_COLOR if value > 0 else RAIN_COLOR for value in df['anomaly'].fillna(0)]
+    ax2.bar(df['datetime'], df['anomaly'].fillna(0), color=colors, alpha=0.7, width=0.08)
+    ax2.axhline(0, color='#555555', linewidth=1)
+    ax2.set_xlabel('Data/Hora', fontsize=12)
+    ax2.set_ylabel('Anomalia (°C)', fontsize=12)
+    ax2.grid(True, alpha=0.3, axis='y')
+    _rotate_xticks(ax2)
+    return fig
+
+
+def _heatmap(df, size, column, cmap, label):
+    import numpy as np
+
+    lats = np.unique(df['lat'].to_numpy())
+    lons = np.unique(df['lon'].to_numpy())
+    values = df[column].to_numpy().reshape(len(lats), len(lons))
+    fig = _new_figure(size)
+    ax = fig.subplots()
+    image = ax.imshow(values, origin='lower', cmap=cmap, aspect='auto', interpolation='bilinear',
+                      extent=(lons[0], lons[-1], lats[0], lats[-1]))
+    fig.colorbar(image, ax=ax, label=label)
+    ax.plot((lons[0] + lons[-1]) / 2, (lats[0] + lats[-1]) / 2, 'k+', markersize=12)
+    ax.set_xlabel('Longitude', fontsize=12)
+    ax.set_ylabel('Latitude', fontsize=12)
+    return fig
+
+
+def _map_temperature(df, size):
+    return _heatmap(df, size, 'temp', 'coolwarm', 'Temperatura (°C)')
+
+
+def _map_rain(df, size):
+    return _heatmap(df, size, 'rain', 'Blues', 'Chuva (mm/h)')
+
+
+# Tipo de gráfico -> (função de desenho, colunas usadas na impressão digital)
+RENDERERS = {
+    'temperatura': (_temperature, ('datetime', 'temp', 'temp_min', 'temp_max')),
+    'precipitacao': (_precipitation, ('datetime', 'rain')),
+    'comparativo': (_comparative, ('datetime', 'temp', 'rain')),
+    'semanal_temperatura': (_weekly_temperature, ('date', 'temp', 'temp_max', 'temp_min')),
+    'semanal_chuva': (_weekly_rain, ('date', 'rain')),
+    'historico': (_history, ('datetime', 'temp', 'source')),
+    'anomalia': (_anomaly, ('datetime', 'temp', 'normal', 'normal_std', 'anomaly')),
+    'mapa_temperatura': (_map_temperature, ('lat', 'lon', 'temp')),
+    'mapa_chuva': (_map_rain, ('lat', 'lon', 'rain')),
+}
+
+
+def render_chart(kind, df, size=(14, 6), fmt='png', data_key=None):
+    """Renderiza um gráfico e retorna os bytes da imagem (PNG ou SVG).
+
+    data_key permite ao chamador informar uma impressão digital já conhecida
+    dos dados e evitar o hash do DataFrame.
+    """
+    draw, columns = RENDERERS[kind]
+    with telemetry.span('chart_render', kind=kind, rows=len(df)) as current:
+        data_key = data_key or fingerprint(df, columns)
+        key = (data_key, kind, tuple(size), fmt)
+        image = _cache.get(key)
+        current.set(cached=image is not None)
+        if image is None:
+            image = _finish(draw(df, size), fmt)
+            _cache.put(key, image)
+        return image
+
+
+def cache_stats():
+    """Estatísticas do cache de renderização"""
+    return _cache.stats()
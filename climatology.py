@@ -0,0 +1,201 @@
+"""Normais climatológicas incrementais por local, dia do ano e hora.
+
+Cada observação real (/weather) gravada em observation_store atualiza, na
+mesma transação, a média, a variância (algoritmo de Welford), a mínima e a
+máxima do seu balde (célula, métrica, dia do ano, hora local) em O(1): uma
+única linha é alterada e os dados brutos nunca são relidos. Previsões não
+entram nas normais, e uma observação já gravada não é contada de novo.
+
+Para comparar a previsão com as normais, os baldes vizinhos (±DOY_WINDOW
+dias e ±HOUR_WINDOW horas, contínuos na virada do dia) são combinados
+balde a balde pela fórmula paralela de Chan, sobre no máximo 366 x 24
+linhas agregadas por métrica.
+
+Uso:
+    python climatology.py --rebuild   # recalcula as normais a partir do histórico
+"""
+import argparse
+import time
+
+import observation_store
+
+METRICS = ('temp', 'humidity', 'pressure', 'wind_speed')
+# Vizinhança combinada na comparação (dias do ano e horas)
+DOY_WINDOW = 7
+HOUR_WINDOW = 1
+# Observações mínimas para uma normal ser exibida
+MIN_SAMPLES = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS normals (
+    cell TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    doy INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (cell, metric, doy, hour)
+) WITHOUT ROWID
+"""
+
+# Passo de Welford: todas as expressões do SET usam os valores antigos da linha
+_UPDATE = """
+INSERT INTO normals (cell, metric, doy, hour, n, mean, m2, min, max)
+VALUES (?, ?, ?, ?, 1, ?, 0, ?, ?)
+ON CONFLICT (cell, metric, doy, hour) DO UPDATE SET
+    n = n + 1,
+    mean = mean + (excluded.mean - mean) / (n + 1.0),
+    m2 = m2 + (excluded.mean - mean) * (excluded.mean - mean - (excluded.mean - mean) / (n + 1.0)),
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max)
+"""
+
+
+def local_bucket(dt, tz_offset=0):
+    """(dia do ano 1-366, hora) locais do instante dt (offset do fuso em segundos)"""
+    local = time.gmtime(int(dt) + int(tz_offset or 0))
+    return local.tm_yday, local.tm_hour
+
+
+def record(conn, cell, dt, values, tz_offset=0):
+    """Soma uma observação às normais (dentro da transação de conn).
+
+    values: dict métrica -> valor; métricas ausentes ou None são ignoradas.
+    """
+    doy, hour = local_bucket(dt, tz_offset)
+    conn.executemany(_UPDATE, [(cell, metric, doy, hour, value, value, value)
+                               for metric, value in values.items()
+                               if metric in METRICS and value is not None])
+
+
+def rebuild(path=None):
+    """Recalcula as normais a partir das observações gravadas; retorna quantas foram lidas.
+
+    Só é necessário para históricos gravados antes das normais existirem: a
+    partir daí, cada observação nova atualiza as normais ao ser gravada. As
+    observações antigas não guardam o fuso, e a hora local usa o fuso
+    padrão do notificador.
+    """
+    import daily_aggregation
+
+    conn = observation_store.connect(path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM normals")
+            rows = conn.execute(f"SELECT cell, dt, {', '.join(METRICS)} FROM observations "
+                                "WHERE source = 'current' ORDER BY cell, dt").fetchall()
+            offsets = daily_aggregation.utc_offsets([row[1] for row in rows])
+            for row, offset in zip(rows, offsets):
+                record(conn, row[0], row[1], dict(zip(METRICS, row[2:])), int(offset))
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def normals(cell, metric='temp', path=None):
+    """Normais combinadas com a vizinhança, como arrays (366 dias x 24 horas).
+
+    Retorna um dict com 'n', 'mean', 'std', 'min' e 'max' (NaN onde não há
+    observações); o dia do ano d fica na linha d - 1.
+    """
+    # Importação tardia: a gravação das observações não depende do NumPy
+    import numpy as np
+
+    # Eixo único dia do ano x hora (índice (doy - 1) * 24 + hora): um
+    # deslocamento de hora passa de 23 h para 0 h do dia seguinte
+    size = 366 * 24
+    n = np.zeros(size)
+    mean = np.zeros(size)
+    m2 = np.zeros(size)
+    low = np.full(size, np.inf)
+    high = np.full(size, -np.inf)
+
+    conn = observation_store.connect(path)
+    try:
+        rows = conn.execute("SELECT doy, hour, n, mean, m2, min, max FROM normals "
+                            "WHERE cell = ? AND metric = ?", (cell, metric)).fetchall()
+    finally:
+        conn.close()
+    if rows:
+        doy, hour, count, average, squares, minimum, maximum = (np.array(column) for column in zip(*rows))
+        index = (doy.astype(int) - 1) * 24 + hour.astype(int)
+        n[index] = count
+        mean[index] = average
+        m2[index] = squares
+        low[index] = minimum
+        high[index] = maximum
+
+    # Combinação paralela de Chan, um balde vizinho por vez:
+    # M2 = M2_a + M2_b + delta² * n_a * n_b / (n_a + n_b)
+    pooled_n = np.zeros(size)
+    pooled_mean = np.zeros(size)
+    pooled_m2 = np.zeros(size)
+    pooled_low = np.full(size, np.inf)
+    pooled_high = np.full(size, -np.inf)
+    for d_doy in range(-DOY_WINDOW, DOY_WINDOW + 1):
+        for d_hour in range(-HOUR_WINDOW, HOUR_WINDOW + 1):
+            shift = d_doy * 24 + d_hour
+            n_b, mean_b, m2_b = (np.roll(source, shift) for source in (n, mean, m2))
+            total = pooled_n + n_b
+            delta = mean_b - pooled_mean
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weight = np.where(total > 0, n_b / total, 0.0)
+            pooled_mean += delta * weight
+            pooled_m2 += m2_b + delta ** 2 * pooled_n * weight
+            pooled_n = total
+            np.minimum(pooled_low, np.roll(low, shift), out=pooled_low)
+            np.maximum(pooled_high, np.roll(high, shift), out=pooled_high)
+
+    shape = (366, 24)
+    count = pooled_n.reshape(shape)
+    empty = count == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = pooled_m2.reshape(shape) / (count - 1)
+    return {'n': count, 'mean': np.where(empty, np.nan, pooled_mean.reshape(shape)),
+            'std': np.where(count > 1, np.sqrt(variance), np.nan),
+            'min': np.where(empty, np.nan, pooled_low.reshape(shape)),
+            'max': np.where(empty, np.nan, pooled_high.reshape(shape))}
+
+
+def anomaly_frame(cell, df_forecast, tz_offset=0, metric='temp', path=None):
+    """Previsão comparada às normais do local: DataFrame por slot.
+
+    Colunas: datetime, o valor previsto (metric), normal, normal_std,
+    normal_min, normal_max, samples e anomaly. Slots com menos de
+    MIN_SAMPLES observações na vizinhança têm normal NaN.
+    """
+    import numpy as np
+    import pandas as pd
+
+    epochs = df_forecast['datetime'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    buckets = np.array([local_bucket(dt, tz_offset) for dt in epochs], dtype=int).reshape(-1, 2)
+    stats = normals(cell, metric, path)
+    index = (buckets[:, 0] - 1, buckets[:, 1])
+    samples = stats['n'][index]
+    enough = samples >= MIN_SAMPLES
+
+    def lookup(name):
+        return np.where(enough, stats[name][index], np.nan)
+
+    df = pd.DataFrame({'datetime': df_forecast['datetime'].to_numpy(),
+                       metric: df_forecast[metric].to_numpy(dtype=np.float64),
+                       'normal': lookup('mean'), 'normal_std': lookup('std'),
+                       'normal_min': lookup('min'), 'normal_max': lookup('max'),
+                       'samples': samples.astype(int)})
+    df['anomaly'] = df[metric] - df['normal']
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Normais climatológicas incrementais")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="recalcula as normais a partir das observações gravadas")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"Normais recalculadas a partir de {rebuild()} observações")
+    else:
+        parser.print_help()
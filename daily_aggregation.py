@@ -0,0 +1,193 @@
+"""Agregação diária por dia local, vetorizada (NumPy).
+
+Usada pelo dashboard (resumo da "Análise Semanal") e pelo notificador
+(resumo do dia): os instantes UTC da previsão são convertidos para o dia
+local do fuso informado e os valores são reduzidos por (grupo, dia) em uma
+única passada, sem loops Python por item. O grupo permite agregar de uma
+vez as previsões de muitas cidades, cada uma com o seu fuso.
+
+O fuso pode ser um nome IANA ('America/Sao_Paulo', com horário de verão),
+um offset fixo em segundos (como o campo city.timezone da OpenWeather) ou
+um tzinfo.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+DEFAULT_TIMEZONE = os.getenv('WEATHER_TIMEZONE', 'America/Sao_Paulo')
+DAY_SECONDS = 86400
+# Resolução da tabela de offsets: as transições de horário de verão ocorrem
+# em múltiplos de 15 minutos
+OFFSET_RESOLUTION = 900
+
+# Agregações padrão: nome da saída -> (coluna, função)
+DAILY_AGGREGATIONS = {
+    'temp': ('temp', 'mean'),
+    'temp_max': ('temp_max', 'max'),
+    'temp_min': ('temp_min', 'min'),
+    'rain': ('rain', 'sum'),
+    'humidity': ('humidity', 'mean'),
+    'wind_speed': ('wind_speed', 'mean'),
+}
+TODAY_AGGREGATIONS = {
+    'temp_max': ('temp_max', 'max'),
+    'temp_min': ('temp_min', 'min'),
+    'rain_total': ('rain', 'sum'),
+}
+
+_REDUCERS = {'max': np.maximum, 'min': np.minimum, 'sum': np.add, 'mean': np.add}
+
+
+def resolve_timezone(tz):
+    """tzinfo a partir de um nome IANA, offset em segundos, tzinfo ou None (padrão)"""
+    if tz is None:
+        tz = DEFAULT_TIMEZONE
+    if isinstance(tz, str):
+        return ZoneInfo(tz)
+    if isinstance(tz, (int, float, np.integer)):
+        return timezone(timedelta(seconds=int(tz)))
+    return tz
+
+
+def _offset_table(instants, tz):
+    return np.fromiter((datetime.fromtimestamp(int(t), tz).utcoffset().total_seconds()
+                        for t in instants), dtype=np.int64, count=len(instants))
+
+
+def utc_offsets(epochs, tz=None):
+    """Offset do fuso (segundos) em cada instante de epochs"""
+    tz = resolve_timezone(tz)
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if isinstance(tz, timezone):
+        return np.full(epochs.shape, int(tz.utcoffset(None).total_seconds()), dtype=np.int64)
+    if len(epochs) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # O offset só muda nas transições de horário de verão: o fuso é consultado
+    # no início de cada dia UTC presente e, apenas nos dias com transição, a
+    # cada intervalo de 15 minutos
+    days, inverse = np.unique(epochs // DAY_SECONDS, return_inverse=True)
+    bounds = np.union1d(days, days + 1)
+    table = _offset_table(bounds * DAY_SECONDS, tz)
+    at_start = table[np.searchsorted(bounds, days)]
+    at_end = table[np.searchsorted(bounds, days + 1)]
+    offsets = at_start[inverse]
+
+    changed = (at_start != at_end)[inverse]
+    if changed.any():
+        buckets, bucket_inverse = np.unique(epochs[changed] // OFFSET_RESOLUTION, return_inverse=True)
+        offsets[changed] = _offset_table(buckets * OFFSET_RESOLUTION, tz)[bucket_inverse]
+    return offsets
+
+
+def local_days(epochs, tz=None):
+    """Dia local (dias desde 1970-01-01 no fuso) de cada instante"""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    return (epochs + utc_offsets(epochs, tz)) // DAY_SECONDS
+
+
+def _local_days_by_group(epochs, groups, timezones):
+    days = np.empty(len(epochs), dtype=np.int64)
+    by_zone = {}
+    for group, tz in enumerate(timezones):
+        by_zone.setdefault(tz, []).append(group)
+    if len(by_zone) == 1:
+        return local_days(epochs, next(iter(by_zone)))
+    for tz, members in by_zone.items():
+        mask = np.isin(groups, members)
+        days[mask] = local_days(epochs[mask], tz)
+    return days
+
+
+def aggregate(epochs, columns, tz=None, groups=None, aggregations=DAILY_AGGREGATIONS):
+    """Reduz as colunas por (grupo, dia local).
+
+    epochs: instantes UTC em segundos; columns: dict nome -> array; groups:
+    id inteiro (0..n-1) do grupo de cada linha, opcional; tz: um fuso para
+    todas as linhas ou uma sequência com o fuso de cada grupo. Funções
+    aceitas em aggregations: 'max', 'min', 'sum' e 'mean'.
+
+    Retorna um dict de arrays, uma posição por (grupo, dia), ordenado por
+    grupo e dia: 'group', 'day' (datetime64[D] local), 'count' e as saídas
+    de aggregations.
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    n = len(epochs)
+    groups = np.zeros(n, dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    if tz is None or isinstance(tz, (str, int, tzinfo)):
+        days = local_days(epochs, tz)
+    else:
+        days = _local_days_by_group(epochs, groups, tz)
+
+    if n == 0:
+        empty = {'group': groups, 'day': days.astype('datetime64[D]'), 'count': groups}
+        empty.update((name, np.empty(0)) for name in aggregations)
+        return empty
+
+    # Chave única (grupo, dia); previsões já vêm em ordem e dispensam a ordenação
+    first_day = days.min()
+    span = int(days.max() - first_day) + 1
+    key = groups * span + (days - first_day)
+    order = None if np.all(key[1:] >= key[:-1]) else np.argsort(key, kind='stable')
+    if order is not None:
+        key = key[order]
+    starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+    counts = np.diff(np.append(starts, n))
+    group_keys = key[starts]
+
+    result = {
+        'group': group_keys // span,
+        'day': (first_day + group_keys % span).astype('datetime64[D]'),
+        'count': counts,
+    }
+    prepared = {}
+    for name, (column, func) in aggregations.items():
+        if column not in prepared:
+            values = np.asarray(columns[column], dtype=np.float64)
+            prepared[column] = values[order] if order is not None else values
+        reduced = _REDUCERS[func].reduceat(prepared[column], starts)
+        result[name] = reduced / counts if func == 'mean' else reduced
+    return result
+
+
+def today_summaries(forecasts, tz=None, now=None):
+    """Máxima, mínima e chuva acumulada do dia local corrente de várias previsões.
+
+    forecasts: lista de respostas /forecast (itens None são permitidos); tz:
+    um fuso para todas ou uma lista com o fuso de cada previsão. Retorna uma
+    lista com, para cada previsão, {'temp_max', 'temp_min', 'rain_total'} ou
+    None se ela não tem slots no dia de hoje.
+    """
+    from forecast_frame import extract_columns
+
+    now = time.time() if now is None else now
+    timezones = list(tz) if isinstance(tz, (list, tuple)) else [tz] * len(forecasts)
+    item_lists = [(forecast or {}).get('list') or [] for forecast in forecasts]
+    items = [item for item_list in item_lists for item in item_list]
+    groups = np.repeat(np.arange(len(forecasts)), [len(item_list) for item_list in item_lists])
+    epochs = np.fromiter((item['dt'] for item in items), dtype=np.int64, count=len(items))
+
+    today_by_zone = {}
+    for zone in timezones:
+        if zone not in today_by_zone:
+            today_by_zone[zone] = local_days([int(now)], zone)[0]
+    today = np.array([today_by_zone[zone] for zone in timezones], dtype=np.int64)
+
+    # Só os slots de hoje têm os demais campos extraídos e agregados
+    selected = np.flatnonzero(_local_days_by_group(epochs, groups, timezones) == today[groups])
+    columns = extract_columns([items[i] for i in selected])
+    daily = aggregate(epochs[selected], columns, timezones, groups[selected], TODAY_AGGREGATIONS)
+
+    results = [None] * len(forecasts)
+    for i, group in enumerate(daily['group']):
+        results[group] = {name: float(daily[name][i]) for name in TODAY_AGGREGATIONS}
+    return results
+
+
+def today_summary(forecast_data, tz=None, now=None):
+    """today_summaries para uma única previsão"""
+    if not forecast_data or 'list' not in forecast_data:
+        return None
+    return today_summaries([forecast_data], tz, now)[0]
@@ -0,0 +1,21 @@
+"""URLs dos serviços externos usados pelo dashboard e pelo notificador.
+
+Cada URL pode ser trocada por uma variável de ambiente própria. Com
+WEATHER_STUB_URL definida (ex.: http://127.0.0.1:8765), todos os serviços
+passam a apontar para o servidor local de benchmarks/stub_server.py, o que
+permite rodar o app.py e o send_weather.py sem acesso à internet.
+"""
+import os
+
+STUB_URL = os.getenv('WEATHER_STUB_URL', '').rstrip('/')
+
+
+def _url(env_name, default, stub_path):
+    return os.getenv(env_name) or (STUB_URL + stub_path if STUB_URL else default)
+
+
+OPENWEATHER_BASE_URL = _url('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/2.5', '/data/2.5')
+IPAPI_URL = _url('IPAPI_URL', 'https://ipapi.co/json/', '/ipapi/json/')
+IPINFO_URL = _url('IPINFO_URL', 'https://ipinfo.io/json', '/ipinfo/json')
+NOMINATIM_URL = _url('NOMINATIM_URL', 'https://nominatim.openstreetmap.org', '/nominatim')
+WHATSAPP_URL = _url('WHATSAPP_URL', 'https://api.textmebot.com/send.php', '/send.php')
@@ -0,0 +1,91 @@
+"""Conversão da resposta /forecast da OpenWeather em DataFrame colunar.
+
+Os campos são extraídos em uma única passada para arrays NumPy
+pré-alocados, os timestamps são convertidos de uma só vez e as colunas têm
+dtypes estáveis (float32 para valores numéricos, categórico para a
+descrição), o que mantém a conversão linear e compacta mesmo para entradas
+com várias cidades e centenas de milhares de linhas.
+
+O pandas só é importado ao montar o DataFrame: o notificador usa apenas
+extract_columns.
+"""
+import numpy as np
+
+import daily_aggregation
+import telemetry
+
+NUMERIC_COLUMNS = ('temp', 'temp_max', 'temp_min', 'feels_like', 'humidity',
+                   'pressure', 'clouds', 'wind_speed', 'rain')
+
+
+def extract_columns(items):
+    """Extrai os campos de forecast_data['list'] para arrays NumPy.
+
+    Retorna um dict com 'dt' (int64, epoch em segundos), as colunas de
+    NUMERIC_COLUMNS (float32) e 'description' (lista de str).
+    """
+    n = len(items)
+    dt = np.empty(n, dtype=np.int64)
+    columns = {name: np.empty(n, dtype=np.float32) for name in NUMERIC_COLUMNS}
+    temp, temp_max, temp_min = columns['temp'], columns['temp_max'], columns['temp_min']
+    feels_like, humidity, pressure = columns['feels_like'], columns['humidity'], columns['pressure']
+    clouds, wind_speed, rain = columns['clouds'], columns['wind_speed'], columns['rain']
+    description = [None] * n
+
+    for i, item in enumerate(items):
+        main = item['main']
+        dt[i] = item['dt']
+        temp[i] = main['temp']
+        temp_max[i] = main['temp_max']
+        temp_min[i] = main['temp_min']
+        feels_like[i] = main['feels_like']
+        humidity[i] = main['humidity']
+        pressure[i] = main['pressure']
+        clouds[i] = item['clouds']['all']
+        wind_speed[i] = item['wind']['speed']
+        description[i] = item['weather'][0]['description']
+        item_rain = item.get('rain')
+        rain[i] = item_rain.get('3h', 0) if item_rain else 0
+
+    columns['dt'] = dt
+    columns['description'] = description
+    return columns
+
+
+def frame_from_columns(columns):
+    """Monta o DataFrame de previsão a partir dos arrays de extract_columns"""
+    import pandas as pd
+
+    datetimes = pd.to_datetime(columns['dt'], unit='s')
+    data = {'datetime': datetimes}
+    data.update((name, columns[name]) for name in NUMERIC_COLUMNS[:-1])
+    data['description'] = pd.Categorical(columns['description'])
+    data['rain'] = columns['rain']
+    df = pd.DataFrame(data, copy=False)
+    df['date'] = df['datetime'].dt.date
+    return df
+
+
+def create_forecast_dataframe(forecast_data):
+    """Converte dados de previsão em DataFrame"""
+    if not forecast_data or 'list' not in forecast_data:
+        return None
+    with telemetry.span('dataframe', rows=len(forecast_data['list'])):
+        return frame_from_columns(extract_columns(forecast_data['list']))
+
+
+def daily_summary(df, tz=None):
+    """Agregação diária da previsão (média, máxima, mínima e chuva acumulada).
+
+    Os dias são os do fuso tz (nome IANA ou offset em segundos, como o
+    city.timezone da resposta /forecast); veja daily_aggregation.
+    """
+    import pandas as pd
+
+    epochs = df['datetime'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    columns = {name: df[name].to_numpy() for name in ('temp', 'temp_max', 'temp_min',
+                                                       'rain', 'humidity', 'wind_speed')}
+    daily = daily_aggregation.aggregate(epochs, columns, tz)
+    data = {'date': daily['day'].astype(object)}
+    data.update((name, daily[name]) for name in daily_aggregation.DAILY_AGGREGATIONS)
+    return pd.DataFrame(data)
@@ -0,0 +1,207 @@
+"""Armazenamento em memória, compacto e limitado, das previsões por local.
+
+Cada previsão /forecast é guardada como arrays tipados em vez do JSON
+original: os instantes como int32 (segundos a partir do primeiro slot), os
+valores numéricos como float32 em um único bloco (linha a linha, na ordem de
+forecast_frame.NUMERIC_COLUMNS) e a descrição como código uint16 de uma
+tabela de textos compartilhada entre todos os locais. Uma previsão de 5
+dias ocupa cerca de 2 KB, contra dezenas de KB do JSON decodificado.
+
+O armazenamento tem um orçamento de bytes (FORECAST_STORE_MAX_BYTES) com
+descarte LRU; os locais descartados voltam a ser lidos do cache em disco. A
+tabela de descrições conta no orçamento e tem no máximo
+FORECAST_STORE_MAX_DESCRIPTIONS textos: descrições novas além disso ficam
+na própria previsão.
+"""
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+import telemetry
+
+STORE_MAX_BYTES = int(os.getenv('FORECAST_STORE_MAX_BYTES', str(16 * 1024 * 1024)))
+# Código reservado: descrição guardada na própria previsão (tabela cheia)
+OVERFLOW_CODE = 0xFFFF
+MAX_DESCRIPTIONS = min(int(os.getenv('FORECAST_STORE_MAX_DESCRIPTIONS', '4096')), OVERFLOW_CODE)
+
+# Tabela de descrições (uma cópia de cada texto para todos os locais)
+_descriptions = []
+_description_codes = {}
+_descriptions_bytes = 0
+_descriptions_lock = threading.Lock()
+
+
+def intern_description(text):
+    """Código uint16 da descrição na tabela compartilhada; None se a tabela está cheia"""
+    global _descriptions_bytes
+    code = _description_codes.get(text)
+    if code is None:
+        with _descriptions_lock:
+            code = _description_codes.get(text)
+            if code is None:
+                if len(_descriptions) >= MAX_DESCRIPTIONS:
+                    return None
+                code = len(_descriptions)
+                _descriptions.append(text)
+                _description_codes[text] = code
+                # Texto e, aproximadamente, as referências na lista e no dicionário
+                _descriptions_bytes += sys.getsizeof(text) + 32
+    return code
+
+
+def descriptions_nbytes():
+    """Memória aproximada da tabela de descrições"""
+    return _descriptions_bytes
+
+
+class CompactForecast:
+    """Previsão de um local em arrays tipados"""
+
+    __slots__ = ('fingerprint', 'city_name', 'timezone', 'start', 'offsets', 'values', 'codes',
+                 'overflow')
+
+    def __init__(self, forecast_data, fingerprint=None):
+        items = forecast_data['list']
+        city = forecast_data.get('city') or {}
+        self.fingerprint = fingerprint
+        self.city_name = city.get('name')
+        self.timezone = city.get('timezone', 0)
+        self.start = items[0]['dt'] if items else 0
+        self.offsets = array('i')
+        self.values = array('f')
+        self.codes = array('H')
+        # Descrições fora da tabela compartilhada, por slot
+        self.overflow = None
+
+        start, values = self.start, self.values
+        for item in items:
+            main = item['main']
+            item_rain = item.get('rain')
+            self.offsets.append(item['dt'] - start)
+            values.extend((main['temp'], main['temp_max'], main['temp_min'], main['feels_like'],
+                           main['humidity'], main['pressure'], item['clouds']['all'],
+                           item['wind']['speed'], item_rain.get('3h', 0) if item_rain else 0))
+            description = item['weather'][0]['description']
+            code = intern_description(description)
+            if code is None:
+                if self.overflow is None:
+                    self.overflow = {}
+                self.overflow[len(self.codes)] = description
+                code = OVERFLOW_CODE
+            self.codes.append(code)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def nbytes(self):
+        """Memória ocupada (objeto, arrays e textos próprios)"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.offsets) + sys.getsizeof(self.values)
+                + sys.getsizeof(self.codes) + sys.getsizeof(self.city_name or '')
+                + sys.getsizeof(self.fingerprint or '')
+                + (sys.getsizeof(self.overflow) + sum(map(sys.getsizeof, self.overflow.values()))
+                   if self.overflow else 0))
+
+    def columns(self):
+        """Arrays no formato de forecast_frame.extract_columns"""
+        # Importação tardia: NumPy só é carregado ao montar o DataFrame
+        import numpy as np
+        from forecast_frame import NUMERIC_COLUMNS
+
+        n = len(self)
+        matrix = np.frombuffer(self.values, dtype=np.float32).reshape(n, len(NUMERIC_COLUMNS))
+        columns = {name: matrix[:, i] for i, name in enumerate(NUMERIC_COLUMNS)}
+        columns['dt'] = np.frombuffer(self.offsets, dtype=np.int32).astype(np.int64) + self.start
+        columns['description'] = [self.overflow[i] if code == OVERFLOW_CODE else _descriptions[code]
+                                  for i, code in enumerate(self.codes)]
+        return columns
+
+    def to_frame(self):
+        """DataFrame da previsão (o mesmo de create_forecast_dataframe)"""
+        from forecast_frame import frame_from_columns
+
+        with telemetry.span('dataframe', rows=len(self), source='store'):
+            return frame_from_columns(self.columns())
+
+
+class ForecastStore:
+    """Previsões compactas por chave de local, com orçamento de bytes e LRU"""
+
+    def __init__(self, max_bytes=STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Previsão guardada para key, ou None"""
+        with self._lock:
+            forecast = self._entries.get(key)
+            if forecast is None:
+                self.misses += 1
+                telemetry.count('cache_requests_total', cache='forecast_store', result='miss')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            telemetry.count('cache_requests_total', cache='forecast_store', result='hit')
+            return forecast
+
+    def put(self, key, forecast_data, fingerprint=None):
+        """Compacta e guarda a previsão; retorna o CompactForecast.
+
+        Se a previsão guardada tem a mesma fingerprint, ela é reaproveitada.
+        """
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and fingerprint is not None and current.fingerprint == fingerprint:
+                self._entries.move_to_end(key)
+                return current
+        forecast = CompactForecast(forecast_data, fingerprint)
+        size = forecast.nbytes
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = forecast
+            self._bytes += size
+            # A tabela de descrições (compartilhada) também conta no orçamento
+            while len(self._entries) > 1 and self._bytes + _descriptions_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return forecast
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes + _descriptions_bytes,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'descriptions': len(_descriptions),
+                    'descriptions_bytes': _descriptions_bytes}
+
+
+_store = ForecastStore()
+
+
+def get(key):
+    """Previsão compacta do local, ou None se não está em memória"""
+    return _store.get(key)
+
+
+def put(key, forecast_data, fingerprint=None):
+    """Guarda a previsão do local; retorna o CompactForecast"""
+    return _store.put(key, forecast_data, fingerprint)
+
+
+def stats():
+    """Estatísticas do armazenamento (entradas, bytes, acertos, descartes)"""
+    return _store.stats()
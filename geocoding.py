@@ -0,0 +1,243 @@
+"""Geocodificação da busca de cidades da barra lateral.
+
+A resolução segue três camadas, da mais barata para a mais cara:
+
+1. cache LRU em disco com as consultas já resolvidas (chave normalizada);
+2. gazetteer local (data/cidades.csv) com capitais e grandes cidades do
+   Brasil e do mundo, indexado para busca por prefixo;
+3. Nominatim (OpenStreetMap), somente quando as duas anteriores falham.
+"""
+import bisect
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import endpoints
+import telemetry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GAZETTEER_PATH = os.path.join(BASE_DIR, 'data', 'cidades.csv')
+CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', os.path.join(BASE_DIR, '.cache', 'geocode_cache.json'))
+CACHE_MAX_ENTRIES = 2000
+# Consultas sem resultado também são cacheadas, mas expiram em 1 dia
+NEGATIVE_TTL = 24 * 3600
+NOMINATIM_USER_AGENT = "weather_app"
+
+
+def normalize_query(text):
+    """Normaliza a consulta: minúsculas, sem acentos e com espaços colapsados"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    parts = [' '.join(part.split()) for part in text.split(',')]
+    return ', '.join(part for part in parts if part)
+
+
+class Gazetteer:
+    """Índice local de cidades com busca exata e por prefixo"""
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.cities = []
+        with open(path, encoding='utf-8') as f:
+            for rank, row in enumerate(csv.DictReader(f)):
+                self.cities.append({
+                    'city': row['nome'],
+                    'region': row['regiao'],
+                    'country': row['pais'],
+                    'latitude': float(row['latitude']),
+                    'longitude': float(row['longitude']),
+                    'rank': rank,
+                    # Estado e país entre espaços, para comparar os
+                    # qualificadores por palavras inteiras
+                    'search': f" {normalize_query(row['regiao'])} | {normalize_query(row['pais'])} ",
+                })
+        # Lista ordenada de (nome normalizado, índice) para busca por prefixo via bisect
+        self._keys = sorted((normalize_query(c['city']), i) for i, c in enumerate(self.cities))
+        self._names = [key for key, _ in self._keys]
+
+    def search_prefix(self, prefix, limit=10):
+        """Retorna as cidades cujo nome começa com o prefixo, em ordem de relevância"""
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._names, prefix)
+        end = bisect.bisect_right(self._names, prefix + '\uffff', lo=start)
+        matches = [self.cities[i] for _, i in self._keys[start:end]]
+        matches.sort(key=lambda c: c['rank'])
+        return matches[:limit]
+
+    def lookup(self, query):
+        """Resolve 'Cidade[, Estado][, País]' por nome exato; None se não houver"""
+        parts = normalize_query(query).split(', ')
+        name, qualifiers = parts[0], parts[1:]
+        start = bisect.bisect_left(self._names, name)
+        end = bisect.bisect_right(self._names, name, lo=start)
+        candidates = [self.cities[i] for _, i in self._keys[start:end]]
+        if not candidates:
+            return None
+        if not qualifiers:
+            return min(candidates, key=lambda c: c['rank'])
+        # Com estado/país informados, exige ao menos um qualificador em comum,
+        # em palavras inteiras (o país pode vir em outro idioma, ex.: "Brazil"
+        # vindo da API de IP)
+        scored = [(sum(f" {q} " in c['search'] for q in qualifiers), -c['rank'], c) for c in candidates]
+        score, _, best = max(scored, key=lambda item: item[:2])
+        return best if score else None
+
+
+class GeocodeCache:
+    """Cache LRU persistido em um arquivo JSON"""
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._entries.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key):
+        """Retorna (encontrado, resultado); resultado None indica busca sem sucesso"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry['result'] is None and time.time() - entry['cached_at'] > NEGATIVE_TTL:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry['result']
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = {'result': result, 'cached_at': time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def _merge_from_disk(self):
+        # Outros workers podem ter gravado desde a leitura: as entradas só do
+        # arquivo entram como as menos recentes, e a mais nova de cada chave vence
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                on_disk = json.load(f)
+        except (OSError, ValueError):
+            return
+        merged = OrderedDict((key, entry) for key, entry in on_disk.items()
+                             if key not in self._entries)
+        for key, entry in self._entries.items():
+            other = on_disk.get(key)
+            merged[key] = other if other and other['cached_at'] > entry['cached_at'] else entry
+        self._entries = merged
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self):
+        # Escrita atômica após mesclar o arquivo: vários workers do Streamlit
+        # compartilham o arquivo sem que o último a gravar apague o que os outros gravaram
+        self._merge_from_disk()
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Erro ao salvar cache de geocodificação: {e}")
+
+
+_gazetteer = None
+_cache = None
+_init_lock = threading.Lock()
+
+
+def get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _init_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = GeocodeCache()
+    return _cache
+
+
+def _geocode_nominatim(query):
+    # Importação tardia: o geopy só é carregado quando cache e gazetteer falham
+    from geopy.geocoders import Nominatim
+
+    url = urlsplit(endpoints.NOMINATIM_URL)
+    geolocator = Nominatim(user_agent=NOMINATIM_USER_AGENT, scheme=url.scheme,
+                           domain=url.netloc + url.path.rstrip('/'))
+    location = geolocator.geocode(query)
+    if not location:
+        return None
+    return {
+        'latitude': location.latitude,
+        'longitude': location.longitude,
+        'city': location.address.split(',')[0],
+        'address': location.address,
+    }
+
+
+def geocode(query):
+    """Resolve uma consulta de cidade em coordenadas.
+
+    Retorna um dict com latitude, longitude, city, address e source
+    ('cache', 'gazetteer' ou 'nominatim'), ou None se a localização não foi
+    encontrada. Erros de rede do Nominatim são propagados ao chamador.
+    """
+    with telemetry.span('geocode') as current:
+        result = _resolve(query)
+        current.set(source=result['source'] if result else None)
+        return result
+
+
+def _resolve(query):
+    key = normalize_query(query)
+    if not key:
+        return None
+
+    cache = get_cache()
+    found, result = cache.get(key)
+    telemetry.count('cache_requests_total', cache='geocode', result='hit' if found else 'miss')
+    if found:
+        return dict(result, source='cache') if result else None
+
+    city = get_gazetteer().lookup(key)
+    if city:
+        result = {
+            'latitude': city['latitude'],
+            'longitude': city['longitude'],
+            'city': city['city'],
+            'address': f"{city['city']}, {city['region']}, {city['country']}",
+        }
+        return dict(result, source='gazetteer')
+
+    with telemetry.span('upstream.nominatim'):
+        result = _geocode_nominatim(query)
+    cache.put(key, result)
+    return dict(result, source='nominatim') if result else None
+
+
+def suggest(prefix, limit=10):
+    """Sugestões de cidades do gazetteer local para autocompletar"""
+    return [f"{c['city']}, {c['region']}, {c['country']}"
+            for c in get_gazetteer().search_prefix(prefix, limit)]
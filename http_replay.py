@@ -0,0 +1,105 @@
+"""Transporte record/replay para a sessão HTTP compartilhada.
+
+Com WEATHER_HTTP_MODE=record, cada resposta recebida dos serviços externos é
+gravada em WEATHER_FIXTURES_DIR (padrão: fixtures/). Com
+WEATHER_HTTP_MODE=replay, as requisições são respondidas a partir desses
+arquivos, sem acesso à rede. Parâmetros sensíveis ou variáveis (chave da
+API, telefone, texto da mensagem) não fazem parte da chave do arquivo nem
+são gravados.
+
+O mesmo formato de arquivo é servido pelo servidor local
+benchmarks/stub_server.py.
+"""
+import hashlib
+import json
+import os
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.getenv('WEATHER_FIXTURES_DIR', os.path.join(BASE_DIR, 'fixtures'))
+MODE = os.getenv('WEATHER_HTTP_MODE', '').lower()
+
+SERVICE_HOSTS = {
+    'api.openweathermap.org': 'openweather',
+    'ipapi.co': 'ipapi',
+    'ipinfo.io': 'ipinfo',
+    'nominatim.openstreetmap.org': 'nominatim',
+    'api.textmebot.com': 'textmebot',
+}
+IGNORED_PARAMS = {'appid', 'apikey', 'phone', 'text'}
+
+
+def request_identity(url):
+    """(serviço, endpoint, parâmetros relevantes) de uma URL"""
+    parts = urlsplit(url)
+    service = SERVICE_HOSTS.get(parts.hostname, parts.hostname)
+    endpoint = [segment for segment in parts.path.split('/') if segment][-1:] or ['']
+    params = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in IGNORED_PARAMS)
+    return service, endpoint[0], params
+
+
+def fixture_path(service, endpoint, params, fixtures_dir=None):
+    key = json.dumps([service, endpoint, params], ensure_ascii=False)
+    name = f"{endpoint}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.json"
+    return os.path.join(fixtures_dir or FIXTURES_DIR, service, name)
+
+
+def load_fixture(service, endpoint, params, fixtures_dir=None):
+    """Fixture gravado para a requisição, ou None"""
+    try:
+        with open(fixture_path(service, endpoint, params, fixtures_dir), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_fixture(service, endpoint, params, status, content_type, body, fixtures_dir=None):
+    path = fixture_path(service, endpoint, params, fixtures_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'service': service, 'endpoint': endpoint, 'params': params,
+                   'status': status, 'content_type': content_type, 'body': body},
+                  f, ensure_ascii=False, indent=1)
+
+
+class RecordReplayAdapter(HTTPAdapter):
+    """HTTPAdapter que grava (record) ou reproduz (replay) as respostas"""
+
+    def __init__(self, *args, mode=None, **kwargs):
+        self.mode = mode or MODE
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        identity = request_identity(request.url)
+        if self.mode == 'replay':
+            fixture = load_fixture(*identity)
+            if fixture is None:
+                raise requests.ConnectionError(f"Sem fixture gravado para {identity}", request=request)
+            return self._build_replay_response(request, fixture)
+
+        response = super().send(request, **kwargs)
+        if self.mode == 'record':
+            save_fixture(*identity, response.status_code,
+                         response.headers.get('Content-Type', ''), response.text)
+        return response
+
+    @staticmethod
+    def _build_replay_response(request, fixture):
+        response = requests.Response()
+        response.status_code = fixture['status']
+        response.reason = 'Replay'
+        response.headers = CaseInsensitiveDict({'Content-Type': fixture['content_type']})
+        response._content = fixture['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+
+def adapter_class():
+    """Classe de adapter para a sessão conforme WEATHER_HTTP_MODE"""
+    return RecordReplayAdapter if MODE in ('record', 'replay') else HTTPAdapter
@@ -0,0 +1,136 @@
+"""Geolocalização por IP com requisições "hedged" entre vários provedores.
+
+O provedor mais saudável é consultado primeiro; se ele não responder dentro
+de HEDGE_DELAY (ou falhar), o próximo é disparado em paralelo, e assim por
+diante. A primeira resposta válida vence, as consultas ainda não iniciadas
+são canceladas e toda a busca respeita um orçamento total de latência.
+
+A saúde de cada provedor (latência média móvel e falhas consecutivas) é
+mantida no processo, de modo que provedores lentos ou fora do ar deixam de
+ser consultados primeiro.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import endpoints
+import telemetry
+import weather_client
+
+# Orçamento total da busca e atraso antes de disparar o próximo provedor
+LATENCY_BUDGET = 3.0
+HEDGE_DELAY = 0.4
+# Peso da nova amostra na média móvel de latência
+EWMA_ALPHA = 0.3
+# Penalidade (em segundos) por falha consecutiva na ordenação dos provedores
+FAILURE_PENALTY = 2.0
+
+
+def _parse_ipapi(data):
+    if 'latitude' in data and 'longitude' in data:
+        return {
+            'latitude': data['latitude'],
+            'longitude': data['longitude'],
+            'city': data.get('city', 'Desconhecido'),
+            'region': data.get('region', ''),
+            'country': data.get('country_name', ''),
+        }
+    return None
+
+
+def _parse_ipinfo(data):
+    if 'loc' in data:
+        lat, lon = data['loc'].split(',')
+        return {
+            'latitude': float(lat),
+            'longitude': float(lon),
+            'city': data.get('city', 'Desconhecido'),
+            'region': data.get('region', ''),
+            'country': data.get('country', ''),
+        }
+    return None
+
+
+PROVIDERS = [
+    {'name': 'ipapi.co', 'url': endpoints.IPAPI_URL, 'parse': _parse_ipapi},
+    {'name': 'ipinfo.io', 'url': endpoints.IPINFO_URL, 'parse': _parse_ipinfo},
+]
+
+_health = {p['name']: {'latency': 0.0, 'failures': 0, 'calls': 0} for p in PROVIDERS}
+_health_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2 * len(PROVIDERS), thread_name_prefix='ip_location')
+
+
+def _record(name, elapsed, ok):
+    with _health_lock:
+        health = _health[name]
+        if health['calls'] == 0:
+            health['latency'] = elapsed
+        else:
+            health['latency'] += EWMA_ALPHA * (elapsed - health['latency'])
+        health['calls'] += 1
+        health['failures'] = 0 if ok else health['failures'] + 1
+
+
+def _score(provider):
+    health = _health[provider['name']]
+    return health['latency'] + FAILURE_PENALTY * health['failures']
+
+
+def _query(provider, timeout):
+    """Consulta um provedor; retorna a localização ou None (nunca lança)"""
+    start = time.monotonic()
+    location = None
+    try:
+        response = weather_client.get_session().get(provider['url'], timeout=timeout)
+        location = provider['parse'](response.json())
+    except Exception as e:
+        print(f"Erro {provider['name']}: {e}")
+    elapsed = time.monotonic() - start
+    _record(provider['name'], elapsed, location is not None)
+    telemetry.log_event('ip_provider', provider=provider['name'],
+                        duration_ms=round(elapsed * 1000, 3), ok=location is not None)
+    return location
+
+
+def provider_health():
+    """Cópia do estado de saúde dos provedores"""
+    with _health_lock:
+        return {name: dict(health) for name, health in _health.items()}
+
+
+def locate(budget=LATENCY_BUDGET, hedge_delay=HEDGE_DELAY):
+    """Retorna a localização do IP atual ou None se nenhum provedor responder no orçamento"""
+    with telemetry.span('ip_lookup') as current:
+        location = _locate(budget, hedge_delay)
+        current.set(found=location is not None)
+        return location
+
+
+def _locate(budget, hedge_delay):
+    deadline = time.monotonic() + budget
+    with _health_lock:
+        pending_providers = sorted(PROVIDERS, key=_score)
+    running = set()
+
+    try:
+        while pending_providers or running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if pending_providers:
+                provider = pending_providers.pop(0)
+                running.add(_executor.submit(_query, provider, remaining))
+            # Espera a próxima resposta ou o momento de disparar o próximo provedor
+            timeout = min(hedge_delay, remaining) if pending_providers else remaining
+            done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                location = future.result()
+                if location:
+                    return location
+        return None
+    finally:
+        # Os perdedores que ainda não começaram são cancelados; os que já estão
+        # em andamento terminam em segundo plano (e atualizam a saúde)
+        for future in running:
+            future.cancel()
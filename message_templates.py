@@ -0,0 +1,378 @@
+"""Templates pré-compilados das mensagens de previsão do tempo.
+
+O layout da mensagem é descrito uma única vez, como dados (seções, linhas e
+textos por idioma), e compilado na primeira utilização para uma string de
+formatação por combinação de idioma e canal:
+
+* whatsapp  markdown do WhatsApp (*negrito*, emojis e separadores)
+* sms       texto simples e compacto, sem emojis nem marcação
+* html      fragmento HTML para e-mail (campos de texto escapados)
+
+A renderização é uma única chamada a str.format_map sobre um registro plano
+de campos já calculados (build_fields), de modo que formatar milhares de
+mensagens personalizadas custa pouco mais que a substituição dos valores.
+
+A descrição do tempo ('description') vem da própria API, no idioma em que a
+consulta foi feita.
+"""
+import abc
+import html
+import os
+import re
+from datetime import datetime
+
+DEFAULT_LOCALE = os.getenv('MESSAGE_LOCALE', 'pt_BR')
+DEFAULT_CHANNEL = 'whatsapp'
+
+SEPARATOR = '━━━━━━━━━━━━━━━━━━━━━━━'
+EMOJIS = {
+    'title': '🌦️', 'date': '📅', 'temperature': '🌡️', 'conditions': '☁️',
+    'rain': '🌧️', 'wind': '💨', 'humidity': '💧', 'sun': '☀️',
+    'closing': '✨', 'greeting': '👋', 'alert': '⚠️',
+}
+# Ordem das seções no corpo da mensagem
+SECTIONS = ('temperature', 'conditions', 'rain', 'wind', 'humidity', 'sun')
+# Limites (mm acumulados no dia) das categorias de chuva
+RAIN_LEVELS = ((5, 'light'), (25, 'moderate'), (float('inf'), 'heavy'))
+
+# Textos por idioma. **texto** marca negrito e [[nome]] um emoji de EMOJIS;
+# os campos entre chaves vêm de build_fields (mais month_name e wind_dir).
+LOCALES = {
+    'pt_BR': {
+        'months': ('Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho',
+                   'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'),
+        'wind_directions': ('N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                            'S', 'SSO', 'SO', 'OSO', 'O', 'ONO', 'NO', 'NNO'),
+        'title': 'PREVISÃO DO TEMPO - {city_upper}, {country}',
+        'date': '{day} de {month_name} de {year} - {time}',
+        'temperature': ('TEMPERATURA', (
+            'Atual: **{temp_current:.1f}°C**',
+            'Sensação térmica: {feels_like:.1f}°C',
+            'Máxima prevista: **{temp_max:.1f}°C**',
+            'Mínima prevista: **{temp_min:.1f}°C**')),
+        'conditions': ('CONDIÇÕES', (
+            'Status: {description}',
+            'Cobertura de nuvens: {cloudiness}%',
+            'Visibilidade: {visibility:.1f} km')),
+        'rain': ('CHUVA PREVISTA HOJE', ()),
+        'wind': ('VENTO', (
+            'Velocidade: {wind_speed:.1f} m/s ({wind_kmh:.1f} km/h)',
+            'Direção: {wind_dir} ({wind_deg}°)')),
+        'humidity': ('UMIDADE E PRESSÃO', (
+            'Umidade: {humidity}%',
+            'Pressão: {pressure} hPa')),
+        'sun': ('SOL', (
+            'Nascer: {sunrise}',
+            'Pôr: {sunset}')),
+        'rain_none': ('Sem previsão de chuva [[sun]]',),
+        'rain_amount': 'Acumulado previsto: **{rain_total:.1f} mm**',
+        'rain_light': 'Possibilidade: Chuva fraca',
+        'rain_moderate': 'Possibilidade: Chuva moderada',
+        'rain_heavy': 'Possibilidade: Chuva forte',
+        'closing': 'Tenha um ótimo dia! [[closing]]',
+        'greeting': 'Olá, {name}! [[greeting]]',
+        'alert': ('[[alert]] **ALERTA - {city_upper}**',
+                  '{metric_label} prevista: **{value:.1f} {unit}** nas próximas {hours} h',
+                  'Seu limite: {op} {threshold:g} {unit}'),
+        'alert_metrics': {'rain': 'Chuva acumulada', 'temp_max': 'Temperatura máxima',
+                          'temp_min': 'Temperatura mínima', 'wind': 'Velocidade do vento',
+                          'humidity': 'Umidade'},
+    },
+    'en': {
+        'months': ('January', 'February', 'March', 'April', 'May', 'June', 'July',
+                   'August', 'September', 'October', 'November', 'December'),
+        'wind_directions': ('N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                            'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW'),
+        'title': 'WEATHER FORECAST - {city_upper}, {country}',
+        'date': '{month_name} {day}, {year} - {time}',
+        'temperature': ('TEMPERATURE', (
+            'Now: **{temp_current:.1f}°C**',
+            'Feels like: {feels_like:.1f}°C',
+            'Expected high: **{temp_max:.1f}°C**',
+            'Expected low: **{temp_min:.1f}°C**')),
+        'conditions': ('CONDITIONS', (
+            'Status: {description}',
+            'Cloud cover: {cloudiness}%',
+            'Visibility: {visibility:.1f} km')),
+        'rain': ('RAIN EXPECTED TODAY', ()),
+        'wind': ('WIND', (
+            'Speed: {wind_speed:.1f} m/s ({wind_kmh:.1f} km/h)',
+            'Direction: {wind_dir} ({wind_deg}°)')),
+        'humidity': ('HUMIDITY AND PRESSURE', (
+            'Humidity: {humidity}%',
+            'Pressure: {pressure} hPa')),
+        'sun': ('SUN', (
+            'Sunrise: {sunrise}',
+            'Sunset: {sunset}')),
+        'rain_none': ('No rain expected [[sun]]',),
+        'rain_amount': 'Expected total: **{rain_total:.1f} mm**',
+        'rain_light': 'Chance: Light rain',
+        'rain_moderate': 'Chance: Moderate rain',
+        'rain_heavy': 'Chance: Heavy rain',
+        'closing': 'Have a great day! [[closing]]',
+        'greeting': 'Hi, {name}! [[greeting]]',
+        'alert': ('[[alert]] **ALERT - {city_upper}**',
+                  'Expected {metric_label}: **{value:.1f} {unit}** in the next {hours} h',
+                  'Your limit: {op} {threshold:g} {unit}'),
+        'alert_metrics': {'rain': 'total rain', 'temp_max': 'high', 'temp_min': 'low',
+                          'wind': 'wind speed', 'humidity': 'humidity'},
+    },
+    'es': {
+        'months': ('Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+                   'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'),
+        'wind_directions': ('N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                            'S', 'SSO', 'SO', 'OSO', 'O', 'ONO', 'NO', 'NNO'),
+        'title': 'PRONÓSTICO DEL TIEMPO - {city_upper}, {country}',
+        'date': '{day} de {month_name} de {year} - {time}',
+        'temperature': ('TEMPERATURA', (
+            'Actual: **{temp_current:.1f}°C**',
+            'Sensación térmica: {feels_like:.1f}°C',
+            'Máxima prevista: **{temp_max:.1f}°C**',
+            'Mínima prevista: **{temp_min:.1f}°C**')),
+        'conditions': ('CONDICIONES', (
+            'Estado: {description}',
+            'Nubosidad: {cloudiness}%',
+            'Visibilidad: {visibility:.1f} km')),
+        'rain': ('LLUVIA PREVISTA HOY', ()),
+        'wind': ('VIENTO', (
+            'Velocidad: {wind_speed:.1f} m/s ({wind_kmh:.1f} km/h)',
+            'Dirección: {wind_dir} ({wind_deg}°)')),
+        'humidity': ('HUMEDAD Y PRESIÓN', (
+            'Humedad: {humidity}%',
+            'Presión: {pressure} hPa')),
+        'sun': ('SOL', (
+            'Salida: {sunrise}',
+            'Puesta: {sunset}')),
+        'rain_none': ('Sin lluvia prevista [[sun]]',),
+        'rain_amount': 'Acumulado previsto: **{rain_total:.1f} mm**',
+        'rain_light': 'Posibilidad: Lluvia débil',
+        'rain_moderate': 'Posibilidad: Lluvia moderada',
+        'rain_heavy': 'Posibilidad: Lluvia fuerte',
+        'closing': '¡Que tengas un buen día! [[closing]]',
+        'greeting': '¡Hola, {name}! [[greeting]]',
+        'alert': ('[[alert]] **ALERTA - {city_upper}**',
+                  '{metric_label} prevista: **{value:.1f} {unit}** en las próximas {hours} h',
+                  'Tu límite: {op} {threshold:g} {unit}'),
+        'alert_metrics': {'rain': 'Lluvia acumulada', 'temp_max': 'Temperatura máxima',
+                          'temp_min': 'Temperatura mínima', 'wind': 'Velocidad del viento',
+                          'humidity': 'Humedad'},
+    },
+}
+
+_BOLD = re.compile(r'\*\*(.+?)\*\*')
+_EMOJI = re.compile(r'\[\[(\w+)\]\]')
+
+
+class Channel(abc.ABC):
+    """Marcação de um canal: negrito, emojis, cabeçalhos e junção das linhas"""
+
+    def __init__(self, bold, emojis, escape=False):
+        self.bold = bold
+        self.emojis = emojis
+        self.escape = escape
+
+    def inline(self, text):
+        text = _BOLD.sub(self.bold, text)
+        return _EMOJI.sub(lambda m: EMOJIS[m[1]] if self.emojis else '', text).rstrip()
+
+    @abc.abstractmethod
+    def document(self, title, date, sections, closing):
+        pass
+
+    @abc.abstractmethod
+    def lines(self, lines):
+        pass
+
+
+class WhatsAppChannel(Channel):
+
+    def __init__(self):
+        super().__init__(r'*\1*', emojis=True)
+
+    def document(self, title, date, sections, closing):
+        text = f"{EMOJIS['title']} *{title}*\n{EMOJIS['date']} {date}\n\n"
+        for emoji, heading, body in sections:
+            text += f"{SEPARATOR}\n{emoji} *{heading}*\n{SEPARATOR}\n{body}\n\n"
+        return text + closing
+
+    def lines(self, lines):
+        return '\n'.join(lines)
+
+
+class SmsChannel(Channel):
+
+    def __init__(self):
+        super().__init__(r'\1', emojis=False)
+
+    def document(self, title, date, sections, closing):
+        body = '\n'.join(f"{heading}\n{body}" for _, heading, body in sections)
+        return f"{title}\n{date}\n{body}\n{closing}"
+
+    def lines(self, lines):
+        return '\n'.join(lines)
+
+
+class HtmlChannel(Channel):
+
+    def __init__(self):
+        super().__init__(r'<b>\1</b>', emojis=True, escape=True)
+
+    def document(self, title, date, sections, closing):
+        parts = [f"<h2>{EMOJIS['title']} {title}</h2>", f"<p>{EMOJIS['date']} {date}</p>"]
+        for emoji, heading, body in sections:
+            parts.append(f"<h3>{emoji} {heading}</h3>")
+            parts.append(f"<p>{body}</p>")
+        parts.append(f"<p>{closing}</p>")
+        return '\n'.join(parts)
+
+    def lines(self, lines):
+        return '<br>\n'.join(lines)
+
+
+CHANNELS = {'whatsapp': WhatsAppChannel(), 'sms': SmsChannel(), 'html': HtmlChannel()}
+
+
+class MessageTemplate:
+    """Layout compilado para um idioma e um canal"""
+
+    def __init__(self, locale, channel):
+        strings = LOCALES[locale]
+        markup = CHANNELS[channel]
+        self.locale = locale
+        self.channel = channel
+        self.escape = markup.escape
+        self.months = strings['months']
+        self.wind_directions = strings['wind_directions']
+
+        # O bloco de chuva varia com a categoria; cada variante é compilada aqui
+        amount = markup.inline(strings['rain_amount'])
+        self.rain_blocks = {'none': markup.lines([markup.inline(line) for line in strings['rain_none']])}
+        for _, level in RAIN_LEVELS:
+            self.rain_blocks[level] = markup.lines([amount, markup.inline(strings[f'rain_{level}'])])
+
+        sections = []
+        for name in SECTIONS:
+            heading, lines = strings[name]
+            body = '{rain_block}' if name == 'rain' else markup.lines([markup.inline(l) for l in lines])
+            sections.append((EMOJIS[name] if markup.emojis else '', heading, body))
+        self.body = markup.document(markup.inline(strings['title']), markup.inline(strings['date']),
+                                    sections, markup.inline(strings['closing']))
+        self.greeting = markup.inline(strings['greeting'])
+        self.alert = markup.lines([markup.inline(line).strip() for line in strings['alert']])
+        self.alert_metrics = strings['alert_metrics']
+        self._separator = '\n\n' if channel != 'html' else '\n'
+
+    def render(self, fields):
+        """Mensagem completa a partir do registro de build_fields"""
+        if self.escape:
+            fields = {k: html.escape(v) if isinstance(v, str) else v for k, v in fields.items()}
+        rain_block = self.rain_blocks[fields['rain_level']].format_map(fields)
+        return self.body.format_map(dict(
+            fields,
+            month_name=self.months[fields['month'] - 1],
+            wind_dir=self.wind_directions[fields['wind_index']],
+            rain_block=rain_block,
+        ))
+
+    def render_alert(self, fields):
+        """Mensagem de alerta: city, metric, value, unit, hours, op e threshold"""
+        if self.escape:
+            fields = {k: html.escape(v) if isinstance(v, str) else v for k, v in fields.items()}
+        return self.alert.format_map(dict(fields, city_upper=fields['city'].upper(),
+                                          metric_label=self.alert_metrics[fields['metric']]))
+
+    def personalize(self, message, name):
+        """Prefixa a saudação do assinante a uma mensagem já renderizada"""
+        if not name:
+            return message
+        if self.escape:
+            name = html.escape(name)
+        return self.greeting.format(name=name) + self._separator + message
+
+
+_compiled = {}
+
+
+def get_template(locale=None, channel=DEFAULT_CHANNEL):
+    """Template compilado (e memorizado) para o idioma e canal.
+
+    Idiomas desconhecidos caem para DEFAULT_LOCALE; canais desconhecidos
+    levantam KeyError.
+    """
+    locale = locale if locale in LOCALES else DEFAULT_LOCALE
+    key = (locale, channel)
+    template = _compiled.get(key)
+    if template is None:
+        template = _compiled[key] = MessageTemplate(locale, channel)
+    return template
+
+
+def wind_index(degrees):
+    """Índice (0-15) da direção do vento na rosa dos ventos de 16 pontos"""
+    return int((degrees / 22.5) + 0.5) % 16
+
+
+def rain_level(rain_total):
+    if rain_total <= 0:
+        return 'none'
+    for limit, level in RAIN_LEVELS:
+        if rain_total < limit:
+            return level
+    return RAIN_LEVELS[-1][1]
+
+
+def _clock(dt):
+    # Equivalente a strftime('%H:%M'), sem o custo do strftime
+    return f"{dt.hour:02d}:{dt.minute:02d}"
+
+
+def build_fields(current_data, forecast_today, city, tz, now=None):
+    """Registro plano de campos da mensagem, independente de idioma e canal.
+
+    Lança KeyError/TypeError se a resposta da API estiver incompleta.
+    """
+    now = now or datetime.now(tz)
+    main = current_data['main']
+    wind = current_data['wind']
+    sys = current_data['sys']
+
+    if forecast_today:
+        temp_max = forecast_today['temp_max']
+        temp_min = forecast_today['temp_min']
+        rain_total = forecast_today['rain_total']
+    else:
+        temp_max = main['temp_max']
+        temp_min = main['temp_min']
+        rain_total = 0
+
+    wind_deg = wind.get('deg', 0)
+    return {
+        'city_upper': city.upper(),
+        'country': current_data.get('sys', {}).get('country', 'BR'),
+        'day': now.day,
+        'month': now.month,
+        'year': now.year,
+        'time': _clock(now),
+        'temp_current': main['temp'],
+        'feels_like': main['feels_like'],
+        'temp_max': temp_max,
+        'temp_min': temp_min,
+        'rain_total': rain_total,
+        'rain_level': rain_level(rain_total),
+        'humidity': main['humidity'],
+        'pressure': main['pressure'],
+        'wind_speed': wind['speed'],
+        'wind_kmh': wind['speed'] * 3.6,
+        'wind_deg': wind_deg,
+        'wind_index': wind_index(wind_deg),
+        'visibility': current_data.get('visibility', 0) / 1000,
+        'cloudiness': current_data['clouds']['all'],
+        'description': current_data['weather'][0]['description'].capitalize(),
+        'sunrise': _clock(datetime.fromtimestamp(sys['sunrise'], tz=tz)),
+        'sunset': _clock(datetime.fromtimestamp(sys['sunset'], tz=tz)),
+    }
+
+
+def render(fields, locale=None, channel=DEFAULT_CHANNEL):
+    """Atalho: get_template(locale, channel).render(fields)"""
+    return get_template(locale, channel).render(fields)
@@ -0,0 +1,273 @@
+"""Daemon do notificador: um processo residente com agendador interno.
+
+Em vez de um job a frio por horário, um único processo envia a previsão a
+cada assinante no horário local dele: o campo opcional 'send_at' ("HH:MM",
+padrão NOTIFY_SEND_AT) no fuso do campo 'timezone' (padrão
+WEATHER_TIMEZONE), com horário de verão. Os próximos envios ficam em uma
+fila de prioridade; todos os assinantes com envio no mesmo minuto formam um
+lote, enviado por send_weather.broadcast (uma busca por local distinto).
+
+Entre os lotes o processo mantém o pool de conexões (weather_client), o
+cache de respostas e as previsões compactas (forecast_store). NOTIFY_WARM_LEAD
+segundos antes de cada lote, as entradas de cache dos seus locais que
+estariam expiradas no horário são atualizadas, e o envio não espera pela
+API. O daemon também retoma as pendências da caixa de saída quando vencem e,
+se há assinantes com 'alerts', reavalia os alertas a cada atualização da
+previsão. O arquivo de assinantes é relido quando muda.
+
+Uso:
+    python notifier_daemon.py --subscribers subscribers.json
+"""
+import argparse
+import heapq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as clock, timedelta
+
+import alerts
+import daily_aggregation
+import outbox
+import send_weather
+import telemetry
+import weather_cache
+
+SEND_AT = os.getenv('NOTIFY_SEND_AT', '07:00')
+# Antecedência (s) do aquecimento do cache; menor que a validade do clima atual
+WARM_LEAD = min(int(os.getenv('NOTIFY_WARM_LEAD', '120')), weather_cache.CURRENT_TTL - 60)
+# Espera máxima entre verificações (arquivo de assinantes, caixa de saída)
+POLL_SECONDS = 60
+# Novas tentativas (a cada POLL_SECONDS) de um lote cujo envio falhou
+BATCH_RETRIES = 5
+
+
+def parse_clock(text):
+    """(hora, minuto) de um horário "HH:MM"; ValueError se inválido"""
+    hour, minute = (int(part) for part in str(text).strip().split(':'))
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"horário inválido: {text!r}")
+    return hour, minute
+
+
+def next_send_time(send_at, tz, after):
+    """Primeiro instante (epoch) depois de after em que o relógio local de tz marca send_at"""
+    hour, minute = parse_clock(send_at)
+    tz = daily_aggregation.resolve_timezone(tz)
+    day = datetime.fromtimestamp(after, tz).date()
+    for offset in range(3):
+        when = datetime.combine(day + timedelta(days=offset), clock(hour, minute), tz).timestamp()
+        if when > after:
+            return when
+    return None
+
+
+class SendScheduler:
+    """Próximo envio de cada assinante em uma fila de prioridade.
+
+    Cada entrada é (instante, índice, tentativa): a tentativa 0 é o envio
+    agendado; as seguintes são repetições de um lote que falhou.
+    """
+
+    def __init__(self, subscribers, now=None):
+        self.subscribers = subscribers
+        self._heap = []
+        self._attempts = {}
+        now = time.time() if now is None else now
+        for i, sub in enumerate(subscribers):
+            when = self._next(sub, now)
+            if when is not None:
+                self._heap.append((when, i, 0))
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _next(self, sub, after):
+        try:
+            return next_send_time(sub.get('send_at', SEND_AT),
+                                  sub.get('timezone', send_weather.TIMEZONE), after)
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Assinante {sub.get('city')} sem agendamento: {e}")
+            return None
+
+    def next_time(self):
+        """Instante do próximo envio, ou None se não há assinantes agendados"""
+        return self._heap[0][0] if self._heap else None
+
+    def upcoming(self, until):
+        """Assinantes com envio até until (sem retirá-los da fila)"""
+        return [self.subscribers[i] for when, i, _ in self._heap if when <= until]
+
+    def due(self, now):
+        """Retira e reagenda os envios vencidos até now; retorna os assinantes do lote"""
+        batch = []
+        while self._heap and self._heap[0][0] <= now:
+            when, i, attempt = heapq.heappop(self._heap)
+            batch.append(self.subscribers[i])
+            self._attempts[i] = attempt
+            if attempt == 0:
+                following = self._next(self.subscribers[i], when)
+                if following is not None:
+                    heapq.heappush(self._heap, (following, i, 0))
+        return batch
+
+    def retry(self, batch, when):
+        """Recoloca na fila, para when, os assinantes de um lote cujo envio falhou.
+
+        Retorna quantos foram reagendados (cada envio tem até BATCH_RETRIES
+        novas tentativas).
+        """
+        positions = {id(sub): i for i, sub in enumerate(self.subscribers)}
+        retried = 0
+        for sub in batch:
+            i = positions[id(sub)]
+            attempt = self._attempts.get(i, 0) + 1
+            if attempt <= BATCH_RETRIES:
+                heapq.heappush(self._heap, (when, i, attempt))
+                retried += 1
+        return retried
+
+
+def warm(subscribers, until, api_key=None):
+    """Atualiza no cache os locais dos assinantes cujas entradas expirariam antes de until"""
+    api_key = api_key or send_weather.OPENWEATHER_API_KEY
+    cells = {}
+    for sub in subscribers:
+        cells.setdefault(weather_cache.cell_key(sub['latitude'], sub['longitude']),
+                         (sub['latitude'], sub['longitude']))
+
+    def refresh(point):
+        try:
+            return weather_cache.prefetch(point[0], point[1], api_key, until)
+        except Exception as e:
+            print(f"⚠️ Erro ao aquecer o cache de {weather_cache.cell_key(*point)}: {e}")
+            return 0
+
+    with telemetry.span('warm', locations=len(cells)) as current:
+        with ThreadPoolExecutor(max_workers=send_weather.FETCH_CONCURRENCY) as executor:
+            calls = sum(executor.map(refresh, cells.values()))
+        current.set(calls=calls)
+    return calls
+
+
+def _load(path, now):
+    subscribers = send_weather.load_subscribers(path)
+    scheduler = SendScheduler(subscribers, now)
+    rules = alerts.rules_from_subscribers(subscribers)
+    engine = alerts.AlertEngine(alerts.RuleIndex(rules)) if rules else None
+    print(f"📋 {len(subscribers)} assinantes carregados de {path} ({len(scheduler)} agendados, "
+          f"{len(rules)} regras de alerta)")
+    return subscribers, scheduler, engine
+
+
+def _format(when):
+    return time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime(when))
+
+
+def next_alerts_time(subscribers, engine, now):
+    """Próxima avaliação dos alertas: quando expirar a primeira previsão das células com regras.
+
+    Segue a validade real das entradas (forecast_ttl), inclusive as novas
+    consultas curtas quando o modelo ainda não foi publicado.
+    """
+    expiries = [weather_cache.forecast_expires_at(sub['latitude'], sub['longitude'])
+                for sub in subscribers
+                if weather_cache.cell_key(sub['latitude'], sub['longitude']) in engine.index]
+    expiries = [when for when in expiries if when is not None]
+    return max(min(expiries), now + POLL_SECONDS) if expiries else now + POLL_SECONDS
+
+
+def run(subscribers_path):
+    """Laço do daemon: envia cada lote no horário e mantém o cache aquecido"""
+    subscribers, scheduler, engine = [], SendScheduler([]), None
+    loaded_mtime = None
+    warmed = None
+    next_alerts = 0
+    while True:
+        now = time.time()
+        try:
+            mtime = os.path.getmtime(subscribers_path)
+            if mtime != loaded_mtime:
+                loaded_mtime = mtime
+                subscribers, scheduler, engine = _load(subscribers_path, now)
+                next_alerts = 0
+        except (OSError, ValueError) as e:
+            # Arquivo ausente ou inválido (ex.: em edição): mantém os assinantes atuais
+            print(f"❌ Erro ao carregar {subscribers_path}: {e}")
+
+        # Um erro em uma etapa não encerra o daemon: fica registrado e o laço segue
+        try:
+            due = scheduler.next_time()
+
+            if due is not None and due <= now:
+                batch = scheduler.due(now)
+                following = scheduler.next_time()
+                # A espera por novas tentativas não atrasa o próximo lote
+                deadline = now + send_weather.DELIVERY_DEADLINE
+                if following is not None:
+                    deadline = min(deadline, max(following - WARM_LEAD, now + POLL_SECONDS))
+                print(f"\n⏰ Lote de {_format(due)}: {len(batch)} assinante(s)")
+                try:
+                    with telemetry.span('job', mode='daemon', subscribers=len(batch)):
+                        send_weather.broadcast(batch, deadline)
+                except Exception as e:
+                    # O lote já saiu da fila: volta para a próxima verificação
+                    retried = scheduler.retry(batch, now + POLL_SECONDS)
+                    print(f"❌ Erro no lote de {_format(due)}: {type(e).__name__}: {e} "
+                          f"({retried} assinante(s) reagendados)")
+                    telemetry.count('daemon_errors_total')
+                telemetry.flush()
+                continue
+
+            if due is not None and warmed != due and due - now <= WARM_LEAD:
+                # Margem de um minuto: o lote pode terminar depois do horário
+                warmed = due
+                calls = warm(scheduler.upcoming(due), due + 60)
+                print(f"🔥 Cache aquecido para o lote de {_format(due)} ({calls} chamadas à API)")
+
+            if engine is not None and now >= next_alerts:
+                # A previsão das células é rebuscada se expirou (max_stale=0): uma
+                # atualização publicada é avaliada assim que a entrada vence
+                next_alerts = now + POLL_SECONDS
+                with telemetry.span('job', mode='daemon_alerts'):
+                    send_weather.check_alerts(subscribers, engine, now + POLL_SECONDS)
+                telemetry.flush()
+                next_alerts = next_alerts_time(subscribers, engine, time.time())
+
+            pending = outbox.next_due()
+            if pending is not None and pending <= now:
+                with telemetry.span('job', mode='daemon_resume'):
+                    send_weather.deliver_messages([], now + POLL_SECONDS)
+                telemetry.flush()
+                pending = outbox.next_due()
+
+            wake = now + POLL_SECONDS
+            if due is not None:
+                wake = min(wake, due if warmed == due else due - WARM_LEAD)
+            if engine is not None:
+                wake = min(wake, next_alerts)
+            if pending is not None and pending > now:
+                wake = min(wake, pending)
+        except Exception as e:
+            print(f"❌ Erro no daemon: {type(e).__name__}: {e}")
+            telemetry.count('daemon_errors_total')
+            telemetry.flush()
+            wake = now + POLL_SECONDS
+        time.sleep(max(0.0, wake - time.time()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Daemon do notificador: envia a previsão no horário local de cada assinante")
+    parser.add_argument('--subscribers', default=send_weather.SUBSCRIBERS_FILE,
+                        help="arquivo JSON de assinantes (relido quando muda)")
+    args = parser.parse_args()
+
+    if not args.subscribers:
+        print("❌ ERRO: informe --subscribers (ou SUBSCRIBERS_FILE)")
+    elif not send_weather.OPENWEATHER_API_KEY:
+        print("❌ ERRO: OPENWEATHER_API_KEY não configurada!")
+    else:
+        try:
+            run(args.subscribers)
+        except KeyboardInterrupt:
+            print("\n👋 Daemon encerrado")
+        telemetry.flush()
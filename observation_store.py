@@ -0,0 +1,140 @@
+"""Armazenamento local de observações (SQLite) para a análise histórica.
+
+Cada resposta /weather (observação) e /forecast (previsão) é gravada de forma
+incremental, deduplicada por (célula, dt). Uma observação real sempre
+prevalece sobre uma previsão para o mesmo instante; previsões são
+atualizadas a cada nova rodada do modelo. A chave primária (cell, dt) serve
+de índice para as consultas por intervalo de tempo. Cada observação real nova
+também atualiza as normais incrementais (climatology.py) na mesma transação.
+"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv('OBSERVATIONS_DB', os.path.join(BASE_DIR, 'storage', 'observations.sqlite3'))
+
+COLUMNS = ('temp', 'temp_max', 'temp_min', 'feels_like', 'humidity', 'pressure',
+           'clouds', 'wind_speed', 'rain', 'description')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    cell TEXT NOT NULL,
+    dt INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    temp REAL,
+    temp_max REAL,
+    temp_min REAL,
+    feels_like REAL,
+    humidity REAL,
+    pressure REAL,
+    clouds REAL,
+    wind_speed REAL,
+    rain REAL,
+    description TEXT,
+    ingested_at INTEGER NOT NULL,
+    PRIMARY KEY (cell, dt)
+) WITHOUT ROWID
+"""
+
+_UPSERT = f"""
+INSERT INTO observations (cell, dt, source, {', '.join(COLUMNS)}, ingested_at)
+VALUES ({', '.join('?' * (len(COLUMNS) + 4))})
+ON CONFLICT (cell, dt) DO UPDATE SET
+    source = excluded.source,
+    {', '.join(f'{c} = excluded.{c}' for c in COLUMNS)},
+    ingested_at = excluded.ingested_at
+"""
+# Previsões nunca sobrescrevem observações reais
+_UPSERT_FORECAST = _UPSERT + "WHERE observations.source = 'forecast'"
+
+
+def connect(path=None):
+    """Abre uma conexão com o banco, criando o esquema se necessário"""
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_SCHEMA)
+    # Importação tardia: climatology importa este módulo
+    import climatology
+    conn.execute(climatology.SCHEMA)
+    return conn
+
+
+@contextmanager
+def _transaction(path=None):
+    conn = connect(path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _row(cell, source, item, rain, now):
+    main = item['main']
+    return (cell, int(item['dt']), source,
+            main['temp'], main['temp_max'], main['temp_min'], main['feels_like'],
+            main['humidity'], main['pressure'], item['clouds']['all'],
+            item['wind']['speed'], rain, item['weather'][0]['description'], now)
+
+
+def ingest_current(cell, current_data, path=None):
+    """Grava uma resposta /weather; retorna o número de linhas gravadas"""
+    if not current_data or 'main' not in current_data:
+        return 0
+    rain = (current_data.get('rain') or {}).get('1h', 0)
+    row = _row(cell, 'current', current_data, rain, int(time.time()))
+    with _transaction(path) as conn:
+        # Só uma observação ainda não gravada entra nas normais
+        seen = conn.execute("SELECT 1 FROM observations WHERE cell = ? AND dt = ? AND source = 'current'",
+                            (cell, row[1])).fetchone()
+        written = conn.execute(_UPSERT, row).rowcount
+        if not seen:
+            import climatology
+            climatology.record(conn, cell, row[1], dict(zip(COLUMNS, row[3:])),
+                               current_data.get('timezone', 0))
+        return written
+
+
+def ingest_forecast(cell, forecast_data, path=None):
+    """Grava os slots de uma resposta /forecast; retorna o número de linhas gravadas"""
+    if not forecast_data or 'list' not in forecast_data:
+        return 0
+    now = int(time.time())
+    rows = [_row(cell, 'forecast', item, (item.get('rain') or {}).get('3h', 0), now)
+            for item in forecast_data['list']]
+    with _transaction(path) as conn:
+        return conn.executemany(_UPSERT_FORECAST, rows).rowcount
+
+
+def query_range(cell, start, end, source=None, path=None):
+    """Retorna as linhas da célula com start <= dt < end (epoch) como DataFrame.
+
+    source=None retorna observações e previsões; 'current' ou 'forecast'
+    filtram por origem.
+    """
+    import pandas as pd
+
+    sql = (f"SELECT dt, source, {', '.join(COLUMNS)} FROM observations "
+           "WHERE cell = ? AND dt >= ? AND dt < ?")
+    params = [cell, int(start), int(end)]
+    if source:
+        sql += " AND source = ?"
+        params.append(source)
+    sql += " ORDER BY dt"
+
+    with _transaction(path) as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    df.insert(0, 'datetime', pd.to_datetime(df.pop('dt'), unit='s'))
+    df['date'] = df['datetime'].dt.date
+    return df
+
+
+def query_days_back(cell, days_back, source=None, now=None, path=None):
+    """Janela dos últimos days_back dias até o instante atual"""
+    now = now or time.time()
+    return query_range(cell, now - days_back * 86400, now + 1, source=source, path=path)
@@ -0,0 +1,225 @@
+"""Caixa de saída persistente (SQLite) para o envio de mensagens.
+
+Cada mensagem é gravada antes do envio com uma chave de idempotência por
+destinatário e por dia: enfileirar de novo a mensagem do mesmo dia (uma
+segunda execução do job, um retry do GitHub Actions) não gera outro envio.
+Os envios são feitos por um pool de workers limitado por um token bucket
+(limite de taxa do gateway), com novas tentativas e backoff exponencial
+para falhas transitórias.
+
+Uma mensagem em envio tem um "lease": se o processo morrer no meio, ela
+volta a ficar disponível quando o lease expira e é enviada pela próxima
+execução. Como o gateway não aceita chave de idempotência, uma queda
+exatamente entre o aceite do gateway e a gravação do resultado ainda pode
+gerar uma duplicata; todos os demais casos são entregues uma única vez.
+"""
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import request_control
+import telemetry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv('OUTBOX_DB', os.path.join(BASE_DIR, 'storage', 'outbox.sqlite3'))
+
+# Limite do gateway (mensagens por segundo e rajada) e tentativas por mensagem
+RATE_PER_SECOND = float(os.getenv('WHATSAPP_RATE_PER_SECOND', '1'))
+BURST = int(os.getenv('WHATSAPP_BURST', '5'))
+MAX_ATTEMPTS = int(os.getenv('WHATSAPP_MAX_ATTEMPTS', '5'))
+# Backoff: BASE_DELAY * 2^(tentativa-1), com jitter, limitado a MAX_DELAY
+BASE_DELAY = 2.0
+MAX_DELAY = 300.0
+# Tempo após o qual uma mensagem "em envio" é considerada abandonada
+LEASE_SECONDS = 120
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    key TEXT PRIMARY KEY,
+    day TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)"
+
+
+class DeliveryError(Exception):
+    """Falha de uma tentativa de envio"""
+
+
+class TransientError(DeliveryError):
+    """Falha temporária (rede, 429, 5xx): a mensagem é tentada de novo"""
+
+
+class PermanentError(DeliveryError):
+    """Falha de envio que não deve ser repetida (ex.: telefone inválido)"""
+
+
+def connect(path=None):
+    """Abre uma conexão com a caixa de saída, criando o esquema se necessário"""
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_SCHEMA)
+    conn.execute(_INDEX)
+    return conn
+
+
+@contextmanager
+def _transaction(path=None):
+    # BEGIN IMMEDIATE: a reserva de mensagens não disputa com outro processo
+    conn = connect(path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def idempotency_key(phone, day, kind=None):
+    """Chave de uma mensagem: um envio por destinatário por dia (e por tipo, se houver)"""
+    digits = ''.join(ch for ch in str(phone) if ch.isdigit())
+    return f"{day}:{kind}:{digits}" if kind else f"{day}:{digits}"
+
+
+def enqueue(items, day, path=None):
+    """Grava [(telefone, mensagem), ...] do dia; retorna quantas eram novas.
+
+    Um item (telefone, mensagem, tipo) tem chave própria para o tipo (ex.:
+    um alerta), independente da previsão diária. Mensagens cuja chave já
+    existe (enviadas ou pendentes) são ignoradas.
+    """
+    now = time.time()
+    rows = [(idempotency_key(phone, day, *kind), day, str(phone), message, now, now)
+            for phone, message, *kind in items]
+    with _transaction(path) as conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT INTO outbox (key, day, phone, message, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO NOTHING", rows)
+        return conn.total_changes - before
+
+
+def expire_old(day, path=None):
+    """Descarta pendências de dias anteriores (a previsão já não vale)"""
+    with _transaction(path) as conn:
+        return conn.execute(
+            "UPDATE outbox SET status = 'expired' "
+            "WHERE day < ? AND status IN ('pending', 'sending')", (day,)).rowcount
+
+
+def claim(limit, path=None, now=None):
+    """Reserva até limit mensagens prontas para envio (inclusive leases vencidos)"""
+    now = now or time.time()
+    with _transaction(path) as conn:
+        rows = conn.execute(
+            "SELECT key, phone, message, attempts FROM outbox "
+            "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+            "   OR (status = 'sending' AND lease_until <= ?) "
+            "ORDER BY next_attempt_at LIMIT ?", (now, now, limit)).fetchall()
+        conn.executemany("UPDATE outbox SET status = 'sending', lease_until = ? WHERE key = ?",
+                         [(now + LEASE_SECONDS, row[0]) for row in rows])
+    return rows
+
+
+def next_due(path=None):
+    """Instante da próxima tentativa pendente, ou None se não há pendências"""
+    with _transaction(path) as conn:
+        row = conn.execute(
+            "SELECT MIN(CASE status WHEN 'pending' THEN next_attempt_at ELSE lease_until END) "
+            "FROM outbox WHERE status IN ('pending', 'sending')").fetchone()
+    return row[0]
+
+
+def backoff_delay(attempts):
+    """Espera antes da tentativa attempts+1 (exponencial com jitter)"""
+    delay = min(MAX_DELAY, BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _record(key, attempts, error, max_attempts, path=None):
+    now = time.time()
+    with _transaction(path) as conn:
+        if error is None:
+            conn.execute("UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, "
+                         "lease_until = NULL, last_error = NULL WHERE key = ?", (attempts, now, key))
+            return 'sent'
+        message = f"{type(error).__name__}: {error}"[:500]
+        if isinstance(error, PermanentError) or attempts >= max_attempts:
+            conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, lease_until = NULL, "
+                         "last_error = ? WHERE key = ?", (attempts, message, key))
+            return 'failed'
+        conn.execute("UPDATE outbox SET status = 'pending', attempts = ?, lease_until = NULL, "
+                     "next_attempt_at = ?, last_error = ? WHERE key = ?",
+                     (attempts, now + backoff_delay(attempts), message, key))
+        return 'retry'
+
+
+def deliver(send, workers=8, rate_per_second=RATE_PER_SECOND, burst=BURST,
+            max_attempts=MAX_ATTEMPTS, deadline=None, path=None):
+    """Envia as mensagens pendentes até esvaziar a caixa de saída.
+
+    send(phone, message) deve lançar exceção em caso de falha (PermanentError
+    para falhas que não adianta repetir). deadline (epoch) interrompe a espera
+    por novas tentativas; o que restar fica pendente para a próxima execução.
+    Retorna a contagem de resultados {'sent', 'retry', 'failed'}.
+    """
+    bucket = request_control.TokenBucket(burst, rate_per_second)
+    results = {'sent': 0, 'retry': 0, 'failed': 0}
+
+    def attempt(row):
+        key, phone, message, attempts = row
+        bucket.acquire()
+        error = None
+        try:
+            send(phone, message)
+        except Exception as e:
+            error = e
+        outcome = _record(key, attempts + 1, error, max_attempts, path)
+        telemetry.count('outbox_deliveries_total', result=outcome)
+        return outcome
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox') as executor:
+        while True:
+            rows = claim(max(workers * 4, 1), path)
+            if rows:
+                for outcome in executor.map(attempt, rows):
+                    results[outcome] += 1
+                continue
+            due = next_due(path)
+            if due is None:
+                break
+            wait = max(0.0, due - time.time())
+            if deadline is not None and time.time() + wait > deadline:
+                break
+            time.sleep(min(wait, LEASE_SECONDS))
+    return results
+
+
+def stats(day=None, path=None):
+    """Contagem de mensagens por status (opcionalmente de um dia)"""
+    sql = "SELECT status, COUNT(*) FROM outbox"
+    params = ()
+    if day:
+        sql += " WHERE day = ?"
+        params = (day,)
+    with _transaction(path) as conn:
+        return dict(conn.execute(sql + " GROUP BY status", params).fetchall())
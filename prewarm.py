@@ -0,0 +1,280 @@
+"""Pré-aquecimento do cache de respostas pelos locais mais acessados.
+
+O dashboard (a cada cidade aberta em uma sessão) e o notificador (a cada
+assinante) registram acessos por célula de grade em um SQLite local. Antes
+de cada horário de pico, o pré-aquecedor atualiza no cache compartilhado
+(response_cache) o clima atual e a previsão dos PREWARM_TOP locais mais
+acessados cujas entradas estariam expiradas no pico, e refaz a
+geocodificação das buscas correspondentes. Assim o primeiro usuário da
+manhã e o notificador no mesmo host (notifier_daemon ou cron local)
+encontram o cache pronto. O job do GitHub Actions roda em uma máquina
+nova a cada execução, sem esse cache, e não se beneficia.
+
+Os picos são os de PREWARM_PEAKS (horários UTC, padrão 10:00, o do job do
+notificador) mais as horas com mais acessos registrados. As chamadas à API
+são limitadas por execução (PREWARM_BUDGET) e espaçadas (PREWARM_PER_MINUTE)
+para deixar folga da cota aos usuários.
+
+Uso:
+    python prewarm.py          # daemon: dorme até PREWARM_LEAD antes de cada pico
+    python prewarm.py --once   # pré-aquece agora e sai
+    python prewarm.py --top    # mostra o ranking de locais
+"""
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import geocoding
+import request_control
+import telemetry
+import weather_cache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv('PREWARM_DB', os.path.join(BASE_DIR, 'storage', 'popularity.sqlite3'))
+OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
+
+TOP_N = int(os.getenv('PREWARM_TOP', '50'))
+# Chamadas à API por execução e ritmo máximo (chamadas por minuto)
+BUDGET = int(os.getenv('PREWARM_BUDGET', '100'))
+# (no mínimo 1: um ritmo 0 nunca liberaria chamadas)
+PER_MINUTE = max(1.0, float(os.getenv('PREWARM_PER_MINUTE', str(request_control.OPENWEATHER_PER_MINUTE // 2))))
+WORKERS = int(os.getenv('PREWARM_WORKERS', '4'))
+# Antecedência em relação ao pico (s): o clima atual vale 10 min no cache
+LEAD = int(os.getenv('PREWARM_LEAD', '300'))
+PEAKS = os.getenv('PREWARM_PEAKS', '10:00')
+# Horas de maior acesso somadas aos picos configurados
+LEARNED_PEAKS = 2
+
+# Os acessos valem menos com o tempo (meia-vida de HALF_LIFE). Em vez de
+# decair todas as linhas, cada acesso soma 2^((t - época) / HALF_LIFE): a
+# ordem entre os locais é a mesma dos escores decaídos. Para o peso não
+# estourar o float, a época avança (e os escores são reescalados) quando
+# fica REBASE_HALF_LIVES meias-vidas para trás
+HALF_LIFE = 7 * 86400
+EPOCH = 1700000000
+REBASE_HALF_LIVES = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    cell TEXT PRIMARY KEY,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    name TEXT,
+    query TEXT,
+    score REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+_HOURS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hours (
+    hour INTEGER PRIMARY KEY,
+    score REAL NOT NULL
+)
+"""
+_META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+)
+"""
+
+
+def connect(path=None):
+    """Abre uma conexão com o banco de acessos, criando o esquema se necessário"""
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_SCHEMA)
+    conn.execute(_HOURS_SCHEMA)
+    conn.execute(_META_SCHEMA)
+    return conn
+
+
+@contextmanager
+def _transaction(path=None):
+    conn = connect(path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _weight(now, epoch, count=1):
+    return count * 2.0 ** ((now - epoch) / HALF_LIFE)
+
+
+def _epoch(conn, now=None):
+    """Época dos escores; com now, avança a época (reescalando os escores) se ficou para trás"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()
+    epoch = row[0] if row else EPOCH
+    if now is None:
+        return epoch
+    shift = int((now - epoch) // HALF_LIFE)
+    if shift < REBASE_HALF_LIVES:
+        return epoch
+    factor = 2.0 ** -shift
+    conn.execute("UPDATE locations SET score = score * ?", (factor,))
+    conn.execute("UPDATE hours SET score = score * ?", (factor,))
+    epoch += shift * HALF_LIFE
+    conn.execute("INSERT INTO meta (key, value) VALUES ('epoch', ?) "
+                 "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (epoch,))
+    return epoch
+
+
+def record_accesses(accesses, now=None, path=None):
+    """Registra acessos [(lat, lon, nome, busca), ...]; nome e busca podem ser None"""
+    now = now or time.time()
+    rows = {}
+    for lat, lon, name, query in accesses:
+        lat, lon = weather_cache.snap_to_grid(lat, lon)
+        cell = weather_cache.cell_key(lat, lon)
+        count = rows[cell][5] + 1 if cell in rows else 1
+        rows[cell] = (cell, lat, lon, name, query, count)
+    if not rows:
+        return
+    with _transaction(path) as conn:
+        epoch = _epoch(conn, now)
+        conn.executemany(
+            "INSERT INTO locations (cell, lat, lon, name, query, score, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (cell) DO UPDATE SET "
+            "score = score + excluded.score, accessed_at = excluded.accessed_at, "
+            "name = COALESCE(excluded.name, name), query = COALESCE(excluded.query, query)",
+            [(cell, lat, lon, name, query, _weight(now, epoch, count), now)
+             for cell, lat, lon, name, query, count in rows.values()])
+        conn.execute(
+            "INSERT INTO hours (hour, score) VALUES (?, ?) "
+            "ON CONFLICT (hour) DO UPDATE SET score = score + excluded.score",
+            (int(now // 3600 % 24), _weight(now, epoch, len(accesses))))
+
+
+def record_access(lat, lon, name=None, query=None, path=None):
+    """Registra um acesso a um local (ex.: cidade aberta no dashboard)"""
+    record_accesses([(lat, lon, name, query)], path=path)
+
+
+def top_locations(n=TOP_N, now=None, path=None):
+    """Os n locais mais acessados: dicts com cell, lat, lon, name, query e score"""
+    now = now or time.time()
+    with _transaction(path) as conn:
+        epoch = _epoch(conn)
+        rows = conn.execute("SELECT cell, lat, lon, name, query, score FROM locations "
+                            "ORDER BY score DESC LIMIT ?", (n,)).fetchall()
+    scale = _weight(now, epoch)
+    return [{'cell': cell, 'lat': lat, 'lon': lon, 'name': name, 'query': query,
+             'score': score / scale} for cell, lat, lon, name, query, score in rows]
+
+
+def peak_minutes(path=None):
+    """Minutos do dia (UTC) dos picos: os configurados e as horas mais acessadas"""
+    minutes = set()
+    for peak in PEAKS.split(','):
+        if peak.strip():
+            hour, minute = peak.strip().split(':')
+            minutes.add(int(hour) * 60 + int(minute))
+    with _transaction(path) as conn:
+        hours = conn.execute("SELECT hour FROM hours ORDER BY score DESC LIMIT ?",
+                             (LEARNED_PEAKS,)).fetchall()
+    minutes.update(row[0] * 60 for row in hours)
+    return sorted(minutes)
+
+
+def next_peak(after, path=None):
+    """Instante (epoch) do primeiro pico depois de after"""
+    day = after // 86400 * 86400
+    minutes = peak_minutes(path)
+    for offset in (0, 86400):
+        for minute in minutes:
+            peak = day + offset + minute * 60
+            if peak > after:
+                return peak
+    return None
+
+
+def prewarm(api_key=None, until=None, top=TOP_N, budget=BUDGET, workers=WORKERS, path=None):
+    """Atualiza o cache dos top locais mais acessados para o instante until.
+
+    Retorna {'locations', 'calls', 'errors'}.
+    """
+    api_key = api_key or OPENWEATHER_API_KEY
+    until = until or time.time() + LEAD
+    deadline = max(until, time.time() + LEAD)
+    locations = top_locations(top, path=path)
+    # budget chamadas por execução, no ritmo de PER_MINUTE
+    allowance = request_control.TokenBucket(budget, 0)
+    pace = request_control.TokenBucket(max(1, math.ceil(PER_MINUTE / 6)), PER_MINUTE / 60.0)
+    calls = [0]
+    errors = [0]
+    lock = threading.Lock()
+
+    def reserve():
+        return allowance.try_acquire() and pace.acquire(timeout=deadline - time.time())
+
+    def warm(location):
+        if location['query']:
+            try:
+                geocoding.geocode(location['query'])
+            except Exception as e:
+                print(f"Erro ao geocodificar '{location['query']}': {e}")
+        try:
+            made = weather_cache.prefetch(location['lat'], location['lon'], api_key, until, reserve)
+        except Exception as e:
+            print(f"Erro ao pré-aquecer {location['name'] or location['cell']}: {e}")
+            with lock:
+                errors[0] += 1
+            return
+        with lock:
+            calls[0] += made
+
+    with telemetry.span('prewarm', locations=len(locations)) as current:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prewarm') as executor:
+            list(executor.map(warm, locations))
+        current.set(calls=calls[0], errors=errors[0])
+    telemetry.count('prewarm_calls_total', calls[0])
+    return {'locations': len(locations), 'calls': calls[0], 'errors': errors[0]}
+
+
+def run_daemon(api_key=None, path=None):
+    """Laço do daemon: pré-aquece LEAD segundos antes de cada pico"""
+    last_peak = 0
+    while True:
+        now = time.time()
+        peak = next_peak(max(now, last_peak), path)
+        if peak is None:
+            # Sem picos configurados nem acessos registrados ainda
+            time.sleep(3600)
+            continue
+        wait = peak - LEAD - now
+        if wait > 0:
+            print(f"Próximo pico: {time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime(peak))}")
+            time.sleep(wait)
+        result = prewarm(api_key, until=peak, path=path)
+        print(f"Pré-aquecidos {result['locations']} locais ({result['calls']} chamadas à API, "
+              f"{result['errors']} erros)")
+        telemetry.flush()
+        last_peak = peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pré-aquece o cache de respostas pelos locais mais acessados")
+    parser.add_argument('--once', action='store_true', help="pré-aquece agora e sai")
+    parser.add_argument('--top', action='store_true', help="mostra o ranking de locais e sai")
+    args = parser.parse_args()
+
+    if args.top:
+        for location in top_locations():
+            print(f"{location['score']:10.2f}  {location['cell']:<20} {location['name'] or ''}")
+    elif not OPENWEATHER_API_KEY:
+        print("❌ ERRO: OPENWEATHER_API_KEY não configurada!")
+    elif args.once:
+        print(prewarm())
+        telemetry.flush()
+    else:
+        run_daemon()
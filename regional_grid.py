@@ -0,0 +1,167 @@
+"""Mapa regional: clima atual em uma grade de pontos ao redor de um local.
+
+Os pontos são amostrados em volta do centro e ajustados às células de
+weather_cache, de modo que cada ponto usa a mesma entrada de cache (e a
+mesma chamada à API) que a visão de um único local. O espaçamento cresce
+com o raio para que a grade tenha no máximo REGION_MAX_POINTS pontos.
+
+O mapa tem cota própria: no máximo REGION_CALL_BUDGET chamadas à API por
+renderização, dentro de uma fatia do limite por minuto e por dia da chave
+(como o pré-aquecimento), para não esgotar a cota da visão principal. Os
+pontos além do orçamento usam só o cache (mesmo expirado); os que não têm
+dados são omitidos e entram nas próximas renderizações. As buscas rodam em
+um pool com concorrência limitada. Temperatura e chuva são então interpoladas em uma
+malha regular por inverso da distância (IDW), de forma vetorizada.
+"""
+import contextvars
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import request_control
+import telemetry
+import weather_cache
+
+# Espaçamento entre os pontos amostrados (graus) e buscas simultâneas
+STEP_DEGREES = float(os.getenv('REGION_STEP_DEGREES', '0.1'))
+MAX_CONCURRENCY = int(os.getenv('REGION_MAX_CONCURRENCY', '8'))
+# Pontos por grade e chamadas à API por renderização
+MAX_POINTS = int(os.getenv('REGION_MAX_POINTS', '121'))
+CALL_BUDGET = int(os.getenv('REGION_CALL_BUDGET', '20'))
+# Fatia da cota da chave reservada ao mapa (o restante fica para a visão principal)
+PER_MINUTE = int(os.getenv('REGION_PER_MINUTE', str(request_control.OPENWEATHER_PER_MINUTE // 4)))
+PER_DAY = int(os.getenv('REGION_PER_DAY', str(request_control.OPENWEATHER_PER_DAY // 4)))
+# Lado da malha interpolada (pontos) e expoente do IDW
+RASTER_SIZE = 60
+IDW_POWER = 2.0
+# Pontos da malha processados por vez (limita a matriz de distâncias)
+IDW_CHUNK = 4096
+
+_quota = request_control.QuotaGovernor(PER_MINUTE, PER_DAY)
+
+
+def grid_points(lat, lon, radius, step=None):
+    """Centros de célula ao redor de (lat, lon), até radius graus, do mais próximo ao mais distante.
+
+    O espaçamento aumenta com o raio: no máximo MAX_POINTS pontos.
+    """
+    rings = max(1, (math.isqrt(MAX_POINTS) - 1) // 2)
+    step = max(step or STEP_DEGREES, weather_cache.GRID_DEGREES, radius / rings)
+    n = int(radius / step + 1e-9)
+    offsets = np.arange(-n, n + 1) * step
+    d_lat, d_lon = np.meshgrid(offsets, offsets, indexing='ij')
+    order = np.argsort(np.hypot(d_lat, d_lon), axis=None, kind='stable')
+    points = {}
+    for d_la, d_lo in zip(d_lat.ravel()[order], d_lon.ravel()[order]):
+        point = weather_cache.snap_to_grid(lat + d_la, lon + d_lo)
+        points.setdefault(point, None)
+    return list(points)
+
+
+def _current_values(lat, lon, api_key, reserve):
+    payload = weather_cache.get_current_weather_within(lat, lon, api_key, reserve)
+    if payload is None:
+        return None
+    rain = payload.get('rain') or {}
+    return payload['main']['temp'], rain.get('1h', rain.get('3h', 0))
+
+
+def _reserve_call():
+    try:
+        _quota.acquire()
+        return True
+    except request_control.QuotaExceeded:
+        return False
+
+
+def fetch_points(points, api_key, max_workers=None, budget=None):
+    """Temperatura e chuva atuais de cada ponto, com no máximo max_workers buscas simultâneas.
+
+    No máximo budget (padrão CALL_BUDGET) pontos chamam a API, dentro da
+    cota do mapa; os demais usam só o cache. Retorna (lats, lons, temps,
+    rains) como arrays NumPy, só com os pontos que tiveram dados, e o
+    número de pontos sem dados.
+    """
+    max_workers = max_workers or MAX_CONCURRENCY
+    remaining = [CALL_BUDGET if budget is None else budget]
+    lock = threading.Lock()
+    calls = [0]
+
+    def reserve():
+        with lock:
+            if remaining[0] <= 0 or not _reserve_call():
+                return False
+            remaining[0] -= 1
+            calls[0] += 1
+            return True
+
+    def fetch(point):
+        try:
+            return _current_values(point[0], point[1], api_key, reserve)
+        except Exception:
+            return None
+
+    with telemetry.span('region_fetch', points=len(points)) as current:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='region') as executor:
+            # Cada busca herda o span atual (spans das chamadas externas)
+            results = list(executor.map(lambda p: contextvars.copy_context().run(fetch, p), points))
+        found = [(point, values) for point, values in zip(points, results) if values is not None]
+        current.set(found=len(found), calls=calls[0])
+
+    lats = np.array([point[0] for point, _ in found], dtype=np.float64)
+    lons = np.array([point[1] for point, _ in found], dtype=np.float64)
+    temps = np.array([values[0] for _, values in found], dtype=np.float64)
+    rains = np.array([values[1] for _, values in found], dtype=np.float64)
+    return (lats, lons, temps, rains), len(points) - len(found)
+
+
+def idw(sample_lats, sample_lons, values, lats, lons, power=IDW_POWER):
+    """Interpola values (N amostras x K campos) nos pontos (lats, lons) por inverso da distância.
+
+    A distância é a equiretangular (longitude escalada pelo cosseno da
+    latitude média), suficiente para regiões de poucos graus.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(len(sample_lats), -1)
+    scale = math.cos(math.radians(float(np.mean(sample_lats))))
+    sample_x = np.asarray(sample_lons) * scale
+    sample_y = np.asarray(sample_lats)
+    x = np.asarray(lons, dtype=np.float64) * scale
+    y = np.asarray(lats, dtype=np.float64)
+
+    result = np.empty((len(x), values.shape[1]))
+    for start in range(0, len(x), IDW_CHUNK):
+        stop = start + IDW_CHUNK
+        d2 = (x[start:stop, None] - sample_x) ** 2 + (y[start:stop, None] - sample_y) ** 2
+        with np.errstate(divide='ignore'):
+            weights = d2 ** (-power / 2)
+        # Ponto da malha sobre uma amostra: usa o valor da amostra
+        exact = np.isinf(weights)
+        hit = exact.any(axis=1)
+        weights[hit] = exact[hit]
+        result[start:stop] = weights @ values / weights.sum(axis=1, keepdims=True)
+    return result
+
+
+def region_raster(lat, lon, radius, api_key, size=RASTER_SIZE):
+    """Malha interpolada da região como DataFrame (lat, lon, temp, rain).
+
+    As linhas estão em ordem de latitude e, dentro dela, de longitude
+    (size x size pontos). Retorna (DataFrame ou None, pontos com dados,
+    pontos sem dados).
+    """
+    import pandas as pd
+
+    (lats, lons, temps, rains), missing = fetch_points(grid_points(lat, lon, radius), api_key)
+    if len(lats) == 0:
+        return None, 0, missing
+    with telemetry.span('region_interpolate', samples=len(lats), size=size):
+        grid_lat, grid_lon = np.meshgrid(np.linspace(lat - radius, lat + radius, size),
+                                         np.linspace(lon - radius, lon + radius, size),
+                                         indexing='ij')
+        values = idw(lats, lons, np.column_stack((temps, rains)), grid_lat.ravel(), grid_lon.ravel())
+    df = pd.DataFrame({'lat': grid_lat.ravel(), 'lon': grid_lon.ravel(),
+                       'temp': values[:, 0], 'rain': values[:, 1]})
+    return df, len(lats), missing
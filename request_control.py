@@ -0,0 +1,140 @@
+"""Controle de chamadas à API da OpenWeather no processo.
+
+* SingleFlight: chamadas concorrentes idênticas (mesma chave) compartilham uma
+  única requisição em andamento, evitando o "efeito manada" quando várias
+  sessões abrem a mesma cidade logo após a expiração do cache.
+* QuotaGovernor: token buckets com limites por minuto e por dia para a chave
+  OPENWEATHER_API_KEY. Perto do limite do plano, a chamada é recusada com
+  QuotaExceeded e o chamador volta para os dados em cache.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QuotaExceeded(Exception):
+    """A chamada ultrapassaria a cota configurada para a chave da API"""
+
+
+class SingleFlight:
+    """Coalescência de chamadas idênticas em andamento"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Executa fn uma única vez por chave entre chamadas concorrentes.
+
+        Quem chega enquanto a chamada está em andamento espera e recebe o
+        mesmo resultado (ou a mesma exceção).
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+class TokenBucket:
+    """Token bucket clássico: capacidade `capacity`, reposição de `rate` fichas/s"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Consome fichas se houver; não bloqueia"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """Espera até haver fichas (ou até o timeout); retorna se conseguiu"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                if self.rate <= 0:
+                    # Sem reposição as fichas nunca chegam
+                    return False
+                wait = (tokens - self.tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class QuotaGovernor:
+    """Limites por minuto e por dia para as chamadas a uma API"""
+
+    def __init__(self, per_minute, per_day):
+        self.minute = TokenBucket(per_minute, per_minute / 60.0)
+        self.day = TokenBucket(per_day, per_day / 86400.0)
+        self.allowed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Reserva uma chamada; lança QuotaExceeded se algum limite foi atingido"""
+        if not self.minute.try_acquire():
+            self._count(False)
+            raise QuotaExceeded("limite por minuto da API atingido")
+        if not self.day.try_acquire():
+            self._count(False)
+            raise QuotaExceeded("limite diário da API atingido")
+        self._count(True)
+
+    def _count(self, allowed):
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+
+    def stats(self):
+        with self._lock:
+            return {'allowed': self.allowed, 'rejected': self.rejected,
+                    'minute_available': self.minute.available(),
+                    'day_available': self.day.available()}
+
+
+# Plano gratuito: 60 chamadas/min e 1.000/dia; a margem evita estourar o plano
+# (os limites reais são compartilhados entre todos os processos que usam a chave)
+OPENWEATHER_PER_MINUTE = int(os.getenv('OPENWEATHER_PER_MINUTE', '50'))
+OPENWEATHER_PER_DAY = int(os.getenv('OPENWEATHER_PER_DAY', '900'))
+
+openweather_flight = SingleFlight()
+openweather_quota = QuotaGovernor(OPENWEATHER_PER_MINUTE, OPENWEATHER_PER_DAY)
@@ -0,0 +1,184 @@
+"""Cache persistente de respostas com stale-while-revalidate.
+
+As respostas ficam em arquivos JSON em um diretório local compartilhado por
+todas as sessões e workers do Streamlit (e pelo notificador), e sobrevivem
+a reinícios e deploys. Quando uma entrada expira, o conteúdo antigo é
+devolvido imediatamente e a atualização acontece em uma thread em segundo
+plano; só a primeira consulta de uma chave (ou uma entrada antiga demais)
+espera pela API.
+
+Cada entrada guarda a impressão digital do payload (fingerprint): uma nova
+busca que volta idêntica é detectada (e pode ter uma validade diferente),
+e quem consome os dados pode usar a impressão digital como chave dos seus
+próprios caches (DataFrame, gráficos).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import telemetry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'responses'))
+# Acima desta idade a entrada não é mais servida e a busca é bloqueante
+MAX_STALE = 24 * 3600
+# Tempo após o qual um lock de atualização é considerado abandonado
+REFRESH_LOCK_TIMEOUT = 60
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _path(key, suffix='.json'):
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, name + suffix)
+
+
+def read_entry(key):
+    """Lê a entrada da chave ou None.
+
+    A entrada tem payload, fetched_at, expires_at, fingerprint e changed_at
+    (quando o conteúdo mudou pela última vez).
+    """
+    try:
+        with open(_path(key), encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entry if entry.get('key') == key else None
+
+
+def payload_fingerprint(payload):
+    """Impressão digital estável do conteúdo do payload"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def entry_fingerprint(entry):
+    """Fingerprint da entrada (calculado para entradas gravadas sem ele)"""
+    return entry.get('fingerprint') or payload_fingerprint(entry['payload'])
+
+
+def write_entry(key, payload, ttl, previous=None):
+    """Grava a entrada de forma atômica e a retorna.
+
+    ttl é a validade em segundos ou uma função ttl(payload, agora, inalterado)
+    que a calcula; inalterado indica que o payload é idêntico ao de previous
+    (a entrada anterior da chave).
+    """
+    now = time.time()
+    fingerprint = payload_fingerprint(payload)
+    unchanged = previous is not None and entry_fingerprint(previous) == fingerprint
+    if previous is not None:
+        telemetry.count('cache_refetch_total', cache=key.split(':', 1)[0],
+                        result='unchanged' if unchanged else 'changed')
+    seconds = ttl(payload, now, unchanged) if callable(ttl) else ttl
+    entry = {'key': key, 'fetched_at': now, 'expires_at': now + seconds, 'payload': payload,
+             'fingerprint': fingerprint,
+             'changed_at': previous.get('changed_at', previous['fetched_at']) if unchanged else now}
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, _path(key))
+    except OSError as e:
+        print(f"Erro ao gravar cache de respostas: {e}")
+    return entry
+
+
+def _acquire_refresh_lock(key):
+    """Lock entre processos (arquivo criado com O_EXCL) para uma única atualização por chave"""
+    lock_path = _path(key, '.lock')
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock_path) > REFRESH_LOCK_TIMEOUT:
+                os.remove(lock_path)
+                return _acquire_refresh_lock(key)
+        except OSError:
+            pass
+        return False
+    except OSError:
+        return False
+
+
+def _release_refresh_lock(key):
+    try:
+        os.remove(_path(key, '.lock'))
+    except OSError:
+        pass
+
+
+def refresh(key, fetch, ttl):
+    """Busca e grava a chave imediatamente, válida ou não; exceções propagam"""
+    return write_entry(key, fetch(), ttl, previous=read_entry(key))
+
+
+def _refresh(key, fetch, ttl):
+    try:
+        refresh(key, fetch, ttl)
+    except Exception as e:
+        print(f"Erro ao atualizar cache ({key}): {e}")
+    finally:
+        _release_refresh_lock(key)
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def refresh_in_background(key, fetch, ttl):
+    """Dispara a atualização da chave em segundo plano, se ninguém já estiver atualizando"""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+    if not _acquire_refresh_lock(key):
+        with _refreshing_lock:
+            _refreshing.discard(key)
+        return False
+    threading.Thread(target=_refresh, args=(key, fetch, ttl),
+                     name=f'refresh:{key}', daemon=True).start()
+    return True
+
+
+def get_or_fetch(key, fetch, ttl, max_stale=MAX_STALE, fallback_on=()):
+    """Retorna o payload da chave, buscando-o com fetch() quando necessário.
+
+    - entrada válida: devolvida sem chamar fetch;
+    - entrada expirada há menos de max_stale: devolvida imediatamente, com
+      atualização em segundo plano;
+    - sem entrada (ou antiga demais): fetch() bloqueante; exceções propagam,
+      exceto as de fallback_on, que devolvem a entrada antiga se existir.
+    """
+    return get_or_fetch_entry(key, fetch, ttl, max_stale, fallback_on)['payload']
+
+
+def get_or_fetch_entry(key, fetch, ttl, max_stale=MAX_STALE, fallback_on=()):
+    """Como get_or_fetch, mas retorna a entrada inteira (payload e fingerprint)"""
+    entry = read_entry(key)
+    now = time.time()
+    cache = key.split(':', 1)[0]
+    if entry is not None:
+        if now < entry['expires_at']:
+            telemetry.count('cache_requests_total', cache=cache, result='hit')
+            return entry
+        if now - entry['expires_at'] < max_stale:
+            telemetry.count('cache_requests_total', cache=cache, result='stale')
+            refresh_in_background(key, fetch, ttl)
+            return entry
+    telemetry.count('cache_requests_total', cache=cache, result='miss')
+    try:
+        payload = fetch()
+    except fallback_on as e:
+        if entry is None:
+            raise
+        print(f"Usando cache expirado ({key}): {e}")
+        telemetry.count('cache_requests_total', cache=cache, result='fallback')
+        return entry
+    return write_entry(key, payload, ttl, previous=entry)
@@ -1,5 +1,22 @@
 import requests
 import os
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import alerts
+import daily_aggregation
+import endpoints
+import forecast_store
+import message_templates
+import observation_store
+import outbox
+import prewarm
+import request_control
+import response_cache
+import telemetry
+import weather_cache
+import weather_client
 from datetime import datetime, timedelta, timezone
 
 # Configurações
@@ -12,176 +29,95 @@ LATITUDE = "-16.6869"
 LONGITUDE = "-49.2648"
 CITY_NAME = "Goiânia"
 
-# Fuso horário de Brasília (GMT-3)
+# Fuso horário de Brasília (GMT-3) e fuso IANA usado para definir o "dia de hoje"
 BRT = timezone(timedelta(hours=-3))
+TIMEZONE = os.getenv('WEATHER_TIMEZONE', 'America/Sao_Paulo')
 
 # URLs das APIs
-CURRENT_WEATHER_URL = f"https://api.openweathermap.org/data/2.5/weather?lat={LATITUDE}&lon={LONGITUDE}&appid={OPENWEATHER_API_KEY}&units=metric&lang=pt_br"
-FORECAST_URL = f"https://api.openweathermap.org/data/2.5/forecast?lat={LATITUDE}&lon={LONGITUDE}&appid={OPENWEATHER_API_KEY}&units=metric&lang=pt_br"
-WHATSAPP_URL = "https://api.textmebot.com/send.php"
+WHATSAPP_URL = endpoints.WHATSAPP_URL
 
-def get_current_weather():
-    """Busca dados do tempo atual"""
+# Modo broadcast: arquivo de assinantes e concorrência máxima
+SUBSCRIBERS_FILE = os.getenv('SUBSCRIBERS_FILE')
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '8'))
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', '8'))
+# Tempo máximo (s) esperando novas tentativas antes de encerrar o job
+DELIVERY_DEADLINE = int(os.getenv('DELIVERY_DEADLINE', '600'))
+
+def get_current_weather(future=None):
+    """Busca dados do tempo atual (ou resolve uma busca já disparada)"""
     try:
-        response = requests.get(CURRENT_WEATHER_URL, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        if future is None:
+            return weather_client.fetch_current_weather(LATITUDE, LONGITUDE, OPENWEATHER_API_KEY)
+        return future.result()
+    except (requests.RequestException, request_control.QuotaExceeded) as e:
         print(f"Erro ao buscar clima atual: {e}")
         return None
 
-def get_forecast():
-    """Busca previsão do tempo (5 dias)"""
+def get_forecast(future=None):
+    """Busca previsão do tempo (5 dias) (ou resolve uma busca já disparada)"""
     try:
-        response = requests.get(FORECAST_URL, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        if future is None:
+            return weather_client.fetch_forecast(LATITUDE, LONGITUDE, OPENWEATHER_API_KEY)
+        return future.result()
+    except (requests.RequestException, request_control.QuotaExceeded) as e:
         print(f"Erro ao buscar previsão: {e}")
         return None
 
-def get_today_forecast(forecast_data):
-    """Extrai dados do dia atual da previsão"""
-    if not forecast_data or 'list' not in forecast_data:
-        return None
-    
-    now = datetime.now(BRT)
-    today = now.date()
-    
-    temps_today = []
-    rain_today = 0
-    
-    for item in forecast_data['list']:
-        dt = datetime.fromtimestamp(item['dt'], tz=BRT)
-        
-        if dt.date() == today:
-            temps_today.append({
-                'temp': item['main']['temp'],
-                'temp_max': item['main']['temp_max'],
-                'temp_min': item['main']['temp_min']
-            })
-            if 'rain' in item and '3h' in item['rain']:
-                rain_today += item['rain']['3h']
-    
-    if temps_today:
-        return {
-            'temp_max': max(t['temp_max'] for t in temps_today),
-            'temp_min': min(t['temp_min'] for t in temps_today),
-            'rain_total': rain_today
-        }
-    return None
+def get_today_forecast(forecast_data, tz=None):
+    """Extrai dados do dia atual (no fuso tz, padrão TIMEZONE) da previsão"""
+    return daily_aggregation.today_summary(forecast_data, tz or TIMEZONE)
 
-def format_weather_message(current_data, forecast_today):
-    """Formata a mensagem com as informações do clima"""
+def format_weather_message(current_data, forecast_today, city_name=None, locale=None,
+                           channel='whatsapp', now=None):
+    """Formata a mensagem com as informações do clima.
+
+    locale e channel escolhem o template de message_templates (padrão:
+    MESSAGE_LOCALE e WhatsApp).
+    """
     try:
-        now = datetime.now(BRT)
-        
-        city = current_data.get('name', CITY_NAME)
-        country = current_data.get('sys', {}).get('country', 'BR')
-        
-        temp_current = current_data['main']['temp']
-        feels_like = current_data['main']['feels_like']
-        
-        if forecast_today:
-            temp_max = forecast_today['temp_max']
-            temp_min = forecast_today['temp_min']
-            rain_total = forecast_today['rain_total']
-        else:
-            temp_max = current_data['main']['temp_max']
-            temp_min = current_data['main']['temp_min']
-            rain_total = 0
-        
-        humidity = current_data['main']['humidity']
-        pressure = current_data['main']['pressure']
-        wind_speed = current_data['wind']['speed']
-        wind_deg = current_data['wind'].get('deg', 0)
-        visibility = current_data.get('visibility', 0) / 1000
-        cloudiness = current_data['clouds']['all']
-        description = current_data['weather'][0]['description'].capitalize()
-        
-        sunrise = datetime.fromtimestamp(current_data['sys']['sunrise'], tz=BRT)
-        sunset = datetime.fromtimestamp(current_data['sys']['sunset'], tz=BRT)
-        
-        def get_wind_direction(degrees):
-            val = int((degrees / 22.5) + 0.5)
-            dirs = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
-                    'S', 'SSO', 'SO', 'OSO', 'O', 'ONO', 'NO', 'NNO']
-            return dirs[val % 16]
-        
-        wind_dir = get_wind_direction(wind_deg)
-        
-        meses = {
-            1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
-            5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
-            9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
-        }
-        
-        message = f"🌦️ *PREVISÃO DO TEMPO - {city.upper()}, {country}*\n"
-        message += f"📅 {now.day} de {meses[now.month]} de {now.year} - {now.strftime('%H:%M')}\n\n"
-        
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"🌡️ *TEMPERATURA*\n"
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"Atual: *{temp_current:.1f}°C*\n"
-        message += f"Sensação térmica: {feels_like:.1f}°C\n"
-        message += f"Máxima prevista: *{temp_max:.1f}°C*\n"
-        message += f"Mínima prevista: *{temp_min:.1f}°C*\n\n"
-        
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"☁️ *CONDIÇÕES*\n"
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"Status: {description}\n"
-        message += f"Cobertura de nuvens: {cloudiness}%\n"
-        message += f"Visibilidade: {visibility:.1f} km\n\n"
-        
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"🌧️ *CHUVA PREVISTA HOJE*\n"
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        if rain_total > 0:
-            message += f"Acumulado previsto: *{rain_total:.1f} mm*\n"
-            if rain_total < 5:
-                message += f"Possibilidade: Chuva fraca\n\n"
-            elif rain_total < 25:
-                message += f"Possibilidade: Chuva moderada\n\n"
-            else:
-                message += f"Possibilidade: Chuva forte\n\n"
-        else:
-            message += f"Sem previsão de chuva ☀️\n\n"
-        
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"💨 *VENTO*\n"
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"Velocidade: {wind_speed:.1f} m/s ({wind_speed * 3.6:.1f} km/h)\n"
-        message += f"Direção: {wind_dir} ({wind_deg}°)\n\n"
-        
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"💧 *UMIDADE E PRESSÃO*\n"
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"Umidade: {humidity}%\n"
-        message += f"Pressão: {pressure} hPa\n\n"
-        
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"☀️ *SOL*\n"
-        message += f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-        message += f"Nascer: {sunrise.strftime('%H:%M')}\n"
-        message += f"Pôr: {sunset.strftime('%H:%M')}\n\n"
-        
-        message += "Tenha um ótimo dia! ✨"
-        
-        return message
+        city = city_name or current_data.get('name', CITY_NAME)
+        fields = message_templates.build_fields(current_data, forecast_today, city, BRT, now)
+        return message_templates.render(fields, locale, channel)
     
     except (KeyError, TypeError) as e:
         print(f"Erro ao formatar mensagem: {e}")
         return "Erro ao processar dados do clima"
 
-def send_whatsapp_message(message):
-    """Envia mensagem via WhatsApp com debug completo"""
-    print("\n" + "="*50)
-    print("🔍 DEBUG - ENVIO WHATSAPP")
-    print("="*50)
+def _mask_phone(phone):
+    # Apenas o final do telefone vai para logs e métricas
+    return f"***{str(phone)[-4:]}"
+
+def post_whatsapp(phone, message):
+    """Uma tentativa de envio ao gateway; lança exceção em caso de falha.
+
+    Erros 4xx (exceto 429) viram outbox.PermanentError, que não é repetido;
+    os demais viram outbox.TransientError. As mensagens das exceções não
+    incluem a URL (que contém a chave da API).
+    """
+    with telemetry.span('whatsapp_delivery', recipient=_mask_phone(phone), chars=len(message)) as current:
+        try:
+            params = {
+                'phone': phone,
+                'apikey': WHATSAPP_APIKEY,
+                'text': message
+            }
+            response = weather_client.get_session().get(WHATSAPP_URL, params=params, timeout=15)
+            current.set(http_status=response.status_code)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            telemetry.count('whatsapp_messages_total', result='failed')
+            status = e.response.status_code if getattr(e, 'response', None) is not None else None
+            if status and 400 <= status < 500 and status != 429:
+                raise outbox.PermanentError(f"HTTP {status}") from None
+            raise outbox.TransientError(f"HTTP {status}" if status else type(e).__name__) from None
+    telemetry.count('whatsapp_messages_total', result='sent')
+
+def send_whatsapp_message(message, phone=None, verbose=True):
+    """Envia uma mensagem via WhatsApp, sem caixa de saída (uma tentativa)"""
+    phone = phone or WHATSAPP_PHONE
     
     # Valida variáveis de ambiente
-    if not WHATSAPP_PHONE:
+    if not phone:
         print("❌ ERRO: WHATSAPP_PHONE não configurado!")
         return False
     
@@ -189,47 +125,255 @@ def send_whatsapp_message(message):
         print("❌ ERRO: WHATSAPP_APIKEY não configurado!")
         return False
     
-    print(f"📱 Telefone: {WHATSAPP_PHONE}")
-    print(f"🔑 API Key: {WHATSAPP_APIKEY[:10]}...{WHATSAPP_APIKEY[-4:]}")
-    print(f"📝 Tamanho da mensagem: {len(message)} caracteres")
-    print(f"🌐 URL da API: {WHATSAPP_URL}")
+    if verbose:
+        print(f"📤 Enviando WhatsApp para {_mask_phone(phone)} ({len(message)} caracteres)...")
+    try:
+        post_whatsapp(phone, message)
+    except outbox.DeliveryError as e:
+        print(f"❌ ERRO ao enviar WhatsApp para {_mask_phone(phone)}: {e}")
+        return False
+    if verbose:
+        print("✅ Mensagem enviada com sucesso!")
+    return True
+
+def deliver_messages(items, deadline=None, days=None):
+    """Grava [(telefone, mensagem), ...] na caixa de saída e envia as pendências.
+
+    Cada destinatário recebe no máximo uma mensagem por dia (e por tipo, em
+    itens (telefone, mensagem, tipo), como os alertas); falhas
+    transitórias são repetidas com backoff e pendências de execuções
+    anteriores do mesmo dia são retomadas. Retorna a contagem de
+    resultados de outbox.deliver mais 'duplicates' (já enfileiradas hoje).
+    deadline (epoch) limita a espera por novas tentativas (padrão:
+    DELIVERY_DEADLINE segundos). days traz o dia local (ISO) de cada item,
+    para que o "uma por dia" siga o fuso do destinatário (padrão: hoje em
+    Brasília).
+    """
+    if not WHATSAPP_APIKEY:
+        print("❌ ERRO: WHATSAPP_APIKEY não configurado!")
+        return {'sent': 0, 'retry': 0, 'failed': len(items), 'duplicates': 0}
+    
+    today = datetime.now(BRT).date().isoformat()
+    days = list(days) if days is not None else [today] * len(items)
+    # Só expira o que é anterior ao dia local mais atrasado entre os destinatários
+    expired = outbox.expire_old(min(days + [today]))
+    if expired:
+        print(f"⚠️ {expired} mensagem(ns) pendente(s) de dias anteriores descartada(s)")
+    by_day = {}
+    for item, day in zip(items, days):
+        by_day.setdefault(day, []).append(item)
+    new = sum(outbox.enqueue(group, day) for day, group in by_day.items())
+    if new < len(items):
+        print(f"ℹ️ {len(items) - new} destinatário(s) já com mensagem de hoje na caixa de saída")
+    
+    results = outbox.deliver(post_whatsapp, workers=SEND_CONCURRENCY,
+                             deadline=deadline or time.time() + DELIVERY_DEADLINE)
+    results['duplicates'] = len(items) - new
+    pending = sum(outbox.stats(day).get('pending', 0) for day in set(days) or {today})
+    if pending:
+        print(f"⏳ {pending} mensagem(ns) pendente(s) para a próxima execução (--resume)")
+    return results
+
+def local_days(zones):
+    """Dia local atual (ISO) de cada fuso da lista (None = TIMEZONE)"""
+    days = {zone: datetime.now(daily_aggregation.resolve_timezone(zone or TIMEZONE)).date().isoformat()
+            for zone in set(zones)}
+    return [days[zone] for zone in zones]
+
+def load_subscribers(path):
+    """Carrega o arquivo de assinantes (lista JSON de objetos).
+
+    Cada assinante tem 'phone', 'city', 'latitude' e 'longitude' e,
+    opcionalmente, 'name' para personalizar a saudação, 'locale',
+    'timezone', 'send_at' (horário local do envio no daemon; veja
+    notifier_daemon.py) e 'alerts' (condições de alerta; veja alerts.py).
+    """
+    with open(path, encoding='utf-8') as f:
+        subscribers = json.load(f)
     
+    valid = []
+    for i, sub in enumerate(subscribers):
+        missing = [k for k in ('phone', 'city', 'latitude', 'longitude') if k not in sub]
+        if missing:
+            print(f"⚠️ Assinante #{i} ignorado: faltando {', '.join(missing)}")
+            continue
+        if 'timezone' in sub:
+            try:
+                daily_aggregation.resolve_timezone(sub['timezone'])
+            except (KeyError, ValueError, TypeError) as e:
+                # Fuso inválido não pode interromper o lote inteiro: usa o padrão
+                print(f"⚠️ Assinante #{i} ({sub['city']}): fuso inválido {sub['timezone']!r} "
+                      f"({type(e).__name__}), usando {TIMEZONE}")
+                sub = {k: v for k, v in sub.items() if k != 'timezone'}
+        valid.append(sub)
+    return valid
+
+def fetch_location_weather(lat, lon):
+    """Busca clima atual e previsão de um local (usado pelo broadcast)"""
+    current_future, forecast_future = weather_cache.get_current_and_forecast(
+        lat, lon, OPENWEATHER_API_KEY, max_stale=0)
+    current_data, forecast_data = get_current_weather(current_future), get_forecast(forecast_future)
+    save_history(weather_cache.cell_key(lat, lon), current_data, forecast_data)
+    return current_data, forecast_data
+
+def save_history(cell, current_data, forecast_data):
+    """Grava as respostas no histórico local de observações"""
+    try:
+        observation_store.ingest_current(cell, current_data)
+        observation_store.ingest_forecast(cell, forecast_data)
+    except Exception as e:
+        print(f"⚠️ Erro ao gravar histórico: {e}")
+
+def record_accesses(locations):
+    """Registra os locais do envio na popularidade usada pelo pré-aquecimento"""
     try:
-        params = {
-            'phone': WHATSAPP_PHONE,
-            'apikey': WHATSAPP_APIKEY,
-            'text': message
+        prewarm.record_accesses([(lat, lon, city, None) for lat, lon, city in locations])
+    except Exception as e:
+        print(f"⚠️ Erro ao registrar acessos: {e}")
+
+def personalize_message(message, subscriber):
+    """Adiciona a saudação do assinante (no seu idioma) à mensagem da cidade"""
+    template = message_templates.get_template(subscriber.get('locale'))
+    return template.personalize(message, subscriber.get('name'))
+
+def run_broadcast(subscribers_path):
+    """Envia a previsão para todos os assinantes do arquivo"""
+    subscribers = load_subscribers(subscribers_path)
+    print(f"📋 {len(subscribers)} assinantes carregados de {subscribers_path}")
+    return broadcast(subscribers)
+
+def broadcast(subscribers, deadline=None):
+    """Envia a previsão para os assinantes informados.
+
+    O clima é buscado uma única vez por célula de grade distinta (assinantes
+    da mesma cidade compartilham a busca), com concorrência limitada, e os
+    envios são feitos em paralelo.
+    """
+    # Deduplica as cidades pela célula de grade
+    locations = {}
+    for sub in subscribers:
+        key = weather_cache.cell_key(sub['latitude'], sub['longitude'])
+        sub['cell'] = key
+        locations.setdefault(key, sub)
+    print(f"📍 {len(locations)} locais distintos\n")
+    record_accesses([(sub['latitude'], sub['longitude'], sub['city']) for sub in subscribers])
+    
+    # Busca o clima de cada local com concorrência limitada
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+        futures = {
+            key: executor.submit(fetch_location_weather, *weather_cache.snap_to_grid(sub['latitude'], sub['longitude']))
+            for key, sub in locations.items()
         }
-        
-        print("\n📤 Enviando requisição...")
-        response = requests.get(WHATSAPP_URL, params=params, timeout=15)
-        
-        print(f"📊 Status Code: {response.status_code}")
-        print(f"📋 Response Headers: {dict(response.headers)}")
-        print(f"📄 Response Body: {response.text[:500]}")
-        
-        response.raise_for_status()
-        
-        print("\n✅ Mensagem enviada com sucesso!")
-        print("="*50 + "\n")
-        return True
+        weather = {key: future.result() for key, future in futures.items()}
     
-    except requests.RequestException as e:
-        print(f"\n❌ ERRO ao enviar WhatsApp:")
-        print(f"   Tipo: {type(e).__name__}")
-        print(f"   Mensagem: {str(e)}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"   Status Code: {e.response.status_code}")
-            print(f"   Response: {e.response.text[:500]}")
-        print("="*50 + "\n")
-        return False
+    # Resumo do dia de todos os locais em uma única agregação vetorizada
+    # (cada local no seu fuso: campo opcional 'timezone' do assinante)
+    keys = list(weather)
+    summaries = daily_aggregation.today_summaries(
+        [weather[key][1] for key in keys], [locations[key].get('timezone', TIMEZONE) for key in keys])
+    forecast_today = dict(zip(keys, summaries))
+    
+    # Calcula os campos da mensagem uma vez por local (data e horários no fuso do local)
+    fields = {}
+    for key, (current_data, forecast_data) in weather.items():
+        if not current_data:
+            print(f"❌ Falha ao obter clima de {locations[key]['city']}")
+            continue
+        tz = daily_aggregation.resolve_timezone(locations[key].get('timezone', TIMEZONE))
+        try:
+            fields[key] = message_templates.build_fields(
+                current_data, forecast_today[key], locations[key]['city'], tz, datetime.now(tz))
+        except (KeyError, TypeError) as e:
+            print(f"❌ Resposta incompleta para {locations[key]['city']}: {e}")
+    
+    # Renderiza uma vez por (local, idioma); só a saudação varia por assinante
+    messages = {}
+    deliveries = []
+    for sub in subscribers:
+        if sub['cell'] not in fields:
+            continue
+        template = message_templates.get_template(sub.get('locale'))
+        message_key = (sub['cell'], template.locale)
+        if message_key not in messages:
+            messages[message_key] = template.render(fields[sub['cell']])
+        deliveries.append((sub, personalize_message(messages[message_key], sub)))
+    
+    # Envia pela caixa de saída (paralelo, com limite de taxa e novas tentativas);
+    # o dia da idempotência é o dia local de cada assinante
+    results = deliver_messages([(sub['phone'], message) for sub, message in deliveries], deadline,
+                               local_days([sub.get('timezone') for sub, _ in deliveries]))
+    
+    print(f"\n📨 Enviadas: {results['sent']}/{len(subscribers)} "
+          f"(já enviadas hoje: {results['duplicates']}, falhas de envio: {results['failed']}, "
+          f"sem dados: {len(subscribers) - len(deliveries)})")
+    return results['sent'] + results['duplicates'] == len(subscribers)
+
+def fetch_forecasts(cells):
+    """Previsões compactas das células {célula: (lat, lon)}, com concorrência limitada"""
+    def fetch(lat, lon):
+        # Como no resumo diário: alertas nunca são avaliados sobre previsão expirada
+        entry = weather_cache.get_forecast(lat, lon, OPENWEATHER_API_KEY, max_stale=0, entry=True)
+        return forecast_store.put(weather_cache.cell_key(lat, lon), entry['payload'],
+                                  response_cache.entry_fingerprint(entry))
+    
+    forecasts = {}
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+        futures = {cell: executor.submit(fetch, lat, lon) for cell, (lat, lon) in cells.items()}
+        for cell, future in futures.items():
+            try:
+                forecasts[cell] = future.result()
+            except Exception as e:
+                print(f"❌ Falha ao obter previsão de {cell}: {e}")
+    return forecasts
+
+def alert_messages(matches):
+    """[(telefone, mensagem, tipo), ...] dos alertas disparados (um por regra por dia)"""
+    items = []
+    for rule, value in matches:
+        template = message_templates.get_template(rule.locale)
+        message = template.personalize(template.render_alert(alerts.alert_fields(rule, value)), rule.name)
+        items.append((rule.phone, message, f"alert-{rule.id}"))
+    return items
+
+def run_alerts(subscribers_path):
+    """Avalia os alertas dos assinantes do arquivo"""
+    return check_alerts(load_subscribers(subscribers_path))
+
+def check_alerts(subscribers, engine=None, deadline=None):
+    """Avalia os alertas dos assinantes e envia só aos que tiveram condição satisfeita.
+
+    engine (alerts.AlertEngine) mantém as fingerprints entre execuções: só
+    as células com previsão nova são reavaliadas.
+    """
+    engine = engine or alerts.AlertEngine(alerts.RuleIndex(alerts.rules_from_subscribers(subscribers)))
+    cells = {}
+    for sub in subscribers:
+        cell = weather_cache.cell_key(sub['latitude'], sub['longitude'])
+        if cell in engine.index:
+            cells.setdefault(cell, weather_cache.snap_to_grid(sub['latitude'], sub['longitude']))
+    print(f"🔔 {len(engine.index)} regras de alerta em {len(cells)} locais")
+    
+    matches = engine.refresh(fetch_forecasts(cells))
+    if not matches:
+        print("✅ Nenhum alerta disparado")
+        return {'sent': 0, 'retry': 0, 'failed': 0, 'duplicates': 0}
+    results = deliver_messages(alert_messages(matches), deadline,
+                               local_days([rule.timezone for rule, _ in matches]))
+    print(f"📨 Alertas: {len(matches)} disparados, {results['sent']} enviados "
+          f"(já enviados hoje: {results['duplicates']}, falhas: {results['failed']})")
+    return results
 
 def main():
     """Função principal"""
     print(f"🌦️ Iniciando busca de previsão do tempo para {CITY_NAME}...\n")
+    record_accesses([(LATITUDE, LONGITUDE, CITY_NAME)])
+    
+    # Dispara clima atual e previsão em paralelo
+    current_future, forecast_future = weather_cache.get_current_and_forecast(
+        LATITUDE, LONGITUDE, OPENWEATHER_API_KEY, max_stale=0)
     
     # Busca clima atual
-    current_data = get_current_weather()
+    current_data = get_current_weather(current_future)
     if not current_data:
         print("❌ Falha ao obter dados do clima atual")
         return
@@ -237,7 +381,8 @@ def main():
     print(f"✅ Dados atuais obtidos: {current_data.get('name', 'Desconhecido')}\n")
     
     # Busca previsão
-    forecast_data = get_forecast()
+    forecast_data = get_forecast(forecast_future)
+    save_history(weather_cache.cell_key(LATITUDE, LONGITUDE), current_data, forecast_data)
     forecast_today = None
     
     if forecast_data:
@@ -252,17 +397,45 @@ def main():
         print("⚠️ Não foi possível obter previsão, usando apenas dados atuais\n")
     
     # Formata mensagem
-    message = format_weather_message(current_data, forecast_today)
+    message = format_weather_message(current_data, forecast_today, city_name=CITY_NAME)
     print("📝 Mensagem formatada:")
     print("-" * 50)
     print(message)
     print("-" * 50)
     
-    # Envia mensagem com debug completo
-    if send_whatsapp_message(message):
+    # Envia pela caixa de saída (uma mensagem por dia, com novas tentativas)
+    if not WHATSAPP_PHONE:
+        print("❌ ERRO: WHATSAPP_PHONE não configurado!")
+        return
+    results = deliver_messages([(WHATSAPP_PHONE, message)])
+    if results['sent']:
         print("\n🎉 Processo concluído com SUCESSO!")
+    elif results['duplicates']:
+        print("\nℹ️ A mensagem de hoje já havia sido enviada (ou está pendente)")
     else:
         print("\n⚠️ Processo concluído com ERROS no envio do WhatsApp")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Envia a previsão do tempo via WhatsApp")
+    parser.add_argument('--subscribers', default=SUBSCRIBERS_FILE,
+                        help="arquivo JSON de assinantes (ativa o modo broadcast)")
+    parser.add_argument('--alerts', action='store_true',
+                        help="avalia os alertas dos assinantes (--subscribers) em vez do envio diário")
+    parser.add_argument('--resume', action='store_true',
+                        help="apenas envia as pendências da caixa de saída (ex.: após uma queda)")
+    args = parser.parse_args()
+    
+    mode = ('resume' if args.resume else 'alerts' if args.alerts and args.subscribers
+            else 'broadcast' if args.subscribers else 'single')
+    # Tempo total do job; métricas gravadas em storage/telemetry/ ao final
+    with telemetry.span('job', mode=mode):
+        if args.resume:
+            results = deliver_messages([])
+            print(f"📨 Pendências enviadas: {results['sent']} (falhas: {results['failed']})")
+        elif mode == 'alerts':
+            run_alerts(args.subscribers)
+        elif args.subscribers:
+            run_broadcast(args.subscribers)
+        else:
+            main()
+    telemetry.flush()
@@ -0,0 +1,266 @@
+"""Instrumentação leve: spans de tempo por etapa, contadores e histogramas.
+
+Cada span (geocodificação, localização por IP, chamadas externas, montagem
+do DataFrame, renderização de gráficos, envio de WhatsApp...) gera uma linha
+JSON em TELEMETRY_DIR/events.jsonl e alimenta o histograma de duração da sua
+etapa. Ao passar de TELEMETRY_MAX_BYTES, events.jsonl vira events.jsonl.1
+(substituindo o anterior). Contadores (acertos/falhas de cache) e histogramas
+(latência das APIs externas) são exportados no formato texto do Prometheus em
+TELEMETRY_DIR/metrics-<papel>.prom, próprio para o textfile collector do
+node_exporter: cada processo (dashboard, daemon, cron) grava o seu arquivo,
+com o rótulo process="<papel>". O papel vem de TELEMETRY_ROLE ou, por padrão,
+do nome do script.
+
+Com TELEMETRY_ENABLED=0 nada é gravado; as métricas continuam disponíveis em
+memória via snapshot().
+"""
+import atexit
+import contextvars
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TELEMETRY_DIR = os.getenv('TELEMETRY_DIR', os.path.join(BASE_DIR, 'storage', 'telemetry'))
+ENABLED = os.getenv('TELEMETRY_ENABLED', '1') != '0'
+EVENTS_PATH = os.path.join(TELEMETRY_DIR, 'events.jsonl')
+EVENTS_MAX_BYTES = int(os.getenv('TELEMETRY_MAX_BYTES', str(10 * 1024 * 1024)))
+ROLE = re.sub(r'[^\w-]+', '_', os.getenv('TELEMETRY_ROLE')
+              or os.path.splitext(os.path.basename(sys.argv[0] or ''))[0]).strip('_-') or 'python'
+PROMETHEUS_PATH = os.path.join(TELEMETRY_DIR, f'metrics-{ROLE}.prom')
+
+METRIC_PREFIX = 'clima_'
+# Limites (em segundos) dos buckets dos histogramas de duração
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'stage_duration_seconds': "Duração de cada etapa instrumentada",
+    'upstream_duration_seconds': "Latência das chamadas HTTP a serviços externos",
+    'cache_requests_total': "Consultas aos caches por resultado",
+    'whatsapp_messages_total': "Mensagens de WhatsApp por resultado do envio",
+    'forecast_store_bytes': "Memória ocupada pelas previsões compactas em memória",
+    'forecast_store_entries': "Locais com previsão compacta em memória",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_events_file = None
+_current_span = contextvars.ContextVar('telemetry_span', default=None)
+
+
+class Histogram:
+    """Histograma cumulativo de buckets fixos (semântica do Prometheus)"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """Incrementa o contador name{labels}"""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name, value, **labels):
+    """Define o valor atual do medidor name{labels}"""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, value, **labels):
+    """Registra uma observação no histograma name{labels}"""
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+def log_event(event, **fields):
+    """Grava uma linha JSON em events.jsonl"""
+    global _events_file
+    if not ENABLED:
+        return
+    record = {'ts': round(time.time(), 3), 'event': event}
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        try:
+            if _events_file is None:
+                os.makedirs(TELEMETRY_DIR, exist_ok=True)
+                _events_file = open(EVENTS_PATH, 'a', encoding='utf-8', buffering=1)
+            _events_file.write(line + '\n')
+            if os.fstat(_events_file.fileno()).st_size > EVENTS_MAX_BYTES:
+                _rotate_events()
+        except OSError as e:
+            print(f"Erro ao gravar telemetria: {e}")
+
+
+def _rotate_events():
+    """Renomeia events.jsonl para events.jsonl.1 e fecha o arquivo (reaberto na próxima linha)"""
+    global _events_file
+    try:
+        current = os.stat(EVENTS_PATH)
+        # Se outro processo já renomeou, o arquivo aberto é o .1: só reabre
+        if current.st_ino == os.fstat(_events_file.fileno()).st_ino:
+            os.replace(EVENTS_PATH, EVENTS_PATH + '.1')
+    except FileNotFoundError:
+        pass
+    finally:
+        _events_file.close()
+        _events_file = None
+
+
+class Span:
+    """Intervalo de tempo de uma etapa; use via span() ou start_span()/end()"""
+
+    def __init__(self, name, attrs):
+        parent = _current_span.get()
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.perf_counter()
+        self.duration = None
+        self._token = _current_span.set(self)
+
+    def set(self, **attrs):
+        """Adiciona atributos ao span (ex.: origem do resultado)"""
+        self.attrs.update(attrs)
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Encerrado em outro contexto (ex.: outra thread)
+            pass
+        observe('stage_duration_seconds', self.duration, stage=self.name)
+        fields = dict(self.attrs)
+        fields.update(name=self.name, trace_id=self.trace_id, span_id=self.span_id,
+                      parent_id=self.parent_id, duration_ms=round(self.duration * 1000, 3),
+                      status='error' if error else 'ok')
+        if error:
+            fields['error'] = type(error).__name__
+        log_event('span', **fields)
+
+
+def start_span(name, **attrs):
+    """Abre um span que será encerrado explicitamente com .end()"""
+    return Span(name, attrs)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Mede o bloco como a etapa name; exceções são registradas e propagadas"""
+    current = Span(name, attrs)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    current.end()
+
+
+def snapshot():
+    """Cópia das métricas: {'counters': ..., 'gauges': ..., 'histograms': ...}"""
+    with _lock:
+        return {
+            'counters': {(name, labels): value for (name, labels), value in _counters.items()},
+            'gauges': dict(_gauges),
+            'histograms': {key: {'count': h.count, 'sum': h.sum, 'buckets': h.cumulative()}
+                           for key, h in _histograms.items()},
+        }
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus():
+    """Métricas atuais no formato texto de exposição do Prometheus"""
+    data = snapshot()
+    lines = []
+    declared = set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {METRIC_PREFIX}{name} {HELP[name]}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+    # O rótulo do processo separa as séries dos arquivos de cada papel
+    process = [('process', ROLE)]
+    for (name, labels), value in sorted(data['counters'].items()):
+        declare(name, 'counter')
+        lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels, process)} {value}")
+    for (name, labels), value in sorted(data['gauges'].items()):
+        declare(name, 'gauge')
+        lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels, process)} {value}")
+    for (name, labels), h in sorted(data['histograms'].items()):
+        declare(name, 'histogram')
+        metric = METRIC_PREFIX + name
+        for bound, total in h['buckets']:
+            lines.append(f"{metric}_bucket{_format_labels(labels, process + [('le', repr(bound))])} {total}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, process + [('le', '+Inf')])} {h['count']}")
+        lines.append(f"{metric}_sum{_format_labels(labels, process)} {h['sum']:.6f}")
+        lines.append(f"{metric}_count{_format_labels(labels, process)} {h['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def flush():
+    """Grava o metrics-<papel>.prom do processo (escrita atômica) com os valores acumulados"""
+    if not ENABLED:
+        return
+    try:
+        os.makedirs(TELEMETRY_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=TELEMETRY_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(render_prometheus())
+        os.replace(tmp, PROMETHEUS_PATH)
+    except OSError as e:
+        print(f"Erro ao gravar métricas: {e}")
+
+
+atexit.register(flush)
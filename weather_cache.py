@@ -0,0 +1,170 @@
+"""Cache de respostas da OpenWeather por célula de grade.
+
+As coordenadas são ajustadas ("snap") ao centro de uma célula de grade
+regular, de modo que todas as consultas dentro da mesma célula (usuários
+vizinhos, pequenas diferenças do geocodificador ou da API de IP) compartilhem
+a mesma entrada de cache e a mesma chamada à API. As respostas ficam no
+cache persistente de response_cache (stale-while-revalidate).
+"""
+import os
+import time
+
+import request_control
+import response_cache
+import weather_client
+
+# Tamanho da célula em graus (0.05° ≈ 5,5 km de latitude)
+GRID_DEGREES = float(os.getenv('WEATHER_GRID_DEGREES', '0.05'))
+
+
+def cell_index(lat, lon, grid=None):
+    """Índice inteiro (linha, coluna) da célula que contém o ponto"""
+    grid = grid or GRID_DEGREES
+    lat = min(max(float(lat), -90.0), 90.0)
+    # Normaliza a longitude para o intervalo [-180, 180)
+    lon = (float(lon) + 180.0) % 360.0 - 180.0
+    return round(lat / grid), round(lon / grid)
+
+
+def snap_to_grid(lat, lon, grid=None):
+    """Coordenadas do centro da célula; usadas como chave e na chamada à API"""
+    grid = grid or GRID_DEGREES
+    row, col = cell_index(lat, lon, grid)
+    return round(row * grid, 6), round(col * grid, 6)
+
+
+def cell_key(lat, lon, grid=None):
+    """Chave textual estável da célula, ex.: '-16.7000,-49.2500'"""
+    snapped_lat, snapped_lon = snap_to_grid(lat, lon, grid)
+    return f"{snapped_lat:.4f},{snapped_lon:.4f}"
+
+
+# Validade do clima atual no cache persistente (em segundos)
+CURRENT_TTL = 600
+
+# A previsão de 5 dias/3 horas só muda nos pontos de atualização do modelo,
+# a cada FORECAST_UPDATE_INTERVAL a partir de 00:00 UTC, e os novos dados
+# ficam disponíveis FORECAST_PUBLISH_DELAY depois. A entrada vale até o
+# próximo ponto de atualização ou até o próximo slot da previsão passar (com
+# o mesmo atraso de publicação), o que vier primeiro.
+FORECAST_UPDATE_INTERVAL = int(os.getenv('FORECAST_UPDATE_INTERVAL', str(3 * 3600)))
+FORECAST_PUBLISH_DELAY = int(os.getenv('FORECAST_PUBLISH_DELAY', '600'))
+# Se a busca logo após um ponto de atualização trouxer dados idênticos (o
+# modelo ainda não foi publicado), tenta de novo em FORECAST_RECHECK
+FORECAST_RECHECK = 600
+FORECAST_RECHECK_WINDOW = 3600
+FORECAST_MIN_TTL = 60
+
+
+def last_forecast_update(now):
+    """Instante (epoch) do último ponto de atualização já publicado"""
+    return ((now - FORECAST_PUBLISH_DELAY) // FORECAST_UPDATE_INTERVAL
+            * FORECAST_UPDATE_INTERVAL + FORECAST_PUBLISH_DELAY)
+
+
+def next_slot_boundary(forecast_data, now):
+    """Instante do primeiro slot da previsão ainda no futuro, ou None"""
+    for item in (forecast_data or {}).get('list', ()):
+        if item['dt'] > now:
+            return item['dt']
+    return None
+
+
+def forecast_ttl(forecast_data, now, unchanged=False):
+    """Validade (s) de uma previsão recém-buscada, alinhada à cadência da API"""
+    last_update = last_forecast_update(now)
+    expires = last_update + FORECAST_UPDATE_INTERVAL
+    boundary = next_slot_boundary(forecast_data, now)
+    if boundary is not None:
+        expires = min(expires, boundary + FORECAST_PUBLISH_DELAY)
+    if unchanged and now - last_update < FORECAST_RECHECK_WINDOW:
+        expires = min(expires, now + FORECAST_RECHECK)
+    return max(expires - now, FORECAST_MIN_TTL)
+
+
+def _current_request(lat, lon, api_key):
+    """(chave, busca, validade) do clima atual da célula"""
+    lat, lon = snap_to_grid(lat, lon)
+    return (f"weather:{cell_key(lat, lon)}",
+            lambda: weather_client.fetch_current_weather(lat, lon, api_key), CURRENT_TTL)
+
+
+def _forecast_request(lat, lon, api_key):
+    """(chave, busca, validade) da previsão da célula"""
+    lat, lon = snap_to_grid(lat, lon)
+    return (f"forecast:{cell_key(lat, lon)}",
+            lambda: weather_client.fetch_forecast(lat, lon, api_key), forecast_ttl)
+
+
+def get_current_weather(lat, lon, api_key, max_stale=response_cache.MAX_STALE, entry=False):
+    """Clima atual da célula que contém o ponto (entry=True: entrada do cache)"""
+    result = response_cache.get_or_fetch_entry(
+        *_current_request(lat, lon, api_key),
+        max_stale=max_stale, fallback_on=(request_control.QuotaExceeded,))
+    return result if entry else result['payload']
+
+
+def get_forecast(lat, lon, api_key, max_stale=response_cache.MAX_STALE, entry=False):
+    """Previsão de 5 dias da célula que contém o ponto (entry=True: entrada do cache)"""
+    result = response_cache.get_or_fetch_entry(
+        *_forecast_request(lat, lon, api_key),
+        max_stale=max_stale, fallback_on=(request_control.QuotaExceeded,))
+    return result if entry else result['payload']
+
+
+def get_current_weather_within(lat, lon, api_key, reserve, max_stale=response_cache.MAX_STALE):
+    """Clima atual da célula, chamando a API só quando reserve() permitir.
+
+    Entrada válida: devolvida sem chamada. Expirada ou ausente: atualizada
+    se reserve() retornar True; senão a entrada expirada há menos de
+    max_stale é usada, sem atualização em segundo plano. Retorna None se
+    não há dados (exceções da busca propagam).
+    """
+    key, fetch, ttl = _current_request(lat, lon, api_key)
+    entry = response_cache.read_entry(key)
+    now = time.time()
+    if entry is not None and now < entry['expires_at']:
+        return entry['payload']
+    if reserve():
+        return response_cache.refresh(key, fetch, ttl)['payload']
+    if entry is not None and now - entry['expires_at'] < max_stale:
+        return entry['payload']
+    return None
+
+
+def forecast_expires_at(lat, lon):
+    """Instante (epoch) em que a previsão da célula expira no cache, ou None se não há entrada"""
+    entry = response_cache.read_entry(_forecast_request(lat, lon, None)[0])
+    return entry['expires_at'] if entry is not None else None
+
+
+def prefetch(lat, lon, api_key, until, reserve=None):
+    """Atualiza as entradas da célula que estariam expiradas no instante until.
+
+    reserve() é chamada antes de cada chamada à API; se retornar False, a
+    entrada não é atualizada. Retorna o número de chamadas feitas.
+    """
+    calls = 0
+    for key, fetch, ttl in (_current_request(lat, lon, api_key),
+                            _forecast_request(lat, lon, api_key)):
+        entry = response_cache.read_entry(key)
+        if entry is not None and entry['expires_at'] >= until:
+            continue
+        if reserve is not None and not reserve():
+            break
+        response_cache.refresh(key, fetch, ttl)
+        calls += 1
+    return calls
+
+
+def get_current_and_forecast(lat, lon, api_key, max_stale=response_cache.MAX_STALE, entries=False):
+    """Clima atual e previsão em paralelo; retorna (future_atual, future_previsao).
+
+    max_stale=0 desativa a entrega de conteúdo expirado (o notificador
+    prefere esperar pela API a enviar uma previsão antiga), exceto quando a
+    cota da chave foi atingida: nesse caso o cache é usado em vez de falhar.
+    Com entries=True os futures resolvem para as entradas do cache (payload
+    e fingerprint) em vez dos payloads.
+    """
+    return (weather_client.submit(get_current_weather, lat, lon, api_key, max_stale, entries),
+            weather_client.submit(get_forecast, lat, lon, api_key, max_stale, entries))
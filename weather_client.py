@@ -0,0 +1,151 @@
+"""Cliente HTTP compartilhado para a API OpenWeatherMap.
+
+Usado tanto pelo dashboard (app.py) quanto pelo notificador (send_weather.py).
+Mantém uma única sessão com pool de conexões keep-alive, de modo que o
+handshake TCP+TLS com api.openweathermap.org é pago uma vez por processo, e
+executa chamadas independentes em paralelo.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import endpoints
+import http_replay
+import request_control
+import telemetry
+
+OPENWEATHER_BASE_URL = endpoints.OPENWEATHER_BASE_URL
+DEFAULT_TIMEOUT = 10
+
+# Pool de conexões e política de retry (somente para a OpenWeather, cujas
+# chamadas são GETs idempotentes). As novas tentativas são feitas acima da
+# cota: cada tentativa consome uma chamada de request_control.openweather_quota
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+
+def _build_session():
+    """Cria a sessão com adapters de pool keep-alive"""
+    # Em modo record/replay (WEATHER_HTTP_MODE) as respostas são gravadas em
+    # ou lidas de arquivos locais em vez de (ou além de) chamar a rede
+    adapter_class = http_replay.adapter_class()
+    session = requests.Session()
+    # Sem retry no adapter (ex.: envio de WhatsApp não deve ser repetido
+    # automaticamente para não duplicar mensagens); as chamadas à OpenWeather
+    # repetem em _request_json, passando pela cota a cada tentativa
+    session.mount('https://', adapter_class(pool_connections=POOL_CONNECTIONS,
+                                            pool_maxsize=POOL_MAXSIZE))
+    session.mount('http://', adapter_class(pool_connections=POOL_CONNECTIONS,
+                                           pool_maxsize=POOL_MAXSIZE))
+    session.hooks['response'].append(_record_upstream)
+    return session
+
+
+def _record_upstream(response, *args, **kwargs):
+    """Hook da sessão: latência de cada resposta por serviço/endpoint/status"""
+    service, endpoint, _ = http_replay.request_identity(response.url)
+    telemetry.observe('upstream_duration_seconds', response.elapsed.total_seconds(),
+                      service=service, endpoint=endpoint, status=response.status_code)
+
+
+def get_session():
+    """Retorna a sessão HTTP compartilhada do processo"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=POOL_MAXSIZE,
+                                               thread_name_prefix='weather_client')
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Agenda uma chamada no executor compartilhado e retorna um Future"""
+    # Propaga o contexto (span atual da telemetria) para a thread do executor
+    return _get_executor().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _get_json(endpoint, lat, lon, api_key, timeout=DEFAULT_TIMEOUT):
+    # Chamadas idênticas simultâneas compartilham uma única requisição
+    return request_control.openweather_flight.do(
+        (endpoint, lat, lon, api_key), _request_json, endpoint, lat, lon, api_key, timeout)
+
+
+def _retry_delay(attempt, response=None):
+    """Espera antes da nova tentativa: Retry-After da resposta ou backoff exponencial"""
+    retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+    if retry_after.isdigit():
+        return float(retry_after)
+    return BACKOFF_FACTOR * 2 ** attempt
+
+
+def _request_json(endpoint, lat, lon, api_key, timeout):
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': api_key,
+        'units': 'metric',
+        'lang': 'pt_br',
+    }
+    with telemetry.span('upstream.openweather', endpoint=endpoint) as current:
+        for attempt in range(MAX_RETRIES + 1):
+            # Cada tentativa conta na cota: lança QuotaExceeded antes de
+            # chamar a API se a cota da chave acabou
+            request_control.openweather_quota.acquire()
+            current.set(attempts=attempt + 1)
+            try:
+                response = get_session().get(f"{OPENWEATHER_BASE_URL}/{endpoint}",
+                                             params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(_retry_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUS and attempt < MAX_RETRIES:
+                time.sleep(_retry_delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+
+def fetch_current_weather(lat, lon, api_key):
+    """Busca clima atual.
+
+    Lança requests.RequestException em caso de falha ou
+    request_control.QuotaExceeded se a cota da chave foi atingida.
+    """
+    return _get_json('weather', lat, lon, api_key)
+
+
+def fetch_forecast(lat, lon, api_key):
+    """Busca previsão de 5 dias (mesmas exceções de fetch_current_weather)"""
+    return _get_json('forecast', lat, lon, api_key)
+
+
+def fetch_current_and_forecast(lat, lon, api_key):
+    """Dispara clima atual e previsão em paralelo.
+
+    Retorna a tupla (future_atual, future_previsao); cada chamador decide como
+    tratar a falha de cada uma chamando .result() dentro do seu try/except.
+    """
+    return (submit(fetch_current_weather, lat, lon, api_key),
+            submit(fetch_forecast, lat, lon, api_key))